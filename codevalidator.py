@@ -17,36 +17,73 @@ except ImportError:
     from io import StringIO, BytesIO
 from collections import defaultdict
 
-from tempfile import NamedTemporaryFile
-from xml.etree.ElementTree import ElementTree
-from xml.etree.ElementTree import fromstring as xmlfromstring
+# modules only needed by some rules (subprocess, tempfile, csv, logging, ..) are imported where they are used
+# to keep the startup fast (e.g. for editors running the filter mode on every save), see --startup-profile
 import argparse
+import bisect
+import codecs
 import contextlib
-import csv
+import errno
 import fnmatch
+import io
 import json
-import logging
+import mmap
 import os
 import re
-import subprocess
 import sys
-import tempfile
-import shutil
+import time
+import types
 
-if sys.version_info.major == 2:
-    # Pythontidy is only supported on Python2
-    from pythontidy import PythonTidy
+# end of the (top-level) imports, see --startup-profile
+STARTED = time.time()
 
 running_on_py3 = sys.version_info.major == 3
 
 
-NOT_SPACE = re.compile('[^ ]')
+class LazyRegex(object):
+    '''a regular expression which is only compiled when it is used for the first time
+
+    >>> LazyRegex(b'a+').match(b'aaab').end()
+    3
+    '''
 
-TRAILING_WHITESPACE_CHARS = set([b' ', b'\t'])
+    def __init__(self, pattern, flags=0):
+        self.pattern = pattern
+        self.flags = flags
+
+    def __getattr__(self, name):
+        # only called for attributes not set yet, i.e. the methods of the compiled regular expression
+        value = getattr(re.compile(self.pattern, self.flags), name)
+        setattr(self, name, value)
+        return value
+
+
+NOT_SPACE = LazyRegex(b'[^ ]')
+NOT_ASCII = LazyRegex(b'[\x80-\xff]')
+TAB = LazyRegex(b'\t')
+CARRIAGE_RETURN = LazyRegex(b'\r')
+# matches only start at the beginning of a run of whitespace (not inside indentation) to scan in linear time
+TRAILING_WHITESPACE = LazyRegex(b'(?<![ \t])[ \t]+\r*(?:\n|\\Z)')
+# trailing whitespace which does not depend on the end of the block (see iter_line_matches)
+TRAILING_WHITESPACE_BEFORE_NEWLINE = LazyRegex(b'(?<![ \t])[ \t]+\r*\n')
 INDENTATION = '    '
 
 DEFAULT_CONFIG_PATHS = ['~/.codevalidatorrc', '/etc/codevalidatorrc']
 
+# number of bytes to look at for NUL bytes when detecting binary files (same heuristic as GIT)
+BINARY_SNIFF_SIZE = 8000
+
+# block size used by the byte-level rules when streaming large files
+STREAM_CHUNK_SIZE = 1024 * 1024
+# lines consisting only of whitespace are held back up to this size to not split trailing whitespace
+MAX_WHITESPACE_CARRY = 64 * 1024
+
+# number of bytes at the end of SQL files which are scanned for the final semicolon
+SQL_TAIL_SIZE = 64 * 1024
+# quotes, dollar quotes and comment starts which make SQL code ambiguous for the tail scanner
+SQL_QUOTES = LazyRegex(b'[\'"`$]')
+SQL_AMBIGUOUS = LazyRegex(b'[\'"`$#]|/\\*|--')
+
 DEFAULT_RULES = [
     'utf8',
     'nobom',
@@ -55,9 +92,41 @@ DEFAULT_RULES = [
     'notrailingws',
 ]
 
+# rules which only look at the file name and not at the content, they are never skipped
+PATH_RULES = set(['invalidpath'])
+
+# rules which only look at raw bytes (or not at the content at all) and can be applied to any file
+BYTE_LEVEL_RULES = set(DEFAULT_RULES + ['ascii']) | PATH_RULES
+
+# rules which validate large files in constant memory
+STREAMING_RULES = BYTE_LEVEL_RULES | set(['json'])
+
 DEFAULT_CONFIG = {
     'exclude_dirs': ['.svn', '.git'],
     'exclude_files': ['.*.swp'],
+    'gitignore': False,
+    # what to do with binary files and files larger than max_file_size (bytes):
+    # "skip" them, apply only byte-level rules ("bytes"), only rules working in constant memory ("stream")
+    # or apply "all" rules, the byte-level rules of binary files still detect text in other encodings (like UTF-16)
+    'binary_files': 'bytes',
+    'max_file_size': 50 * 1024 * 1024,
+    'oversized_files': 'stream',
+    # byte-level rules memory-map files larger than this (bytes) instead of reading them
+    'mmap_threshold': 1024 * 1024,
+    # byte-level rules read files larger than this (bytes) block by block in constant memory,
+    # this applies to files which cannot be memory-mapped (or if mmap_threshold is disabled)
+    'stream_threshold': 8 * 1024 * 1024,
+    # the language server (--lsp) validates a changed document after this many seconds without further changes
+    'lsp_debounce': 0.3,
+    # the watch mode (--watch) validates changed files once no file changed for this many seconds
+    'watch_delay': 0.2,
+    # xmlfmt only checks the XML declaration, line breaks and indentation of files larger than this (bytes)
+    # in a single streaming pass instead of comparing them with a pretty-printed copy,
+    # i.e. differences within tags (like <a></a> instead of <a/> or the quoting of attributes) are not detected
+    'xmlfmt_stream_threshold': 1024 * 1024,
+    # line-based rules report every offending line (instead of only the first one),
+    # default (null) is to report all lines in verbose mode only
+    'full_report': None,
     'rules': {
         '*.c': DEFAULT_RULES,
         '*.coffee': DEFAULT_RULES + ['coffeelint'],
@@ -112,7 +181,17 @@ CONFIG = DEFAULT_CONFIG
 # we use realpath to resolve the symlink back to our base directory
 BASE_DIR = os.path.dirname(os.path.realpath(__file__))
 
-STDIN_CONTENTS = None
+# file name => contents of editor buffers (or stdin) which are validated instead of the file (see --lsp, --filter)
+BUFFERS = {}
+
+# data shared between the rules validating the same file (see file_cache)
+FILE_CACHE = {}
+
+# XML declaration as written by lxml (see xml_declaration)
+XML_DECLARATION = None
+
+# YAML loader class of the yaml rule (see yaml_loader)
+YAML_LOADER = None
 
 
 class BaseException(Exception):
@@ -139,21 +218,63 @@ class ExecutionError(BaseException):
 
 
 def indent_xml(elem, level=0):
-    """xmlindent from http://infix.se/2007/02/06/gentlemen-indent-your-xml"""
-
-    i = '\n' + level * INDENTATION
-    if len(elem):
-        if not elem.text or not elem.text.strip():
-            elem.text = i + INDENTATION
-        for e in elem:
-            indent_xml(e, level + 1)
+    """xmlindent from http://infix.se/2007/02/06/gentlemen-indent-your-xml
+
+    Iterative version (deeply nested documents would hit the recursion limit),
+    lxml trees are indented with the equivalent native etree.indent if available.
+
+    >>> from xml.etree.ElementTree import fromstring, tostring
+    >>> root = fromstring('<a><b><c>x</c></b></a>')
+    >>> indent_xml(root)
+    >>> print(tostring(root).decode())
+    <a>
+        <b>
+            <c>x</c>
+        </b>
+    </a>
+    """
+
+    if not level:
+        try:
+            from lxml import etree
+        except ImportError:
+            pass
+        else:
+            if hasattr(etree, 'indent') and isinstance(elem, etree._Element):
+                etree.indent(elem, space=INDENTATION)
+                return
+    _indent_xml(elem, level)
+
+
+def _indent_xml(elem, level):
+    # indentation strings by depth (relative to level)
+    indents = ['\n' + level * INDENTATION]
+    if not len(elem):
+        if level and (not elem.tail or not elem.tail.strip()):
+            elem.tail = indents[0]
+        return
+    stack = [(elem, 0)]
+    while stack:
+        parent, depth = stack.pop()
+        while len(indents) <= depth + 1:
+            indents.append(indents[-1] + INDENTATION)
+        child_indent = indents[depth + 1]
+        if not parent.text or not parent.text.strip():
+            parent.text = child_indent
+        for e in parent:
+            if len(e):
+                stack.append((e, depth + 1))
             if not e.tail or not e.tail.strip():
-                e.tail = i + INDENTATION
+                e.tail = child_indent
         if not e.tail or not e.tail.strip():
-            e.tail = i
-    else:
-        if level and (not elem.tail or not elem.tail.strip()):
-            elem.tail = i
+            e.tail = indents[depth]
+
+
+def streaming(f):
+    """decorator marking fix functions which write their output while reading the input (see fix_file)"""
+
+    f.streaming = True
+    return f
 
 
 def message(msg):
@@ -174,6 +295,239 @@ def is_python3(fd):
     return b'python3' in line
 
 
+def file_size(fd):
+    '''return the size of the file object's underlying file in bytes or None if it has none'''
+
+    try:
+        return os.fstat(fd.fileno()).st_size
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+
+
+def iter_line_blocks(fd, chunk_size=STREAM_CHUNK_SIZE):
+    '''read the file object block by block, every block ends with a complete line if possible
+
+    Lines longer than the chunk size are split, but never inside trailing whitespace,
+    so line-based checks can look at every block separately.
+
+    >>> b'|'.join(iter_line_blocks(BytesIO(b'a\\nbc\\nd'), 3)) == b'a\\n|bc\\n|d'
+    True
+
+    >>> b'|'.join(iter_line_blocks(BytesIO(b'abcd  \\nx'), 3)) == b'abc|d|  \\n|x'
+    True
+    '''
+
+    pending = b''
+    while True:
+        chunk = fd.read(chunk_size)
+        if not chunk:
+            break
+        data = pending + chunk
+        end = data.rfind(b'\n') + 1
+        if not end:
+            # no line break at all: hold back trailing whitespace (and CRs) as it might end the line
+            end = len(data.rstrip(b' \t\r'))
+            if not end and len(data) > chunk_size + MAX_WHITESPACE_CARRY:
+                # only whitespace: keep the last space or tab to still detect trailing whitespace
+                end = max(data.rfind(b' '), data.rfind(b'\t'), 1)
+        if end:
+            yield data[:end]
+        pending = data[end:]
+    if pending:
+        yield pending
+
+
+def file_cache(fd):
+    '''return a dictionary to share data (e.g. file contents) between all rules validating the file (object)'''
+
+    name = getattr(fd, 'name', None)
+    if FILE_CACHE.get('fd') is not fd and (name is None or FILE_CACHE.get('name') != name):
+        clear_file_cache()
+        FILE_CACHE['name'] = name
+    # the file may be opened again by name (e.g. by directory rules), the cached contents stay valid
+    FILE_CACHE['fd'] = fd
+    return FILE_CACHE
+
+
+def clear_file_cache():
+    contents = FILE_CACHE.get('contents')
+    if isinstance(contents, mmap.mmap):
+        contents.close()
+    FILE_CACHE.clear()
+
+
+def map_file(fd):
+    '''memory-map the file object read-only, returns None if it cannot be mapped (e.g. pipes)'''
+
+    try:
+        return mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, EnvironmentError, ValueError):
+        return None
+
+
+def read_blocks(fd):
+    '''return the file contents as a sequence of blocks (see iter_line_blocks)
+
+    Small files are read at once, files larger than the "mmap_threshold" are memory-mapped,
+    both are shared between rules. Files which cannot be mapped are read block by block
+    if they are larger than the "stream_threshold".
+    Blocks are bytes or (for mapped files) bytes-like mmap objects.'''
+
+    cache = file_cache(fd)
+    if 'contents' not in cache:
+        size = file_size(fd)
+        mmap_threshold = CONFIG.get('mmap_threshold')
+        stream_threshold = CONFIG.get('stream_threshold')
+        contents = None
+        if mmap_threshold and size and size > mmap_threshold:
+            contents = map_file(fd)
+        if contents is None:
+            if stream_threshold and size and size > stream_threshold:
+                return iter_line_blocks(fd, STREAM_CHUNK_SIZE)
+            contents = fd.read()
+        cache['contents'] = contents
+    return [cache['contents']]
+
+
+def file_contents(fd):
+    '''return the complete file contents (bytes or mmap, see read_blocks) shared between rules'''
+
+    blocks = read_blocks(fd)
+    if isinstance(blocks, list):
+        return blocks[0]
+    # the file is too large to be kept in memory, but the caller needs all of it
+    return b''.join(blocks)
+
+
+def count_newlines(data, start, end):
+    '''count line breaks in data[start:end] without copying more than a chunk of mapped files at once'''
+
+    if isinstance(data, bytes):
+        return data.count(b'\n', start, end)
+    count = 0
+    for pos in range(start, end, STREAM_CHUNK_SIZE):
+        count += data[pos:min(pos + STREAM_CHUNK_SIZE, end)].count(b'\n')
+    return count
+
+
+def iter_slices(data, size=STREAM_CHUNK_SIZE):
+    '''yield the data in slices (of mapped files) or at once (bytes)'''
+
+    if isinstance(data, bytes):
+        yield data
+    else:
+        for pos in range(0, len(data), size):
+            yield data[pos:pos + size]
+
+
+class LineIndex(object):
+
+    '''offsets of all line starts in a buffer to map offsets to line and column numbers
+
+    >>> LineIndex(b'ab\\ncd\\n').position(4)
+    (2, 2)
+    '''
+
+    def __init__(self, data):
+        starts = [0]
+        pos = data.find(b'\n')
+        while pos >= 0:
+            starts.append(pos + 1)
+            pos = data.find(b'\n', pos + 1)
+        self.starts = starts
+
+    def position(self, offset):
+        '''return the 1-based line and column number of the given offset'''
+
+        line = bisect.bisect_right(self.starts, offset)
+        return line, offset - self.starts[line - 1] + 1
+
+
+def line_index(block):
+    '''return the LineIndex for the block, the index of the complete file contents is built only once'''
+
+    cache = FILE_CACHE
+    if block is cache.get('contents'):
+        if 'line_index' not in cache:
+            cache['line_index'] = LineIndex(block)
+        return cache['line_index']
+    return LineIndex(block)
+
+
+def iter_line_matches(fd, regex, inner_regex=None):
+    '''yield line and column number of the first regex match in every matching line of the file
+
+    With an inner regex, a match at the end of a block (except the last one) which the inner regex does not match
+    might continue in the following block, like a long run of whitespace split by iter_line_blocks (matching \\Z at
+    the block end). It is only reported (at its start) if the following block starts with a match.'''
+
+    line = 1
+    # column of the block start if the previous block did not end with a line break
+    column_base = 0
+    last_line = None
+    # position of a match continuing in the following block
+    carried = None
+    blocks = iter(read_blocks(fd))
+    following = next(blocks, None)
+    while following is not None:
+        block = following
+        following = next(blocks, None)
+        continued, carried = carried, None
+        index = None
+        # mapped files are located incrementally instead of building a (huge) line index
+        incremental = not isinstance(block, bytes)
+        block_line = 1
+        prev_pos = 0
+        for m in regex.finditer(block):
+            pos = m.start()
+            if index is None and (last_line is None or incremental):
+                # the first match is cheaper to locate without a full line index (early-exit mode)
+                block_line += count_newlines(block, prev_pos, pos)
+                column = pos - block.rfind(b'\n', 0, pos)
+                prev_pos = pos
+            else:
+                if index is None:
+                    index = line_index(block)
+                block_line, column = index.position(pos)
+            position = (line + block_line - 1, column + (column_base if block_line == 1 else 0))
+            if pos == 0 and continued is not None:
+                position = continued
+            if inner_regex is not None and following is not None and m.end() == len(block) and \
+                    not inner_regex.match(block, pos):
+                carried = position
+                continue
+            if position[0] == last_line:
+                continue
+            last_line = position[0]
+            yield position
+        newlines = count_newlines(block, 0, len(block))
+        if newlines:
+            column_base = len(block) - block.rfind(b'\n') - 1
+        else:
+            column_base += len(block)
+        line += newlines
+
+
+def full_report():
+    '''whether line-based rules should report every offending line instead of stopping at the first one'''
+
+    full = CONFIG.get('full_report')
+    return bool(CONFIG['verbose']) if full is None else full
+
+
+def check_lines(fd, regex, description, inner_regex=None):
+    '''validate that no line of the file matches the regex and report the offending line(s) as details'''
+
+    full = full_report()
+    valid = True
+    for line, column in iter_line_matches(fd, regex, inner_regex):
+        _detail(description, line=line, column=column)
+        valid = False
+        if not full:
+            break
+    return valid
+
+
 @message('has invalid file path (file name or extension is not allowed)')
 def _validate_invalidpath(fd):
     return False
@@ -188,24 +542,30 @@ def _validate_notabs(fd):
     >>> _validate_notabs(BytesIO(b'a\\tb'))
     False
     '''
-    return b'\t' not in fd.read()
+    return check_lines(fd, TAB, 'tab found')
 
 
+@streaming
 def _fix_notabs(src, dst):
-    original = src.read()
-    fixed = original.replace(b'\t', b' ' * 4)
-    dst.write(fixed.decode())
+    '''
+    >>> dst = BytesIO()
+    >>> _fix_notabs(BytesIO(b'a\\tb'), dst)
+    >>> dst.getvalue() == b'a    b'
+    True
+    '''
+    for block in iter(lambda: src.read(STREAM_CHUNK_SIZE), b''):
+        dst.write(block.replace(b'\t', b' ' * 4))
 
 
 @message('contains carriage return (CR)')
 def _validate_nocr(fd):
-    return b'\r' not in fd.read()
+    return check_lines(fd, CARRIAGE_RETURN, 'carriage return found')
 
 
+@streaming
 def _fix_nocr(src, dst):
-    original = src.read()
-    fixed = original.replace(b'\r', b'')
-    dst.write(fixed.decode())
+    for block in iter(lambda: src.read(STREAM_CHUNK_SIZE), b''):
+        dst.write(block.replace(b'\r', b''))
 
 
 @message('is not UTF-8 encoded')
@@ -213,21 +573,33 @@ def _validate_utf8(fd):
     '''
     >>> _validate_utf8(BytesIO(b'foo'))
     True
+
+    >>> _validate_utf8(BytesIO(b'a\\n\\xc3'))
+    False
     '''
+    # the incremental decoder keeps incomplete multi-byte sequences between blocks
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    line = 1
+    for block in read_blocks(fd):
+        for data in iter_slices(block, STREAM_CHUNK_SIZE):
+            pending = len(decoder.getstate()[0])
+            try:
+                decoder.decode(data)
+            except UnicodeDecodeError as e:
+                _detail('invalid UTF-8 byte sequence', line=line + data.count(b'\n', 0, max(e.start - pending, 0)))
+                return False
+            line += data.count(b'\n')
     try:
-        fd.read().decode('utf-8')
+        decoder.decode(b'', True)
     except UnicodeDecodeError:
+        _detail('truncated UTF-8 byte sequence at end of file', line=line)
         return False
     return True
 
 
 @message('is not ASCII encoded')
 def _validate_ascii(fd):
-    try:
-        fd.read().decode('ascii')
-    except UnicodeDecodeError:
-        return False
-    return True
+    return check_lines(fd, NOT_ASCII, 'non-ASCII character found')
 
 
 @message('has UTF-8 byte order mark (BOM)')
@@ -237,15 +609,27 @@ def _validate_nobom(fd):
 
 @message('contains invalid indentation (not 4 spaces)')
 def _validate_indent4(fd):
-    for line in fd:
+    '''
+    >>> _validate_indent4(BytesIO(b'a\\n    b\\n'))
+    True
+
+    >>> _validate_indent4(BytesIO(b'a\\n  b\\n'))
+    False
+    '''
+    full = full_report()
+    valid = True
+    for lineno, line in enumerate(fd, 1):
         g = NOT_SPACE.search(line)
         if g and g.start(0) % 4 != 0:
-            if g.group(0) == '*' and g.start(0) - 1 % 4 == 0:
+            if g.group(0) == b'*' and g.start(0) - 1 % 4 == 0:
                 # hack to exclude block comments aligned on "*"
                 pass
             else:
-                return False
-    return True
+                _detail('indentation is not a multiple of 4 spaces', line=lineno, column=g.start(0) + 1)
+                valid = False
+                if not full:
+                    break
+    return valid
 
 
 @message('contains lines with trailing whitespace')
@@ -256,32 +640,190 @@ def _validate_notrailingws(fd):
 
     >>> _validate_notrailingws(BytesIO(b'a '))
     False
+
+    >>> _validate_notrailingws(BytesIO(b'a\\nb\\t\\r\\n'))
+    False
     '''
-    for line in fd:
-        if line.rstrip(b'\n\r')[-1:] in TRAILING_WHITESPACE_CHARS:
-            return False
-    return True
+    return check_lines(fd, TRAILING_WHITESPACE, 'trailing whitespace found', TRAILING_WHITESPACE_BEFORE_NEWLINE)
 
 
+@streaming
 def _fix_notrailingws(src, dst):
     for line in src:
         dst.write(line.rstrip())
-        dst.write('\n')
+        dst.write(b'\n')
+
+
+def parse_xml(fd):
+    '''parse the XML file object with lxml (or ElementTree if lxml is not installed)'''
+
+    try:
+        from lxml import etree
+    except ImportError:
+        from xml.etree.ElementTree import ElementTree
+        tree = ElementTree()
+        tree.parse(fd)
+        return tree
+    parser = etree.XMLParser(resolve_entities=False)
+    return etree.parse(fd, parser)
+
+
+def parsed_xml(fd):
+    '''return the parsed XML tree of the file object, the tree is shared between all XML rules
+
+    Parse errors are raised again for every rule asking for the tree.'''
+
+    cache = file_cache(fd)
+    if 'xml' not in cache:
+        fd.seek(0)
+        try:
+            cache['xml'] = parse_xml(fd)
+        except Exception as e:
+            cache['xml'] = e
+    if isinstance(cache['xml'], Exception):
+        raise cache['xml']
+    return cache['xml']
+
+
+def format_xml(tree):
+    '''return the pretty-printed serialization of the lxml tree as written by _fix_xmlfmt
+
+    The tree is left unchanged as it might be shared with other rules.'''
+
+    elements = [(elem, elem.text, elem.tail) for elem in tree.getroot().iter()]
+    indent_xml(tree.getroot())
+    formatted = BytesIO()
+    tree.write(formatted, encoding='utf-8', xml_declaration=True)
+    formatted.write(b'\n')
+    for elem, text, tail in elements:
+        elem.text = text
+        elem.tail = tail
+    return formatted.getvalue()
+
+
+def xml_declaration():
+    '''return the XML declaration (including line break) written by lxml when serializing as UTF-8'''
+
+    global XML_DECLARATION
+    if XML_DECLARATION is None:
+        from lxml import etree
+        out = BytesIO()
+        etree.ElementTree(etree.Element('a')).write(out, encoding='utf-8', xml_declaration=True)
+        XML_DECLARATION = out.getvalue()[:out.getvalue().index(b'<a')]
+    return XML_DECLARATION
+
+
+def iter_xml_indentation_errors(events, prune):
+    '''compare whitespace-only text and tails of all elements with the indentation set by indent_xml
+
+    Works on lxml (iterparse or iterwalk) events with "start", "end", "comment" and "pi",
+    yields line number and message of every badly indented node.
+    With prune=True already checked nodes are removed from the tree to keep the memory usage constant.'''
+
+    indents = ['\n']
+    depth = 0
+    for event, elem in events:
+        if event == 'end':
+            depth -= 1
+            if len(elem):
+                last = elem[-1]
+                if (not last.tail or not last.tail.strip()) and last.tail != indents[depth]:
+                    yield None, 'closing tag of element on line {0} is not indented correctly'.format(elem.sourceline)
+                if prune:
+                    del elem[:]
+            continue
+        # "start", "comment" or "pi": elem is a new child of the current element
+        while len(indents) <= depth:
+            indents.append(indents[-1] + INDENTATION)
+        parent = elem.getparent()
+        if parent is not None:
+            previous = elem.getprevious()
+            whitespace = (parent.text if previous is None else previous.tail)
+            if (not whitespace or not whitespace.strip()) and whitespace != indents[depth]:
+                yield elem.sourceline, 'not indented correctly (expected {0} spaces)'.format(depth * len(INDENTATION))
+            if prune and previous is not None:
+                parent.remove(previous)
+        if event == 'start':
+            depth += 1
+
+
+def first_difference(a, b):
+    '''return the offset of the first byte which differs between both byte strings (or mmaps)
+
+    >>> first_difference(b'abc', b'abd'), first_difference(b'ab', b'abc'), first_difference(b'ab', b'ab')
+    (2, 2, 2)
+    '''
+
+    n = min(len(a), len(b))
+    pos = 0
+    step = 64 * 1024
+    while pos < n and a[pos:pos + step] == b[pos:pos + step]:
+        pos += step
+    pos = min(pos, n)
+    while pos < n and a[pos:pos + 1] == b[pos:pos + 1]:
+        pos += 1
+    return pos
+
+
+def check_xml_indentation(fd):
+    '''validate the pretty-printing of a (large) XML file without serializing a formatted copy
+
+    Only the XML declaration, the line breaks and the indentation are checked, differences within tags and text
+    (like <a></a> instead of <a/>, the quoting of attributes or entities) are not detected.
+    The indentation of a tree already parsed by another rule is checked in place,
+    otherwise the file is parsed incrementally with iterparse.'''
+
+    from lxml import etree
+    source = file_contents(fd)
+    declaration = xml_declaration()
+    if source[:len(declaration)] != declaration:
+        _detail('missing or different XML declaration (expected {0})'.format(declaration.strip().decode()), line=1)
+        return False
+    if source[-2:] != b'>\n':
+        _detail('file does not end with a single line break after the root element')
+        return False
+    tree = file_cache(fd).get('xml')
+    if isinstance(tree, etree._ElementTree):
+        events = etree.iterwalk(tree, events=('start', 'end', 'comment', 'pi'))
+        prune = False
+    else:
+        fd.seek(0)
+        events = etree.iterparse(fd, events=('start', 'end', 'comment', 'pi'), resolve_entities=False)
+        prune = True
+    full = full_report()
+    valid = True
+    for line, msg in iter_xml_indentation_errors(events, prune):
+        _detail(msg, line=line)
+        valid = False
+        if not full:
+            break
+    return valid
 
 
 @message('is not well-formatted (pretty-printed) XML')
 def _validate_xmlfmt(fd):
-    source = StringIO(fd.read())
-    formatted = StringIO()
-    _fix_xmlfmt(source, formatted)
-    return source.getvalue() == formatted.getvalue()
+    '''compare the file with its pretty-printed copy, large files only get an indentation check (see
+    check_xml_indentation and "xmlfmt_stream_threshold")'''
+
+    threshold = CONFIG.get('xmlfmt_stream_threshold')
+    size = file_size(fd)
+    if threshold and size and size > threshold:
+        return check_xml_indentation(fd)
+    # read the source first: parsing consumes the file object
+    source = file_contents(fd)
+    formatted = format_xml(parsed_xml(fd))
+    # compare lengths first to not copy mapped files which are obviously different
+    if len(source) == len(formatted) and source[:] == formatted:
+        return True
+    offset = first_difference(source, formatted)
+    _detail('differs from pretty-printed XML', line=count_newlines(source, 0, offset) + 1)
+    return False
 
 
 @message('is not valid XML')
 def _validate_xml(fd):
-    tree = ElementTree()
     try:
-        tree.parse(fd)
+        parsed_xml(fd)
     except Exception as e:
         _detail('%s: %s' % (e.__class__.__name__, e))
         return False
@@ -289,12 +831,162 @@ def _validate_xml(fd):
 
 
 def _fix_xmlfmt(src, dst):
-    from lxml import etree
-    parser = etree.XMLParser(resolve_entities=False)
-    tree = etree.parse(src, parser)
+    tree = parse_xml(src)
     indent_xml(tree.getroot())
     tree.write(dst, encoding='utf-8', xml_declaration=True)
-    dst.write('\n')
+    dst.write(b'\n')
+
+
+JSON_TOKEN = LazyRegex(r'[ \t\n\r]*(?:("(?:[^"\\\x00-\x1f]|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})*")|'
+                       r'(-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?)|(true|false|null|NaN|-?Infinity)|'
+                       r'([{}\[\]:,]))')
+# prefix of a token which might be completed by the next block
+JSON_PARTIAL_TOKEN = LazyRegex(r'[ \t\n\r]*(?:"(?:[^"\\\x00-\x1f]|\\["\\/bfnrt]|\\u[0-9a-fA-F]{0,4}|\\)*|'
+                               r'-?[0-9]*(?:\.[0-9]*)?(?:[eE][+-]?[0-9]*)?|t(?:r(?:u)?)?|f(?:a(?:l(?:s)?)?)?|'
+                               r'n(?:u(?:l)?)?|N(?:a)?|'
+                               r'-?I(?:n(?:f(?:i(?:n(?:i(?:t)?)?)?)?)?)?)\Z')
+JSON_WHITESPACE = LazyRegex(r'[ \t\n\r]*')
+
+# parser states of check_json_stream
+JSON_VALUE, JSON_VALUE_OR_CLOSE, JSON_KEY, JSON_KEY_OR_CLOSE, JSON_COLON, JSON_COMMA_OR_CLOSE, JSON_END = range(7)
+JSON_EXPECTED = {
+    JSON_VALUE: 'Expecting value',
+    JSON_VALUE_OR_CLOSE: 'Expecting value',
+    JSON_KEY: 'Expecting property name enclosed in double quotes',
+    JSON_KEY_OR_CLOSE: 'Expecting property name enclosed in double quotes',
+    JSON_COLON: "Expecting ':' delimiter",
+    JSON_COMMA_OR_CLOSE: "Expecting ',' delimiter",
+    JSON_END: 'Extra data',
+}
+
+
+def check_json_stream(fd, chunk_size=STREAM_CHUNK_SIZE):
+    """check well-formedness of the JSON file object block by block in constant memory
+
+    Objects and arrays which are completely contained in the current block are checked
+    with the (C accelerated) scanner of the json module, everything else token by token.
+    Returns None if the document is valid or a tuple (message, line, column) for the first error.
+    Like json.loads, NaN and Infinity are accepted and too deeply nested documents are rejected.
+
+    >>> check_json_stream(BytesIO(b'{"a": [1, 2.5e3, true, null, "x\\\\u00e4"]}'), 4) is None
+    True
+
+    >>> check_json_stream(BytesIO(b'{"a": 1,\\n "b" 2}'), 4)
+    ("Expecting ':' delimiter", 2, 6)
+
+    >>> check_json_stream(BytesIO(b'[1, 2'), 4)
+    ('Unexpected end of file', 1, 6)
+
+    >>> check_json_stream(BytesIO(b'[NaN, -Infinity]'), 4) is None
+    True
+    """
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    scan_once = json.JSONDecoder().scan_once
+    max_depth = sys.getrecursionlimit()
+    stack = []
+    state = JSON_VALUE
+    buf = ''
+    pos = 0
+    # line number and absolute offset of the line start for the beginning of buf
+    line = 1
+    line_start = 0
+    offset = 0
+    final = False
+
+    def location(p):
+        newline = buf.rfind('\n', 0, p)
+        if newline >= 0:
+            return line + buf.count('\n', 0, p), p - newline
+        return line, offset + p - line_start + 1
+
+    while True:
+        if state in (JSON_VALUE, JSON_VALUE_OR_CLOSE):
+            p = JSON_WHITESPACE.match(buf, pos).end()
+            if buf[p:p + 1] in ('{', '['):
+                try:
+                    end = scan_once(buf, p)[1]
+                except (ValueError, StopIteration):
+                    # invalid or incomplete: continue token by token to find the error or the block end
+                    pass
+                except RuntimeError:
+                    # RecursionError
+                    return ('Maximum nesting depth exceeded', ) + location(p)
+                else:
+                    if end < len(buf) or final:
+                        pos = end
+                        state = (JSON_COMMA_OR_CLOSE if stack else JSON_END)
+                        continue
+        m = JSON_TOKEN.match(buf, pos)
+        # numbers like "1" might continue with ".5e3" in the next block
+        partial_number = m and m.lastindex == 2 and len(buf) - m.end() <= 2 and JSON_PARTIAL_TOKEN.match(buf, pos)
+        if not final and (not m or m.end() == len(buf) or partial_number):
+            # the token might continue in the next block
+            if not m and not JSON_PARTIAL_TOKEN.match(buf, pos):
+                return (JSON_EXPECTED[state], ) + location(JSON_WHITESPACE.match(buf, pos).end())
+            consumed = buf[:pos]
+            newlines = consumed.count('\n')
+            if newlines:
+                line += newlines
+                line_start = offset + consumed.rfind('\n') + 1
+            offset += pos
+            buf = buf[pos:]
+            pos = 0
+            chunk = fd.read(chunk_size)
+            final = not chunk
+            try:
+                buf += decoder.decode(chunk, final)
+            except UnicodeDecodeError as e:
+                error_line, column = location(len(buf))
+                return ('Invalid UTF-8 byte sequence', error_line + chunk.count(b'\n', 0, e.start), None)
+            continue
+        if not m:
+            p = JSON_WHITESPACE.match(buf, pos).end()
+            if p == len(buf):
+                if state == JSON_END:
+                    return None
+                return ('Unexpected end of file', ) + location(p)
+            return (JSON_EXPECTED[state], ) + location(p)
+        kind = m.lastindex
+        token = m.group(4)
+        if state in (JSON_VALUE, JSON_VALUE_OR_CLOSE):
+            if kind < 4:
+                state = JSON_COMMA_OR_CLOSE
+            elif token in ('{', '['):
+                if len(stack) >= max_depth:
+                    return ('Maximum nesting depth exceeded', ) + location(m.start(4))
+                stack.append(token)
+                state = (JSON_KEY_OR_CLOSE if token == '{' else JSON_VALUE_OR_CLOSE)
+            elif token == ']' and state == JSON_VALUE_OR_CLOSE:
+                stack.pop()
+                state = JSON_COMMA_OR_CLOSE
+            else:
+                return (JSON_EXPECTED[state], ) + location(m.start(4))
+        elif state in (JSON_KEY, JSON_KEY_OR_CLOSE):
+            if kind == 1:
+                state = JSON_COLON
+            elif token == '}' and state == JSON_KEY_OR_CLOSE:
+                stack.pop()
+                state = JSON_COMMA_OR_CLOSE
+            else:
+                return (JSON_EXPECTED[state], ) + location(m.start(kind))
+        elif state == JSON_COLON:
+            if token != ':':
+                return (JSON_EXPECTED[state], ) + location(m.start(kind))
+            state = JSON_VALUE
+        elif state == JSON_COMMA_OR_CLOSE:
+            if token == ',':
+                state = (JSON_KEY if stack[-1] == '{' else JSON_VALUE)
+            elif token in ('}', ']') and stack[-1] == ('{' if token == '}' else '['):
+                stack.pop()
+                state = JSON_COMMA_OR_CLOSE
+            else:
+                return (JSON_EXPECTED[state], ) + location(m.start(kind))
+        else:
+            return (JSON_EXPECTED[state], ) + location(m.start(kind))
+        if state == JSON_COMMA_OR_CLOSE and not stack:
+            state = JSON_END
+        pos = m.end()
 
 
 @message('is not valid JSON')
@@ -306,14 +998,36 @@ def _validate_json(fd):
     >>> _validate_json(BytesIO(b'""'))
     True
     '''
+    threshold = CONFIG.get('stream_threshold')
+    size = file_size(fd)
+    if threshold and size and size > threshold:
+        error = check_json_stream(fd, STREAM_CHUNK_SIZE)
+        if error:
+            _detail(error[0], line=error[1], column=error[2])
+            return False
+        return True
     try:
-        json.loads(fd.read().decode('utf-8'))
+        json.loads(file_contents(fd)[:].decode('utf-8'))
     except Exception as e:
         _detail('%s: %s' % (e.__class__.__name__, e))
         return False
     return True
 
 
+def yaml_loader():
+    '''return the safe YAML loader class (based on libyaml if available) accepting arbitrary local tags like !Ref'''
+
+    global YAML_LOADER
+    if YAML_LOADER is None:
+        import yaml
+        # the libyaml based loader is much faster, but might not be compiled in
+        base = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        # a subclass to not register the constructor for all safe loaders
+        YAML_LOADER = type('ValidationLoader', (base, ), {})
+        YAML_LOADER.add_multi_constructor('!', (lambda _, tag, _2: tag))
+    return YAML_LOADER
+
+
 @message('is not valid YAML')
 def _validate_yaml(fd):
     '''
@@ -322,18 +1036,29 @@ def _validate_yaml(fd):
 
     >>> _validate_yaml(BytesIO(b'a: [b'))
     False
+
+    >>> _validate_yaml(BytesIO(b'a: *undefined'))
+    False
+
+    >>> _validate_yaml(BytesIO(b'a: !Ref b\\n---\\nc: &x [*x]'))
+    True
+
+    >>> _validate_yaml(BytesIO(b'a: 2001-13-45'))
+    False
     '''
-    import yaml
+    loader = None
     try:
-        # Using safeloader because it supports recursive nodes
-        loader = yaml.SafeLoader(fd)
-        # Support random tags
-        loader.add_multi_constructor('!', (lambda _, tag, _2: tag))
+        loader = yaml_loader()(fd)
+        # constructing the documents also checks values like timestamps, merge keys and unhashable keys,
+        # the libyaml based loader makes it fast anyway
         while loader.check_data():
             loader.get_data()
     except Exception as e:
         _detail('%s: %s' % (e.__class__.__name__, e))
         return False
+    finally:
+        if loader is not None:
+            loader.dispose()
     return True
 
 
@@ -346,6 +1071,7 @@ def _validate_pythontidy(fd):
     if len(source.getvalue()) < 4:
         # small or empty files are ignored
         return True
+    from pythontidy import PythonTidy
     formatted = StringIO()
     PythonTidy.tidy_up(source, formatted)
     return source.getvalue() == formatted.getvalue()
@@ -359,13 +1085,19 @@ def _validate_pep8(fd, options={}):
     max_line_length = options.get('max_line_length', pep8.MAX_LINE_LENGTH)
 
     pep8style = pep8.StyleGuide(max_line_length=max_line_length)
-    check = pep8style.input_file(fd.name)
+    # pass the lines as the file might only exist in memory (see BUFFERS)
+    lines = file_contents(fd)[:].decode('utf-8', 'replace').splitlines(True)
+    check = pep8style.input_file(fd.name, lines=lines)
     return check == 0
 
 
 def __jalopy(original, options, use_nailgun=True):
     # a temporary destination dir is needed with nailgun to prevent multiple jalopy instances from interfering
     # with each other, a temporary directory
+    import logging
+    import shutil
+    import subprocess
+    import tempfile
     dest_dir = tempfile.mkdtemp('cvjalopy')
     jalopy_config = options.get('config')
     java_bin = options.get('java_bin', '/usr/bin/java')
@@ -388,7 +1120,7 @@ def __jalopy(original, options, use_nailgun=True):
     _env['LANG'] = 'en_US.utf8'
     _env['LC_ALL'] = 'en_US.utf8'
     try:
-        with NamedTemporaryFile(suffix='.java', delete=False) as f:
+        with tempfile.NamedTemporaryFile(suffix='.java', delete=False) as f:
             f.write(original)
             f.flush()
             destination = ['--flatdest', dest_dir]
@@ -404,7 +1136,8 @@ def __jalopy(original, options, use_nailgun=True):
             if '[WARN]' in stdout:
                 logging.info('Jalopy reports warnings: %s', stdout)
             name = os.path.basename(f.name)
-            result = open(os.path.join(dest_dir, name)).read()
+            with open(os.path.join(dest_dir, name), 'rb') as fd:
+                result = fd.read()
     except:
         result = ''
     finally:
@@ -426,15 +1159,17 @@ def _fix_jalopy(src, dst, options={}):
 
 
 def _fix_pythontidy(src, dst):
+    # PythonTidy is only supported on Python2
+    from pythontidy import PythonTidy
     PythonTidy.tidy_up(src, dst)
 
 
 def _fix_pep8(src, dst, options={}):
     import autopep8
-    if type(src) is file:
-        source = src.read()
-    else:
-        source = src.getvalue()
+    source = src.read()
+    if running_on_py3:
+        # autopep8 works on text
+        source = source.decode('utf-8')
 
     class OptionsClass(object):
 
@@ -451,7 +1186,7 @@ def _fix_pep8(src, dst, options={}):
             return self.__dict__.get(name)
 
     fixed = autopep8.fix_code(source, options=OptionsClass())
-    dst.write(fixed)
+    dst.write(fixed.encode('utf-8') if running_on_py3 else fixed)
 
 
 @message('is not phpcs (%(standard)s standard) formatted')
@@ -461,6 +1196,8 @@ def _validate_phpcs(fd, options):
     Needs a locally installed phpcs ("pear install PHP_CodeSniffer").
     Look at https://github.com/klaussilveira/phpcs-psr to get the PSR standard (sniffs)."""
 
+    import csv
+    import subprocess
     po = subprocess.Popen('phpcs -n --report=csv --standard=%s --encoding=%s -' % (options['standard'],
                           options['encoding']), shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
                           stderr=subprocess.PIPE)
@@ -475,6 +1212,8 @@ def _validate_phpcs(fd, options):
 
 @message('has jshint warnings/errors')
 def _validate_jshint(fd, options=None):
+    import subprocess
+    from xml.etree.ElementTree import fromstring as xmlfromstring
     cfgfile = os.path.join(BASE_DIR, 'config/jshint.json')
     po = subprocess.Popen([
         'jshint',
@@ -499,6 +1238,7 @@ def _validate_coffeelint(fd, options=None):
     Needs a locally installed coffeelint ("npm install -g coffeelint").
     """
 
+    import subprocess
     cfgfile = os.path.join(BASE_DIR, 'config/coffeelint.json')
     po = subprocess.Popen('coffeelint --reporter csv -s -f %s' % cfgfile, shell=True, stdin=subprocess.PIPE,
                           stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -518,6 +1258,8 @@ def _validate_coffeelint(fd, options=None):
 
 @message('fails puppet parser validation')
 def _validate_puppet(fd):
+    import subprocess
+    import tempfile
     _env = {}
     _env.update(os.environ)
     _env['HOME'] = '/tmp'
@@ -538,6 +1280,7 @@ def _validate_puppet(fd):
 
 @message('is not valid ruby')
 def _validate_ruby(fd):
+    import subprocess
     p0 = subprocess.Popen(["ruby", "-c"], stdin=fd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     output, stderr = p0.communicate()
     retcode = p0.poll()
@@ -549,8 +1292,11 @@ def _validate_ruby(fd):
 
 @message('is not rubocop formatted ruby code')
 def _validate_rubocop(fd):
-    p0 = subprocess.Popen(["rubocop", "--format", "emacs", fd.name], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output, stderr = p0.communicate()
+    import subprocess
+    # the source is passed on stdin as the file might only exist in memory (see BUFFERS)
+    p0 = subprocess.Popen(["rubocop", "--format", "emacs", "--stdin", fd.name], stdin=subprocess.PIPE,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, stderr = p0.communicate(file_contents(fd)[:])
     retcode = p0.poll()
     if retcode != 0:
         _detail("rubocop exited with %d: \n%s" % (retcode, output))
@@ -560,6 +1306,7 @@ def _validate_rubocop(fd):
 
 @message('is not valid ERB template')
 def _validate_erb(fd):
+    import subprocess
     p1 = subprocess.Popen([
         'erb',
         '-P',
@@ -582,9 +1329,8 @@ def _validate_pomdesc(fd):
 
     NS = '{http://maven.apache.org/POM/4.0.0}'
     PROJECT_NAME_REGEX = re.compile(r'^[a-z][a-z0-9-]*$')
-    tree = ElementTree()
     try:
-        elem = tree.parse(fd)
+        elem = parsed_xml(fd).getroot()
     except Exception as e:
         _detail('%s: %s' % (e.__class__.__name__, e))
         return False
@@ -612,9 +1358,70 @@ def _validate_pomdesc(fd):
     return not VALIDATION_DETAILS
 
 
+def last_sql_character(data, complete=True):
+    """return the last byte of SQL code outside of comments by scanning backwards from the end
+
+    Returns b'' if there is no code at all and None if the result cannot be decided without
+    parsing the whole file (e.g. comment markers following quotes on the same line).
+    Pass complete=False if data is only the tail of the file.
+
+    >>> last_sql_character(b"INSERT INTO t VALUES ('a');\\n-- done\\n/* end\\n */  -- really\\n") == b';'
+    True
+
+    >>> last_sql_character(b"-- only a comment\\n") == b''
+    True
+
+    >>> last_sql_character(b"SELECT '--'; -- quoted") is None
+    True
+    """
+
+    end = len(data)
+    while True:
+        while end and data[end - 1:end].isspace():
+            end -= 1
+        if not end:
+            return (b'' if complete else None)
+        if data.endswith(b'*/', 0, end):
+            start = data.rfind(b'/*', 0, end - 2)
+            line_start = data.rfind(b'\n', 0, start) + 1
+            # the "*/" must not belong to a line comment, the "/*" must not be quoted or commented out
+            if start < 0 or data.find(b'*/', start + 2, end - 2) >= 0 or \
+                    SQL_AMBIGUOUS.search(data, line_start, start) or (not line_start and not complete):
+                return None
+            comment = start
+        else:
+            line_start = data.rfind(b'\n', 0, end) + 1
+            if not line_start and not complete:
+                return None
+            comment = data.find(b'--', line_start, end)
+            if comment < 0:
+                if data.find(b'#', line_start, end) >= 0:
+                    return None
+                break
+            if SQL_AMBIGUOUS.search(data, line_start, comment):
+                return None
+        # a quote inside the comment might close a string started before it
+        if SQL_QUOTES.search(data, comment, end):
+            return None
+        end = comment
+    # the code must not be inside a block comment which is still open
+    start = data.rfind(b'/*', 0, end)
+    if start >= 0 and data.find(b'*/', start + 2, end) < 0:
+        return None
+    return data[end - 1:end]
+
+
 @message('SQL file ends without a semicolon')
 def _validate_sql_semi_colon(fd, options={}):
+    size = file_size(fd)
+    if size is not None and size > SQL_TAIL_SIZE:
+        fd.seek(size - SQL_TAIL_SIZE)
+    last = last_sql_character(fd.read(), complete=(size is None or size <= SQL_TAIL_SIZE))
+    if last is not None:
+        return last in (b'', b';')
+    # comments mixed with quoted strings: let sqlparse decide
     import sqlparse
+    fd.seek(0)
     sql = fd.read()
     sql_without_comments = sqlparse.format(sql, strip_comments=True).strip()
     return (sql_without_comments[-1] == ';' if sql_without_comments else True)
@@ -623,26 +1430,36 @@ def _validate_sql_semi_colon(fd, options={}):
 def _fix_sql_semi_colon(src, dst, options={}):
     original = src.read()
     dst.write(original)
-    dst.write('''
+    dst.write(b'''
 ;
 ''')
 
 
 @message('doesn\'t pass Pyflakes validation')
 def _validate_pyflakes(fd, options={}):
-    proc = subprocess.Popen(['pyflakes', fd.name], stderr=subprocess.PIPE)
-    proc.wait()
-    errors = proc.stderr.read().decode().splitlines()
-    for message in errors:
-        error = message.message % message.message_args
-        _detail(error, line=message.lineno)
-    return proc.returncode == 0
+    from pyflakes import api
+
+    class DetailReporter(object):
+        '''pyflakes reporter adding the messages as details'''
+
+        def unexpectedError(self, filename, msg):
+            _detail(msg)
+
+        def syntaxError(self, filename, msg, lineno, offset, text):
+            _detail(msg, line=lineno, column=offset)
+
+        def flake(self, message):
+            _detail(message.message % message.message_args, line=message.lineno, column=message.col + 1)
+
+    # check the source as the file might only exist in memory (see BUFFERS)
+    return api.check(file_contents(fd)[:], fd.name, DetailReporter()) == 0
 
 
 @message('contains syntax errors')
 def _validate_database_dir(fname, options={}):
     if 'database/lounge' in fname or not fnmatch.fnmatch(fname, '*.sql'):
         return True
+    import subprocess
     pgsqlparser_bin = options.get('pgsql-parser-bin', '/opt/codevalidator/PgSqlParser')
     if not os.path.isfile(pgsqlparser_bin):
         raise ExecutionError('PostgreSQL parser binary not found, please set "pgsql-parser-bin" option')
@@ -685,42 +1502,59 @@ def _validate_sql_diff_dir(fname, options=None):
     return True
 
 
+# all statements checked in db diffs, matched in a single pass,
+# the registered patch name must be quoted and match the file name exactly (not only as prefix)
+SQL_DIFF_STATEMENTS = LazyRegex(b"(?P<set_role>[Ss][Ee][Tt] +[Rr][Oo][Ll][Ee] +[Tt][Oo] +zalando(_admin)?)|"
+                                b"^ *(?:"
+                                b"(?P<owner_role>[Ss][Ee][Ll][Ee][Cc][Tt] [Zz][Zz]_[Uu][Tt][Ii][Ll][Ss]\\."
+                                b"[Ss][Ee][Tt]_[Pp][Rr][Oo][Jj][Ee][Cc][Tt]_[Ss][Cc][Hh][Ee][Mm][Aa]_"
+                                b"[Oo][Ww][Nn][Ee][Rr]_[Rr][Oo][Ll][Ee]\\('\\w+'\\);)|"
+                                b"(?P<cd>\\\\cd +)|"
+                                b"\\\\i +(?P<include>\\S+)|"
+                                b"[Ss][Ee][Ll][Ee][Cc][Tt] +_v\\.(?P<unregister>un)?register_patch"
+                                b" *\\( *'(?P<patch>[^']*)'"
+                                b")", re.MULTILINE)
+
+
 def _validate_sql_diff_sql(fname, options=None):
     head, filename = os.path.split(fname)
 
     if filename.endswith('.py') or filename.endswith('.yml'):
         return True
 
-    sql = open(fname).read()
-    has_set_role = re.search('[Ss][Ee][Tt] +[Rr][Oo][Ll][Ee] +[Tt][Oo] +zalando(_admin)?\s*', sql)
-    has_set_project_schema_owner_role = \
-        re.search('''^ *select zz_utils\.set_project_schema_owner_role\('\w+'\);''',
-                  sql, re.MULTILINE + re.IGNORECASE)
-    if not (has_set_role or has_set_project_schema_owner_role):
+    has_set_role = has_cd = False
+    invalid_include = None
+    patches = {False: set(), True: set()}
+    with open_file_for_read(fname) as fd:
+        for m in SQL_DIFF_STATEMENTS.finditer(file_contents(fd)):
+            if m.group('set_role') or m.group('owner_role'):
+                has_set_role = True
+            elif m.group('cd'):
+                has_cd = True
+            elif m.group('include') is not None:
+                if invalid_include is None and not m.group('include').startswith(b'database/'):
+                    invalid_include = m.group('include')
+            else:
+                patches[bool(m.group('unregister'))].add(m.group('patch'))
+
+    if not has_set_role:
         return 'set role to zalando; or SELECT zz_utils.set_project_schema_owner_role(); must be present in db diff'
 
-    if re.search('^ *\\\\cd +', sql, re.MULTILINE):
-        return "\cd : is not allowed in db diffs anymore"
+    if has_cd:
+        return "\\cd : is not allowed in db diffs anymore"
 
-    for m in re.finditer('^ *\\\\i +([^\s]+)', sql, re.MULTILINE):
-        if not m.group(1).startswith('database/'):
-            return 'include path (\i ) should starts with `database/` directory'
+    if invalid_include is not None:
+        return 'include path (\\i ) should starts with `database/` directory'
 
     if fnmatch.fnmatch(filename, '*rollback*'):
         if not fnmatch.fnmatch(filename, '*.rollback.sql_diff'):
             return 'rollback script should have .rollback.sql_diff extension'
         patch_name = filename.replace('.rollback.sql_diff', '')
-        re_patch_name = re.escape(patch_name)
-        pattern = \
-            '^ *[Ss][Ee][Ll][Ee][Cc][Tt] +_v\.unregister_patch *\( *\\\'{patch_name}\\\''.format(patch_name=re_patch_name)
-        if not re.search(pattern, sql, re.MULTILINE):
+        if patch_name.encode('utf-8') not in patches[True]:
             return 'unregister patch not found or patch name does not match with filename'
     else:
         patch_name = filename.replace('.sql_diff', '')
-        re_patch_name = re.escape(patch_name)
-        pattern = \
-            '^ *[Ss][Ee][Ll][Ee][Cc][Tt] +_v\.register_patch *\( *\\\'{patch_name}\\\''.format(patch_name=re_patch_name)
-        if not re.search(pattern, sql, re.MULTILINE):
+        if patch_name.encode('utf-8') not in patches[False]:
             return 'register patch not found or patch name does not match with filename'
 
     return True
@@ -728,179 +1562,1200 @@ def _validate_sql_diff_sql(fname, options=None):
 
 VALIDATION_ERRORS = []
 VALIDATION_DETAILS = []
-
-
-def _error(fname, rule, func, message=None):
-    '''output the collected error messages and also print details if verbosity > 0'''
-
-    if not message:
-        message = func.message
-    notify('{0}: {1}'.format(fname, message % CONFIG.get('options', {}).get(rule, {})))
-    if CONFIG['verbose']:
-        for message, line, column in VALIDATION_DETAILS:
-            if line and column:
-                notify('  line {0}, col {1}: {2}'.format(line, column, message))
-            elif line:
-                notify('  line {0}: {1}'.format(line, message))
-            else:
-                notify('  {0}'.format(message))
+SKIPPED_FILES = []
+# directory name => (names of directories with rules in its path, directory rules), see dir_rules_of_dir
+DIR_RULES_CACHE = {}
+# rule name => Rule (None for unknown rules), see get_rule
+RULES = {}
+# precompiled file patterns of CONFIG['rules'], see file_pattern_rules
+FILE_PATTERNS = {}
+# (phase, end time, number of loaded modules), see --startup-profile
+STARTUP_PHASES = []
+# statistics of the rules, fixers, external tools and file extensions, see --profile (None if not profiling)
+PROFILER = None
+# path => (modification time, parsed configuration), see load_config
+CONFIG_FILES = {}
+# frame channels of the daemon protocol, see serve
+CHANNEL_EXIT, CHANNEL_STDOUT, CHANNEL_STDERR, CHANNEL_REQUEST, CHANNEL_STDIN = range(5)
+# rules reporting offending lines independently of other lines, the language server only validates changed lines
+LINE_RULES = set(['ascii', 'indent4', 'nocr', 'notabs', 'notrailingws'])
+# dependencies of the builtin rules which the daemon imports before forking its workers
+DAEMON_PRELOAD_MODULES = ['autopep8', 'csv', 'lxml.etree', 'pep8', 'sqlparse', 'subprocess', 'tempfile', 'yaml']
+# entry point group of plugin rules: the rule name refers to a validation function (with an optional "fixer"
+# attribute) or a module with _validate_<rule> and _fix_<rule> functions
+PLUGIN_ENTRY_POINT_GROUP = 'codevalidator.rules'
+# rule name => entry point, see plugin_entry_points
+PLUGIN_ENTRY_POINTS = None
+
+
+def _error(fname, rule, message=None):
+    '''report the error with the collected details (see REPORTER)'''
+
+    message = (rule.format_message(message) if message else rule.message)
+    REPORTER.error(fname, rule.name, message, VALIDATION_DETAILS[:])
     VALIDATION_DETAILS[:] = []
-    VALIDATION_ERRORS.append((fname, rule))
+    VALIDATION_ERRORS.append((fname, rule.name))
 
 
 def _detail(message, line=None, column=None):
     VALIDATION_DETAILS.append((message, line, column))
 
 
-def validate_file_dir_rules(fname):
-    fullpath = os.path.abspath(fname)
-    dirs = get_dirs(fullpath)
-    dirrules = sum([CONFIG['dir_rules'][rule] for rule in CONFIG['dir_rules'] if rule in dirs], [])
-    for rule in dirrules:
-        logging.debug('Validating %s with %s..', fname, rule)
-        func = globals().get('_validate_' + rule)
-        if not func:
-            notify(rule, 'does not exist')
-            continue
-        options = CONFIG.get('options', {}).get(rule)
-        try:
-            if options:
-                res = func(fname, options)
-            else:
-                res = func(fname)
-        except Exception as e:
+def detail_position(value):
+    '''return the line or column number of a detail as positive integer (or None), rules may report strings'''
 
-            _error(fname, rule, func, 'ERROR validating {0}: {1}'.format(rule, e))
-        else:
-            if not res:
-                _error(fname, rule, func)
-            elif type(res) == str:
-                _error(fname, rule, func, res)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return (value if value > 0 else None)
 
 
-def open_file_for_read(fn):
-    global STDIN_CONTENTS
-    if CONFIG['filter_mode']:
-        if STDIN_CONTENTS is None:
-            STDIN_CONTENTS = StringIO(sys.stdin.read())
-            STDIN_CONTENTS.name = fn
+class BatchWriter(object):
+    '''collect small writes to the binary output and pass them on in large blocks'''
 
-        @contextlib.contextmanager
-        def stdin_wrapper():
-            STDIN_CONTENTS.seek(0)
-            yield STDIN_CONTENTS
-        return stdin_wrapper()
-    else:
-        return open(fn, 'rb')
+    def __init__(self, output, size=64 * 1024):
+        self.output = output
+        self.size = size
+        self.chunks = []
+        self.pending = 0
 
+    def write(self, data):
+        self.chunks.append(data)
+        self.pending += len(data)
+        if self.pending >= self.size:
+            self.flush()
 
-def open_file_for_write(fn):
-    if CONFIG['filter_mode']:
-        return sys.stdout
-    else:
-        return open(fn, 'wb')
+    def write_lines(self, lines, batch=1024):
+        '''encode and write the text lines, a batch at a time to keep the memory usage flat'''
 
+        from itertools import islice
+        lines = iter(lines)
+        while True:
+            text = u''.join(islice(lines, batch))
+            if not text:
+                break
+            self.write(text.encode('utf-8'))
 
-def notify(*args):
-    if not CONFIG['quiet']:
-        print(*args)
+    def flush(self):
+        if self.chunks:
+            self.output.write(b''.join(self.chunks))
+            self.chunks = []
+            self.pending = 0
+        self.output.flush()
 
 
-def validate_file_with_rules(fname, rules):
-    with open_file_for_read(fname) as fd:
-        for rule in rules:
-            logging.debug('Validating %s with %s..', fname, rule)
-            fd.seek(0)
-            func = globals().get('_validate_' + rule)
-            if not func:
-                notify(rule, 'does not exist')
-                continue
-            options = CONFIG.get('options', {}).get(rule)
-            try:
-                if options:
-                    res = func(fd, options)
+class Reporter(object):
+    '''output format of the validation errors (see --format)
+
+    Errors are reported with the details collected by the rule as (message, line, column) tuples.'''
+
+    def __init__(self, output=None):
+        self.output = output
+
+    def error(self, fname, rule, message, details):
+        pass
+
+    def file_done(self, fname):
+        pass
+
+    def close(self):
+        pass
+
+
+class TextReporter(Reporter):
+    '''print the error messages and also the details if verbosity > 0'''
+
+    def error(self, fname, rule, message, details):
+        notify('{0}: {1}'.format(fname, message))
+        if CONFIG['verbose']:
+            for detail, line, column in details:
+                if line and column:
+                    notify('  line {0}, col {1}: {2}'.format(line, column, detail))
+                elif line:
+                    notify('  line {0}: {1}'.format(line, detail))
                 else:
-                    res = func(fd)
-            except Exception as e:
-                _error(fname, rule, func, 'ERROR validating {0}: {1}'.format(rule, e))
-            else:
-                if not res:
-                    _error(fname, rule, func)
-                elif type(res) == str:
-                    _error(fname, rule, func, res)
+                    notify('  {0}'.format(detail))
 
 
-def validate_file(fname):
-    for exclude in CONFIG['exclude_dirs']:
-        if '/%s/' % exclude in fname:
-            return
-    head, tail = os.path.split(fname)
-    for exclude in CONFIG['exclude_files']:
-        if fnmatch.fnmatch(tail, exclude):
-            return
-    validate_file_dir_rules(fname)
-    for pattern, rules in CONFIG['rules'].items():
-        if fnmatch.fnmatch(fname, pattern):
-            validate_file_with_rules(fname, rules)
+class ListReporter(Reporter):
+    '''keep the errors as (file name, rule name, message, details) tuples, see collect_reports'''
 
+    def __init__(self, output=None):
+        Reporter.__init__(self, output)
+        self.reports = []
 
-def validate_directory(path, exclude_patterns, include_patterns):
-    exclude_patterns = [os.path.join(path, pattern) for pattern in exclude_patterns or []]
-    include_patterns = [os.path.join(path, pattern) for pattern in include_patterns or []]
-    for root, dirnames, filenames in os.walk(path):
-        for exclude in CONFIG['exclude_dirs']:
-            if exclude in dirnames:
-                dirnames.remove(exclude)
-        for fname in filenames:
-            fname = os.path.join(root, fname)
-            match_excluded = any(fnmatch.fnmatch(fname, pattern) for pattern in exclude_patterns)
-            match_included = any(fnmatch.fnmatch(fname, pattern) for pattern in include_patterns)
+    def error(self, fname, rule, message, details):
+        self.reports.append((fname, rule, message, details))
 
-            if exclude_patterns:
-                validate = not match_excluded or match_included
-            else:
-                validate = match_included or not include_patterns
 
-            if validate:
-                validate_file(fname)
+def encode_json_strings(values):
+    '''return a function encoding the values as JSON strings (or null), the encoded values are cached
 
+    >>> encode = encode_json_strings({})
+    >>> encode(u'tab "found"'), encode(None)
+    ('"tab \\\\"found\\\\""', 'null')
+    '''
 
-def fix_file(fname, rules):
+    def encode(value):
+        try:
+            return values[value]
+        except KeyError:
+            pass
+        encoded = values[value] = json.dumps(value if value is None else u'{0}'.format(value))
+        return encoded
+
+    return encode
+
+
+def encode_position(value):
+    position = detail_position(value)
+    return ('null' if position is None else str(position))
+
+
+class JsonLinesReporter(Reporter):
+    '''write a JSON object for every detail (or error without details), the lines of a file are written at once
+
+    The objects are built from preformatted strings, which is much faster than encoding millions of dicts.'''
+
+    def __init__(self, output):
+        Reporter.__init__(self, BatchWriter(output))
+
+    def error(self, fname, rule, message, details):
+        encode = encode_json_strings({})
+        prefix = '{{"file": {0}, "rule": {1}, "message": {2}, "line": '.format(
+            encode(fname), encode(rule), encode(message))
+        self.output.write_lines('{0}{1}, "column": {2}, "detail": {3}}}\n'.format(
+            prefix, encode_position(line), encode_position(column), encode(detail))
+            for detail, line, column in (details or [(None, None, None)]))
+
+    def file_done(self, fname):
+        self.output.flush()
+
+    def close(self):
+        self.output.flush()
+
+
+class SarifReporter(Reporter):
+    '''write all errors as SARIF 2.1.0 log (e.g. for code scanning services) at the end'''
+
+    def __init__(self, output):
+        Reporter.__init__(self, BatchWriter(output))
+        # rule name => message
+        self.rules = {}
+        # (file name, rule name, message, details)
+        self.errors = []
+
+    def error(self, fname, rule, message, details):
+        self.rules.setdefault(rule, message)
+        self.errors.append((fname, rule, message, details))
+
+    def close(self):
+        try:
+            from urllib.parse import quote
+        except ImportError:
+            # Python 2
+            from urllib import quote
+        driver = {'name': 'codevalidator', 'informationUri': 'https://github.com/hjacobs/codevalidator',
+                  'rules': [{'id': rule, 'shortDescription': {'text': message}}
+                            for rule, message in sorted(self.rules.items())]}
+        header = json.dumps({'$schema': 'https://json.schemastore.org/sarif-2.1.0.json', 'version': '2.1.0',
+                             'runs': [{'tool': {'driver': driver}, 'results': []}]}, sort_keys=True)
+        # the results are written one by one instead of building the whole document in memory
+        head, tail = header.rsplit('"results": []', 1)
+        self.output.write(head.encode('utf-8') + b'"results": [')
+        self.output.write_lines(self.results(quote))
+        self.output.write(b']' + tail.encode('utf-8') + b'\n')
+        self.output.flush()
+
+    def results(self, quote):
+        separator = ''
+        for fname, rule, message, details in self.errors:
+            encode = encode_json_strings({})
+            prefix = '{{"ruleId": {0}, "level": "error", "locations": [{{"physicalLocation": {{' \
+                '"artifactLocation": {{"uri": {1}}}'.format(encode(rule), encode(quote(fname.replace(os.sep, '/'))))
+            for detail, line, column in (details or [(None, None, None)]):
+                line, column = detail_position(line), detail_position(column)
+                region = ''
+                if line:
+                    region = (', "region": {{"startLine": {0}, "startColumn": {1}}}'.format(line, column) if column
+                              else ', "region": {{"startLine": {0}}}'.format(line))
+                text = (u'{0}: {1}'.format(message, detail) if detail else message)
+                yield '{0}{1}{2}}}}}], "message": {{"text": {3}}}}}'.format(separator, prefix, region, encode(text))
+                separator = ', '
+
+
+class CheckstyleReporter(Reporter):
+    '''write all errors in the Checkstyle XML format (e.g. for CI servers) at the end'''
+
+    def __init__(self, output):
+        Reporter.__init__(self, BatchWriter(output))
+        # (file name, [(rule name, message, details)]) in the order of validation
+        self.files = []
+
+    def error(self, fname, rule, message, details):
+        if not self.files or self.files[-1][0] != fname:
+            self.files.append((fname, []))
+        self.files[-1][1].append((rule, message, details))
+
+    def close(self):
+        self.output.write(b'<?xml version="1.0" encoding="UTF-8"?>\n<checkstyle version="4.3">\n')
+        self.output.write_lines(self.lines())
+        self.output.write(b'</checkstyle>\n')
+        self.output.flush()
+
+    def lines(self):
+        from xml.sax.saxutils import quoteattr
+        for fname, errors in self.files:
+            yield '<file name={0}>\n'.format(quoteattr(fname))
+            for rule, message, details in errors:
+                source = quoteattr('codevalidator.' + rule)
+                # the messages of most details are the same
+                texts = {}
+                for detail, line, column in (details or [(None, None, None)]):
+                    line, column = detail_position(line), detail_position(column)
+                    position = ''
+                    if line:
+                        position = (' line="{0}" column="{1}"'.format(line, column) if column
+                                    else ' line="{0}"'.format(line))
+                    text = texts.get(detail)
+                    if text is None:
+                        text = texts[detail] = quoteattr(u'{0}: {1}'.format(message, detail) if detail else message)
+                    yield u'<error{0} severity="error" message={1} source={2}/>\n'.format(position, text, source)
+            yield '</file>\n'
+
+
+# output formats of --format
+REPORTERS = {
+    'checkstyle': CheckstyleReporter,
+    'jsonl': JsonLinesReporter,
+    'sarif': SarifReporter,
+    'text': TextReporter,
+}
+
+REPORTER = TextReporter()
+
+
+def set_reporter(name):
+    '''use a new reporter of the output format, structured formats are written to stdout (instead of messages)'''
+
+    global REPORTER
+    if name == 'text':
+        REPORTER = TextReporter()
+    else:
+        REPORTER = REPORTERS[name](getattr(sys.stdout, 'buffer', sys.stdout))
+        CONFIG['quiet'] = True
+        if CONFIG.get('full_report') is None:
+            # report every offending line
+            CONFIG['full_report'] = True
+    return REPORTER
+
+
+@contextlib.contextmanager
+def collect_reports():
+    '''collect the reported errors in a list instead of printing them (see ListReporter)'''
+
+    global REPORTER
+    previous = REPORTER
+    REPORTER = ListReporter()
+    try:
+        yield REPORTER
+    finally:
+        REPORTER = previous
+
+
+def dir_rules_of_dir(dirname):
+    '''return the names of the directories in the path which have directory rules and their rules (memoized)
+
+    Directories are resolved incrementally, i.e. all files and subdirectories of a directory share its result.'''
+
+    if DIR_RULES_CACHE.get(None) is not CONFIG['dir_rules']:
+        # the configuration changed
+        DIR_RULES_CACHE.clear()
+        DIR_RULES_CACHE[None] = CONFIG['dir_rules']
+    result = DIR_RULES_CACHE.get(dirname)
+    if result is None:
+        head, tail = os.path.split(os.path.abspath(dirname))
+        names = (dir_rules_of_dir(head)[0] if tail else frozenset())
+        if tail in CONFIG['dir_rules']:
+            names = names | frozenset([tail])
+        rules = sum([CONFIG['dir_rules'][rule] for rule in CONFIG['dir_rules'] if rule in names], [])
+        result = DIR_RULES_CACHE[dirname] = (names, rules)
+    return result
+
+
+def get_dir_rules(fname):
+    '''return the directory rules for the file, i.e. the rules of all directories in its path
+
+    >>> get_dir_rules('/src/db_diffs/ABC-1/ABC-1.sql_diff')
+    ['sql_diff_dir', 'sql_diff_sql']
+
+    >>> sorted(get_dir_rules('/src/database/lounge/db_diffs/tables.sql'))
+    ['database_dir', 'sql_diff_dir', 'sql_diff_sql']
+
+    >>> get_dir_rules('/src/lounge/tables.sql')
+    []
+    '''
+
+    head, tail = os.path.split(fname)
+    names, rules = dir_rules_of_dir(head)
+    if tail in CONFIG['dir_rules'] and tail not in names:
+        # a file named like a directory with rules gets them as well
+        names = names | frozenset([tail])
+        rules = sum([CONFIG['dir_rules'][rule] for rule in CONFIG['dir_rules'] if rule in names], [])
+    return rules
+
+
+class Rule(object):
+    '''a rule bound to its validation and fix functions, its configured options and its error message
+
+    Rules of plugins are bound to their entry point, which is only loaded (imported) when the rule is used.'''
+
+    def __init__(self, name, validator=None, fixer=None, options=None, entry_point=None):
+        self.name = name
+        self._validator = validator
+        self._fixer = fixer
+        self.options = options
+        self.entry_point = entry_point
+
+    def load(self):
+        if self.entry_point is not None:
+            plugin = self.entry_point.load()
+            self.entry_point = None
+            if isinstance(plugin, types.ModuleType):
+                # same naming convention as the builtin rules
+                self._validator = getattr(plugin, '_validate_' + self.name)
+                self._fixer = getattr(plugin, '_fix_' + self.name, None)
+            else:
+                self._validator = plugin
+                self._fixer = getattr(plugin, 'fixer', None)
+
+    @property
+    def validator(self):
+        self.load()
+        return self._validator
+
+    @property
+    def fixer(self):
+        self.load()
+        return self._fixer
+
+    @property
+    def message(self):
+        return self.format_message(getattr(self.validator, 'message', self.name))
+
+    def format_message(self, message):
+        return message % (self.options or {})
+
+    def validate(self, fd):
+        '''run the validation function on the file object (or file name for directory rules)'''
+
+        if self.options:
+            return self.validator(fd, self.options)
+        return self.validator(fd)
+
+    def fix(self, src, dst):
+        if self.options:
+            return self.fixer(src, dst, self.options)
+        return self.fixer(src, dst)
+
+
+def plugin_entry_points():
+    '''return the entry points of all installed plugin rules by rule name
+
+    Installed packages are only scanned once and only if a rule is not builtin.'''
+
+    global PLUGIN_ENTRY_POINTS
+    if PLUGIN_ENTRY_POINTS is None:
+        try:
+            from importlib.metadata import entry_points
+        except ImportError:
+            try:
+                import pkg_resources
+            except ImportError:
+                found = []
+            else:
+                found = pkg_resources.iter_entry_points(PLUGIN_ENTRY_POINT_GROUP)
+        else:
+            found = entry_points()
+            if hasattr(found, 'select'):
+                found = found.select(group=PLUGIN_ENTRY_POINT_GROUP)
+            else:
+                found = found.get(PLUGIN_ENTRY_POINT_GROUP, [])
+        PLUGIN_ENTRY_POINTS = dict((entry_point.name, entry_point) for entry_point in found)
+    return PLUGIN_ENTRY_POINTS
+
+
+def get_rule(name):
+    '''return the Rule registered for the rule name or None if there is no validation function
+
+    Builtin rules take precedence over plugin rules (see plugin_entry_points).
+    Rules are bound once and reused for all files, unknown rules are reported only once.
+    The registry is rebuilt if the configured options are replaced.
+
+    >>> get_rule('notabs').message
+    'contains tabs'
+
+    >>> get_rule('notabs') is get_rule('notabs')
+    True
+    '''
+
+    if RULES.get(None) is not CONFIG.get('options'):
+        RULES.clear()
+        RULES[None] = CONFIG.get('options')
+    try:
+        return RULES[name]
+    except KeyError:
+        pass
+    options = CONFIG.get('options', {}).get(name)
+    validator = globals().get('_validate_' + name)
+    if validator:
+        rule = Rule(name, validator, globals().get('_fix_' + name), options)
+    elif name in plugin_entry_points():
+        rule = Rule(name, options=options, entry_point=plugin_entry_points()[name])
+    else:
+        notify(name, 'does not exist')
+        rule = None
+    RULES[name] = rule
+    return rule
+
+
+def build_rules():
+    '''bind all configured rules at startup (see get_rule)'''
+
+    for rules in list(CONFIG['rules'].values()) + list(CONFIG['dir_rules'].values()):
+        for name in rules:
+            get_rule(name)
+
+
+def apply_rule(fname, rule, fd):
+    '''validate the file object (or file name for directory rules) with the rule and report its errors'''
+
+    try:
+        with profiling('rule', rule.name, fname):
+            res = rule.validate(fd)
+    except Exception as e:
+        _error(fname, rule, 'ERROR validating {0}: {1}'.format(rule.name, e))
+    else:
+        if not res:
+            _error(fname, rule)
+        elif type(res) == str:
+            _error(fname, rule, res)
+
+
+def validate_file_dir_rules(fname):
+    for name in get_dir_rules(fname):
+        debug('Validating %s with %s..', fname, name)
+        rule = get_rule(name)
+        if rule:
+            apply_rule(fname, rule, fname)
+
+
+def open_file_for_read(fn):
+    if fn in BUFFERS:
+        @contextlib.contextmanager
+        def buffer_wrapper():
+            fd = BytesIO(BUFFERS[fn])
+            fd.name = fn
+            yield fd
+        return buffer_wrapper()
+    else:
+        return open(fn, 'rb')
+
+
+def open_file_for_write(fn):
+    if CONFIG['filter_mode']:
+        @contextlib.contextmanager
+        def stdout_wrapper():
+            # binary stdout, which must stay open for further output
+            stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+            yield stdout
+            stdout.flush()
+        return stdout_wrapper()
+    else:
+        return open(fn, 'wb')
+
+
+def notify(*args):
+    if not CONFIG['quiet']:
+        print(*args)
+
+
+def debug(msg, *args):
+    '''log a debug message (-vv), the logging module is only imported in this case'''
+
+    if CONFIG['verbose'] and CONFIG['verbose'] > 1:
+        import logging
+        logging.debug(msg, *args)
+
+
+def startup_phase(name):
+    '''record the end of a startup phase for --startup-profile'''
+
+    STARTUP_PHASES.append((name, time.time(), len(sys.modules)))
+
+
+def report_startup_profile():
+    '''print the time spent in each phase after the top-level imports to stderr (like "python -X importtime")'''
+
+    startup_phase('validation')
+    sys.stderr.write('startup profile: self [ms] | cumulative [ms] | loaded modules | phase\n')
+    last = STARTED
+    for name, timestamp, modules in STARTUP_PHASES:
+        sys.stderr.write('startup profile: {0:9.1f} | {1:15.1f} | {2:14} | {3}\n'.format(
+            (timestamp - last) * 1000, (timestamp - STARTED) * 1000, modules, name))
+        last = timestamp
+
+
+# CPU time of this process (without its children)
+cpu_time = getattr(time, 'process_time', None) or time.clock
+
+
+class NoProfiling(object):
+    '''context manager doing nothing, used for the measurements if --profile is not given'''
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+
+NO_PROFILING = NoProfiling()
+
+
+def processed_size(fname):
+    '''return the size of the file (or its buffer) in bytes, 0 if it cannot be determined'''
+
+    if fname in BUFFERS:
+        return len(BUFFERS[fname])
+    try:
+        return os.path.getsize(fname)
+    except (OSError, TypeError):
+        return 0
+
+
+def file_extension(fname):
+    '''
+    >>> file_extension('src/A.Java'), file_extension('Makefile'), file_extension('.bashrc')
+    ('.java', '(none)', '(none)')
+    '''
+
+    return os.path.splitext(fname)[1].lower() or '(none)'
+
+
+def tool_name(args):
+    '''return the name of the external tool run by subprocess.Popen
+
+    >>> tool_name(['/usr/bin/ruby', '-c']), tool_name('phpcs -n --report=csv -')
+    ('ruby', 'phpcs')
+    '''
+
+    if not isinstance(args, (list, tuple)):
+        args = args.split()
+    return (os.path.basename(args[0]) if args else '(none)')
+
+
+class Profiler(object):
+    '''accumulate the number of calls, wall time, CPU time and processed bytes (see --profile) of
+
+    * rules (validation functions) and fixers,
+    * external tools (the CPU time of their processes),
+    * file extensions (everything done to validate a file).'''
+
+    KINDS = ('rule', 'fixer', 'tool', 'extension')
+
+    def __init__(self, top=10, path=None):
+        self.top = top
+        self.path = path
+        # kind => name => [calls, wall time, CPU time, bytes]
+        self.stats = dict((kind, {}) for kind in self.KINDS)
+        self.started = time.time()
+        self.cpu_started = cpu_time()
+        self.children_cpu = children_cpu_time()
+
+    def add(self, kind, name, wall, cpu, size=0):
+        stats = self.stats[kind].get(name)
+        if stats is None:
+            stats = self.stats[kind][name] = [0, 0.0, 0.0, 0]
+        stats[0] += 1
+        stats[1] += wall
+        stats[2] += cpu
+        stats[3] += size
+
+    @contextlib.contextmanager
+    def measure(self, kind, name, fname=None):
+        size = (processed_size(fname) if fname else 0)
+        wall, cpu = time.time(), cpu_time()
+        try:
+            yield
+        finally:
+            self.add(kind, name, time.time() - wall, cpu_time() - cpu, size)
+
+    def add_tool(self, name, wall):
+        '''add a finished process, its CPU time is the one of all children waited for since the last one'''
+
+        cpu = children_cpu_time()
+        self.add('tool', name, wall, cpu - self.children_cpu)
+        self.children_cpu = cpu
+
+    def summary(self):
+        '''return the statistics as dict (as written to the JSON file)'''
+
+        result = {'started': self.started, 'wall': time.time() - self.started,
+                  'cpu': cpu_time() - self.cpu_started, 'argv': sys.argv[1:]}
+        for kind, stats in self.stats.items():
+            result[kind] = dict((name, {'calls': calls, 'wall': wall, 'cpu': cpu, 'bytes': size})
+                                for name, (calls, wall, cpu, size) in stats.items())
+        return result
+
+    def report(self):
+        '''print the top entries (by wall time) of every kind to stderr and write the JSON file'''
+
+        summary = self.summary()
+        write = sys.stderr.write
+        write('profile: total {0:.3f} s wall time, {1:.3f} s CPU time\n'.format(summary['wall'], summary['cpu']))
+        for kind in self.KINDS:
+            stats = sorted(self.stats[kind].items(), key=lambda item: (-item[1][1], item[0]))
+            if not stats:
+                continue
+            write('profile: {0:9} | {1:>8} | {2:>10} | {3:>10} | {4:>10} | {5:>8} | name\n'.format(
+                kind, 'calls', 'wall [s]', 'CPU [s]', 'MiB', 'MiB/s'))
+            for name, (calls, wall, cpu, size) in stats[:self.top]:
+                size = size / 1048576.0
+                write('profile: {0:9} | {1:8} | {2:10.3f} | {3:10.3f} | {4:10.1f} | {5:>8} | {6}\n'.format(
+                    kind, calls, wall, cpu, size, ('{0:.1f}'.format(size / wall) if size and wall else '-'), name))
+        if self.path:
+            with open(self.path, 'w') as fd:
+                json.dump(summary, fd, indent=2, sort_keys=True)
+                fd.write('\n')
+
+
+def children_cpu_time():
+    '''return the CPU time of all terminated (and waited for) child processes'''
+
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def profiled_popen(profiler):
+    '''return a subprocess.Popen class adding the processes of external tools to the profiler once they are reaped'''
+
+    import subprocess
+    popen = subprocess.Popen
+
+    class ProfiledPopen(popen):
+
+        def __init__(self, args, *more, **kwargs):
+            self.profile_name = tool_name(args)
+            self.profile_started = time.time()
+            popen.__init__(self, args, *more, **kwargs)
+
+        def wait(self, *args, **kwargs):
+            try:
+                return popen.wait(self, *args, **kwargs)
+            finally:
+                self.profile_done()
+
+        def poll(self):
+            try:
+                return popen.poll(self)
+            finally:
+                self.profile_done()
+
+        def profile_done(self):
+            if self.returncode is not None and self.profile_name is not None:
+                profiler.add_tool(self.profile_name, time.time() - self.profile_started)
+                self.profile_name = None
+
+    return ProfiledPopen
+
+
+def enable_profile(top=10, path=None):
+    '''start measuring rules, fixers, external tools and file extensions for --profile'''
+
+    global PROFILER
+    import subprocess
+    disable_profile()
+    PROFILER = Profiler(top, path)
+    # restored by disable_profile
+    PROFILER.popen = subprocess.Popen
+    subprocess.Popen = profiled_popen(PROFILER)
+    return PROFILER
+
+
+def disable_profile():
+    '''stop measuring and restore subprocess.Popen, returns the profiler (or None if profiling was not enabled)'''
+
+    global PROFILER
+    import subprocess
+    profiler = PROFILER
+    if profiler is not None:
+        subprocess.Popen = profiler.popen
+        PROFILER = None
+    return profiler
+
+
+def finish_profile():
+    '''stop measuring and print (or write) the statistics'''
+
+    profiler = disable_profile()
+    if profiler is not None:
+        profiler.report()
+
+
+def profiling(kind, name, fname=None):
+    '''return a context manager measuring the enclosed code (which processes the file) for --profile'''
+
+    if PROFILER is None:
+        return NO_PROFILING
+    return PROFILER.measure(kind, name, fname)
+
+
+def validate_file_with_rules(fname, rules):
+    with open_file_for_read(fname) as fd:
+        for name in rules:
+            debug('Validating %s with %s..', fname, name)
+            fd.seek(0)
+            rule = get_rule(name)
+            if rule:
+                apply_rule(fname, rule, fd)
+    clear_file_cache()
+
+
+def is_excluded(fname):
+    '''whether the file is in an excluded directory or matches an excluded file pattern'''
+
+    for exclude in CONFIG['exclude_dirs']:
+        if '/%s/' % exclude in fname:
+            return True
+    head, tail = os.path.split(fname)
+    for exclude in CONFIG['exclude_files']:
+        if fnmatch.fnmatch(tail, exclude):
+            return True
+    return False
+
+
+def validate_file(fname):
+    if is_excluded(fname):
+        return
+    try:
+        with profiling('extension', file_extension(fname), fname):
+            validate_file_dir_rules(fname)
+            validate_file_pattern_rules(fname)
+    finally:
+        clear_file_cache()
+        REPORTER.file_done(fname)
+
+
+def compile_file_patterns(patterns):
+    '''precompile the file patterns of the rules configuration for file_pattern_rules
+
+    Plain extension patterns (like "*.txt") are looked up by the extension of the file name,
+    only the remaining patterns need to be matched with fnmatch.'''
+
+    by_extension = {}
+    others = []
+    for index, (pattern, rules) in enumerate(patterns.items()):
+        pattern = os.path.normcase(pattern)
+        extension = pattern[1:]
+        if pattern.startswith('*.') and not any(c in extension for c in '*?[/') and extension.count('.') == 1:
+            by_extension.setdefault(extension, []).append((index, rules))
+        else:
+            others.append((index, pattern, rules))
+    return by_extension, others
+
+
+def file_pattern_rules(fname):
+    '''return the rules of all patterns matching the file name (in the order of the configuration)
+
+    >>> file_pattern_rules('src/pom.xml') == DEFAULT_RULES + ['xml', 'xmlfmt', 'pomdesc']
+    True
+
+    >>> sorted(file_pattern_rules('my file.txt'))
+    ['invalidpath', 'nobom', 'nocr', 'notabs', 'notrailingws', 'utf8']
+    '''
+
+    if FILE_PATTERNS.get(None) is not CONFIG['rules']:
+        FILE_PATTERNS[None] = CONFIG['rules']
+        FILE_PATTERNS['compiled'] = compile_file_patterns(CONFIG['rules'])
+    by_extension, others = FILE_PATTERNS['compiled']
+    fname = os.path.normcase(fname)
+    matches = list(by_extension.get(fname[fname.rfind('.'):], [])) if '.' in fname else []
+    for index, pattern, rules in others:
+        if fnmatch.fnmatchcase(fname, pattern):
+            matches.append((index, rules))
+    matches.sort(key=lambda match: match[0])
+    result = []
+    for index, rules in matches:
+        for rule in rules:
+            if rule not in result:
+                result.append(rule)
+    return result
+
+
+def validate_file_pattern_rules(fname):
+    # all rules of matching patterns are applied at once to share the file contents and parsed trees
+    rules = file_pattern_rules(fname)
+    if not rules:
+        return
+    kind = classify_file(fname)
+    if kind:
+        rules = filter_rules_for_kind(fname, kind, rules)
+    if rules:
+        validate_file_with_rules(fname, rules)
+
+
+def classify_file(fname):
+    '''check whether the file looks binary (contains NUL bytes) or exceeds the configured size limit
+
+    Returns "binary", "oversized" or None for regular text files.'''
+
+    if CONFIG['filter_mode'] or fname in BUFFERS:
+        # the buffer piped in (or sent) by an editor is always validated
+        return None
+    try:
+        if CONFIG.get('binary_files', 'bytes') != 'all':
+            with open(fname, 'rb') as fd:
+                if b'\0' in fd.read(BINARY_SNIFF_SIZE):
+                    return 'binary'
+        max_size = CONFIG.get('max_file_size')
+        if max_size and os.path.getsize(fname) > max_size:
+            return 'oversized'
+    except (IOError, OSError):
+        # let the rules report unreadable files
+        pass
+    return None
+
+
+def filter_rules_for_kind(fname, kind, rules):
+    '''reduce the rules for a binary or oversized file according to the configured action'''
+
+    action = CONFIG.get(kind + '_files', 'all')
+    if action == 'skip':
+        remaining = [rule for rule in rules if rule in PATH_RULES]
+    elif action == 'bytes':
+        remaining = [rule for rule in rules if rule in BYTE_LEVEL_RULES]
+    elif action == 'stream':
+        remaining = [rule for rule in rules if rule in STREAMING_RULES]
+    else:
+        remaining = rules
+    if len(remaining) < len(rules):
+        skipped = [rule for rule in rules if rule not in remaining]
+        SKIPPED_FILES.append((fname, kind, skipped))
+    return remaining
+
+
+def report_skipped_files():
+    '''print files which were (partially) skipped because they are binary or too large'''
+
+    for fname, kind, rules in SKIPPED_FILES:
+        reason = ('binary file' if kind == 'binary' else 'file too large')
+        notify('{0}: skipped {1} ({2})'.format(fname, ', '.join(rules), reason))
+
+
+def translate_gitignore_pattern(pattern):
+    '''translate a single .gitignore pattern (without "!" prefix and "/" suffix) to a regular expression
+
+    >>> bool(re.match(translate_gitignore_pattern('*.pyc'), 'a/b.pyc'))
+    True
+
+    >>> bool(re.match(translate_gitignore_pattern('/build'), 'src/build'))
+    False
+
+    >>> bool(re.match(translate_gitignore_pattern('docs/**/*.html'), 'docs/a/b/index.html'))
+    True
+
+    >>> bool(re.match(translate_gitignore_pattern('a/*.txt'), 'a/b/c.txt'))
+    False
+    '''
+
+    # patterns containing a slash are relative to the .gitignore location, others match at any level
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    i, n = 0, len(pattern)
+    res = []
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            at_segment_start = i == 0 or pattern[i - 1] == '/'
+            if pattern[i:i + 3] == '**/' and at_segment_start:
+                res.append('(?:.*/)?')
+                i += 3
+                continue
+            if pattern[i:i + 2] == '**' and i + 2 == n and at_segment_start:
+                res.append('.*')
+                i += 2
+                continue
+            res.append('[^/]*')
+            while i < n and pattern[i] == '*':
+                i += 1
+            continue
+        elif c == '?':
+            res.append('[^/]')
+        elif c == '[':
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                res.append('\\[')
+            else:
+                stuff = pattern[i + 1:j].replace('\\', '\\\\')
+                if stuff[0] in '!^':
+                    stuff = '^' + stuff[1:]
+                res.append('[' + stuff + ']')
+                i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            res.append(re.escape(pattern[i]))
+        else:
+            res.append(re.escape(c))
+        i += 1
+    return ('' if anchored else '(?:.*/)?') + ''.join(res) + '$'
+
+
+class GitIgnore(object):
+
+    '''compiled patterns of a single .gitignore (or .git/info/exclude) file
+
+    >>> ign = GitIgnore('/repo', ['*.log', '!keep.log', 'build/'])
+    >>> ign.match('x/error.log', False), ign.match('keep.log', False), ign.match('build', True)
+    (True, False, True)
+    >>> ign.match('build', False) is None
+    True
+    '''
+
+    def __init__(self, base, lines):
+        self.base = base
+        self.rules = []
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if not line or line.startswith('#'):
+                continue
+            # trailing spaces are ignored unless escaped with a backslash
+            while line.endswith(' ') and not line.endswith('\\ '):
+                line = line[:-1]
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            elif line.startswith('\\!') or line.startswith('\\#'):
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if line:
+                self.rules.append((re.compile(translate_gitignore_pattern(line)), negate, dir_only))
+        # without negations the order does not matter and all patterns can be checked with a single regex
+        self.combined = None
+        if self.rules and not any(negate for _, negate, _ in self.rules):
+            all_patterns = [regex.pattern for regex, _, _ in self.rules]
+            file_patterns = [regex.pattern for regex, _, dir_only in self.rules if not dir_only]
+            self.combined = (re.compile('|'.join(file_patterns)) if file_patterns else None,
+                             re.compile('|'.join(all_patterns)))
+
+    @classmethod
+    def from_file(cls, base, path):
+        '''load the given ignore file, returns None if it does not exist or has no patterns'''
+
+        try:
+            with open(path, 'rb') as fd:
+                lines = fd.read().decode('utf-8', 'replace').splitlines()
+        except (IOError, OSError):
+            return None
+        ignore = cls(base, lines)
+        return ignore if ignore.rules else None
+
+    def relative(self, root, name):
+        '''path of "name" in directory "root" (both absolute) relative to our base, using "/" separators'''
+
+        prefix = root[len(self.base):].strip(os.sep)
+        if not prefix:
+            return name
+        return prefix.replace(os.sep, '/') + '/' + name
+
+    def match(self, relpath, is_dir):
+        '''return True if the path is ignored, False if it is explicitly re-included and None otherwise'''
+
+        if self.combined:
+            regex = self.combined[1] if is_dir else self.combined[0]
+            return (True if regex and regex.match(relpath) else None)
+        # last matching pattern wins
+        for regex, negate, dir_only in reversed(self.rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relpath):
+                return not negate
+        return None
+
+
+def find_git_root(path):
+    '''return the closest directory containing ".git" (starting at the given absolute path) or None'''
+
+    while True:
+        if os.path.isdir(os.path.join(path, '.git')):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def load_parent_gitignores(path):
+    '''collect ignore files which apply to the (absolute) directory path, but are located above it
+
+    Returns a list of GitIgnore objects ordered by increasing precedence.'''
+
+    git_root = find_git_root(path)
+    if not git_root:
+        return []
+    ignores = [GitIgnore.from_file(git_root, os.path.join(git_root, '.git', 'info', 'exclude'))]
+    parent_dirs = []
+    directory = path
+    while directory != git_root:
+        directory = os.path.dirname(directory)
+        parent_dirs.append(directory)
+    for directory in reversed(parent_dirs):
+        ignores.append(GitIgnore.from_file(directory, os.path.join(directory, '.gitignore')))
+    return [ignore for ignore in ignores if ignore]
+
+
+def is_gitignored(ignores, root, name, is_dir):
+    '''check file/directory "name" in absolute directory "root" against the given GitIgnore stack'''
+
+    # deeper ignore files take precedence over ones in parent directories
+    for ignore in reversed(ignores):
+        res = ignore.match(ignore.relative(root, name), is_dir)
+        if res is not None:
+            return res
+    return False
+
+
+def walk_directory(path, gitignore=None):
+    '''walk the directory tree, skipping excluded directories and (optionally) files ignored by .gitignore
+
+    Yields the directory, its GitIgnore stack and the names of the files to validate for every walked directory.'''
+
+    if gitignore is None:
+        gitignore = CONFIG.get('gitignore', False)
+    # stack of GitIgnore objects for every directory still to be walked
+    ignores_by_dir = {}
+    if gitignore:
+        ignores_by_dir[path] = load_parent_gitignores(os.path.abspath(path))
+    for root, dirnames, filenames in os.walk(path):
+        for exclude in CONFIG['exclude_dirs']:
+            if exclude in dirnames:
+                dirnames.remove(exclude)
+        ignores = []
+        if gitignore:
+            abs_root = os.path.abspath(root)
+            ignores = ignores_by_dir.pop(root)
+            own = GitIgnore.from_file(abs_root, os.path.join(abs_root, '.gitignore'))
+            if own:
+                ignores = ignores + [own]
+            if ignores:
+                # prune ignored directories so they are never walked
+                dirnames[:] = [d for d in dirnames if not is_gitignored(ignores, abs_root, d, True)]
+                filenames = [f for f in filenames if not is_gitignored(ignores, abs_root, f, False)]
+            for d in dirnames:
+                ignores_by_dir[os.path.join(root, d)] = ignores
+        yield root, ignores, filenames
+
+
+def path_filter(path, exclude_patterns, include_patterns):
+    '''return a function checking whether a file below the directory matches the include and exclude patterns
+
+    >>> accept = path_filter('src', ['*.log'], ['keep.log'])
+    >>> accept('src/a.txt'), accept('src/b.log'), accept('src/keep.log')
+    (True, False, True)
+    '''
+
+    exclude_patterns = [os.path.join(path, pattern) for pattern in exclude_patterns or []]
+    include_patterns = [os.path.join(path, pattern) for pattern in include_patterns or []]
+
+    def accept(fname):
+        match_excluded = any(fnmatch.fnmatch(fname, pattern) for pattern in exclude_patterns)
+        match_included = any(fnmatch.fnmatch(fname, pattern) for pattern in include_patterns)
+
+        if exclude_patterns:
+            return not match_excluded or match_included
+        else:
+            return match_included or not include_patterns
+
+    return accept
+
+
+def validate_directory(path, exclude_patterns, include_patterns, gitignore=None):
+    accept = path_filter(path, exclude_patterns, include_patterns)
+    for root, ignores, filenames in walk_directory(path, gitignore):
+        for fname in filenames:
+            fname = os.path.join(root, fname)
+            if accept(fname):
+                validate_file(fname)
+
+
+def fix_file(fname, rules):
     was_fixed = True
     if CONFIG.get('create_backup', True):
         dirname, basename = os.path.split(fname)
+        import shutil
         shutil.copy2(fname, os.path.join(dirname, CONFIG['backup_filename'].format(original=basename)))  # creates a backup
-    with open_file_for_read(fname) as fd:
-        dst = fd
-        for rule in rules:
-            func = globals().get('_fix_' + rule)
-            if func:
-                notify('{0}: Trying to fix {1}..'.format(fname, rule))
-                options = CONFIG.get('options', {}).get(rule)
+    fixers = [rule for rule in (get_rule(name) for name in rules) if rule and rule.fixer]
+    staged = None
+    try:
+        with open_file_for_read(fname) as fd:
+            dst = fd
+            for rule in fixers:
+                notify('{0}: Trying to fix {1}..'.format(fname, rule.name))
                 src = dst
-                dst = StringIO()
                 src.seek(0)
+                if rule is fixers[-1] and was_fixed and CONFIG['filter_mode'] and \
+                        getattr(rule.fixer, 'streaming', False):
+                    # the last fix function writes to a temporary file instead of keeping another copy of the file
+                    # in memory, stdout only gets the output if it succeeds
+                    import tempfile
+                    dst = staged = tempfile.TemporaryFile()
+                else:
+                    dst = BytesIO()
                 try:
-                    if options:
-                        func(src, dst, options)
-                    else:
-                        func(src, dst)
+                    with profiling('fixer', rule.name, fname):
+                        rule.fix(src, dst)
                     was_fixed &= True
                 except Exception as e:
                     was_fixed = False
-                    notify('{0}: ERROR fixing {1}: {2}'.format(fname, rule, e))
-
-    fixed = (dst.getvalue() if hasattr(dst, 'getvalue') else '')
-    # if the length of the fixed code is 0 we don't write the fixed version because either:
-    # a) is not worth it
-    # b) some fix functions destroyed the code
-    if was_fixed and len(fixed) > 0:
-        with open_file_for_write(fname) as fd:
-            fd.write(fixed.encode())
-        return True
-    else:
-        notify('{0}: ERROR fixing file. File remained unchanged'.format(fname))
-        return False
+                    notify('{0}: ERROR fixing {1}: {2}'.format(fname, rule.name, e))
+
+        if staged is not None:
+            staged.seek(0, os.SEEK_END)
+            size = staged.tell()
+        else:
+            fixed = (dst.getvalue() if hasattr(dst, 'getvalue') else b'')
+            size = len(fixed)
+        # if the length of the fixed code is 0 we don't write the fixed version because either:
+        # a) is not worth it
+        # b) some fix functions destroyed the code
+        if was_fixed and size > 0:
+            with open_file_for_write(fname) as fd:
+                if staged is not None:
+                    import shutil
+                    staged.seek(0)
+                    shutil.copyfileobj(staged, fd, STREAM_CHUNK_SIZE)
+                else:
+                    fd.write(fixed)
+            return True
+        else:
+            notify('{0}: ERROR fixing file. File remained unchanged'.format(fname))
+            return False
+    finally:
+        if staged is not None:
+            staged.close()
 
 
 def fix_files():
@@ -919,7 +2774,1096 @@ def get_dirs(path):
         return []
 
 
-def main():
+def collect_violations(fname):
+    '''validate the file and return its violations as set of (message, line, column, detail) tuples'''
+
+    errors = len(VALIDATION_ERRORS)
+    VALIDATION_DETAILS[:] = []
+    try:
+        with collect_reports() as collector:
+            validate_file(fname)
+        violations = set()
+        for _fname, name, message, details in collector.reports:
+            if not details:
+                violations.add((message, None, None, None))
+            for detail, line, column in details:
+                violations.add((message, line, column, detail))
+        return violations
+    finally:
+        del VALIDATION_ERRORS[errors:]
+        del SKIPPED_FILES[:]
+
+
+def format_violation(fname, violation):
+    '''
+    >>> format_violation('a.txt', ('contains tabs', 2, 5, 'tab found'))
+    'a.txt: contains tabs (line 2, col 5: tab found)'
+    '''
+
+    message, line, column, detail = violation
+    if line and column:
+        detail = 'line {0}, col {1}: {2}'.format(line, column, detail)
+    elif line:
+        detail = 'line {0}: {1}'.format(line, detail)
+    return '{0}: {1}'.format(fname, message) + (' ({0})'.format(detail) if detail else '')
+
+
+class Inotify(object):
+    '''minimal binding of the Linux inotify API (via ctypes) to watch directories for changed files (see --watch)'''
+
+    CLOSE_WRITE = 0x8
+    MOVED_FROM = 0x40
+    MOVED_TO = 0x80
+    CREATE = 0x100
+    DELETE = 0x200
+    DELETE_SELF = 0x400
+    MOVE_SELF = 0x800
+    Q_OVERFLOW = 0x4000
+    IGNORED = 0x8000
+    ONLYDIR = 0x1000000
+    ISDIR = 0x40000000
+    CLOEXEC = 0o2000000
+
+    MASK = CLOSE_WRITE | MOVED_FROM | MOVED_TO | CREATE | DELETE | DELETE_SELF | MOVE_SELF | ONLYDIR
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.errno = ctypes.get_errno
+        # raises AttributeError if the C library has no inotify support
+        self.fd = self.libc.inotify_init1(self.CLOEXEC)
+        if self.fd < 0:
+            raise OSError(self.errno(), os.strerror(self.errno()))
+        # watch descriptor => directory
+        self.paths = {}
+
+    def add_watch(self, path):
+        name = path.encode(sys.getfilesystemencoding()) if not isinstance(path, bytes) else path
+        wd = self.libc.inotify_add_watch(self.fd, name, self.MASK)
+        if wd < 0:
+            raise OSError(self.errno(), os.strerror(self.errno()), path)
+        self.paths[wd] = path
+
+    def remove_watch(self, path):
+        for wd, directory in list(self.paths.items()):
+            if directory == path:
+                # fails if the directory was deleted already, which removed the watch as well
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.paths[wd]
+
+    def read(self, timeout=None):
+        '''return the events received within the timeout (seconds, None to wait) as (directory, mask, name) tuples'''
+
+        import select
+        import struct
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, length = struct.unpack_from('iIII', data, pos)
+            name = data[pos + 16:pos + 16 + length].rstrip(b'\0')
+            pos += 16 + length
+            if running_on_py3:
+                name = os.fsdecode(name)
+            directory = self.paths.get(wd)
+            if mask & self.IGNORED:
+                self.paths.pop(wd, None)
+            elif directory is not None or mask & self.Q_OVERFLOW:
+                events.append((directory, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher(object):
+    '''fallback for systems without inotify: compares the listings of the watched directories periodically
+
+    Reports the same events as Inotify.'''
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        # directory => {name: (is directory, modification time, size)}
+        self.listings = {}
+
+    def listing(self, path):
+        import stat
+        try:
+            names = os.listdir(path)
+        except EnvironmentError:
+            return None
+        listing = {}
+        for name in names:
+            try:
+                st = os.stat(os.path.join(path, name))
+            except EnvironmentError:
+                continue
+            listing[name] = (stat.S_ISDIR(st.st_mode), st.st_mtime, st.st_size)
+        return listing
+
+    def add_watch(self, path):
+        listing = self.listing(path)
+        if listing is None:
+            raise OSError(errno.ENOENT, 'cannot list directory', path)
+        self.listings[path] = listing
+
+    def remove_watch(self, path):
+        self.listings.pop(path, None)
+
+    def read(self, timeout=None):
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        events = []
+        for directory, old in list(self.listings.items()):
+            new = self.listing(directory)
+            if new is None:
+                # the deletion is reported by the parent directory
+                del self.listings[directory]
+                continue
+            self.listings[directory] = new
+            for name, entry in new.items():
+                isdir = (Inotify.ISDIR if entry[0] else 0)
+                if name not in old or old[name][0] != entry[0]:
+                    events.append((directory, Inotify.CREATE | isdir, name))
+                elif entry != old[name] and not isdir:
+                    events.append((directory, Inotify.CLOSE_WRITE, name))
+            for name, entry in old.items():
+                if name not in new:
+                    events.append((directory, Inotify.DELETE | (Inotify.ISDIR if entry[0] else 0), name))
+        return events
+
+    def close(self):
+        pass
+
+
+class DirectoryWatcher(object):
+    '''validate all files below the directories once, then only the changed files again (see --watch)
+
+    The violations of every file are kept to print only newly introduced (+) and resolved (-) violations.
+    Events are collected until no file changed for "watch_delay" seconds (e.g. during a branch checkout).'''
+
+    def __init__(self, paths, exclude_patterns, include_patterns, notifier):
+        self.paths = paths
+        self.filters = dict((path, path_filter(path, exclude_patterns, include_patterns)) for path in paths)
+        self.gitignore = CONFIG.get('gitignore', False)
+        self.notifier = notifier
+        # watched directory => (path filter, GitIgnore stack)
+        self.dirs = {}
+        # file name => violations (only files with violations)
+        self.violations = {}
+
+    def scan(self, path, accept):
+        '''watch the directory tree and return the files to validate'''
+
+        fnames = []
+        for root, ignores, filenames in walk_directory(path, self.gitignore):
+            if root not in self.dirs:
+                try:
+                    self.notifier.add_watch(root)
+                except EnvironmentError:
+                    # removed in the meantime
+                    continue
+            self.dirs[root] = (accept, ignores)
+            fnames.extend(fname for fname in (os.path.join(root, name) for name in filenames) if accept(fname))
+        return fnames
+
+    def forget(self, path):
+        '''stop watching the (removed) directory tree, returns the files with violations in it'''
+
+        prefix = os.path.join(path, '')
+        for directory in list(self.dirs):
+            if directory == path or directory.startswith(prefix):
+                del self.dirs[directory]
+                self.notifier.remove_watch(directory)
+        return [fname for fname in self.violations if fname.startswith(prefix)]
+
+    def validate(self, fnames, removed=()):
+        '''validate the files again and print the changed violations'''
+
+        introduced = resolved = 0
+        changes = [(fname, collect_violations(fname)) for fname in sorted(set(fnames))]
+        changes += [(fname, set()) for fname in sorted(set(removed))]
+        for fname, violations in changes:
+            old = self.violations.pop(fname, set())
+            if violations:
+                self.violations[fname] = violations
+
+            def key(violation):
+                return violation[1] or 0, violation[2] or 0, violation[0], violation[3] or ''
+
+            for violation in sorted(old - violations, key=key):
+                notify('-', format_violation(fname, violation))
+                resolved += 1
+            for violation in sorted(violations - old, key=key):
+                notify('+', format_violation(fname, violation))
+                introduced += 1
+        total = sum(len(violations) for violations in self.violations.values())
+        notify('{0} files: {1} new, {2} resolved, {3} violations in total'.format(
+            len(changes), introduced, resolved, total))
+
+    def start(self):
+        fnames = []
+        for path in self.paths:
+            fnames.extend(self.scan(path, self.filters[path]))
+        self.validate(fnames)
+
+    def wait(self):
+        '''wait for file changes and return all events until no file changed for "watch_delay" seconds'''
+
+        events = []
+        while not events:
+            events = self.notifier.read()
+        delay = CONFIG.get('watch_delay', 0.2)
+        while True:
+            more = self.notifier.read(delay)
+            if not more:
+                return events
+            events.extend(more)
+
+    def handle(self, events):
+        '''validate the files changed according to the events (and walk new directories)'''
+
+        changed = set()
+        removed = set()
+        new_dirs = {}
+        rescan = False
+        for directory, mask, name in events:
+            if mask & Inotify.Q_OVERFLOW:
+                # events were lost
+                rescan = True
+                continue
+            if directory not in self.dirs:
+                continue
+            if not name:
+                if mask & (Inotify.DELETE_SELF | Inotify.MOVE_SELF):
+                    removed.update(self.forget(directory))
+                continue
+            path = os.path.join(directory, name)
+            accept, ignores = self.dirs[directory]
+            if mask & Inotify.ISDIR:
+                if mask & (Inotify.DELETE | Inotify.MOVED_FROM):
+                    new_dirs.pop(path, None)
+                    removed.update(self.forget(path))
+                elif name not in CONFIG['exclude_dirs'] and \
+                        not (ignores and is_gitignored(ignores, os.path.abspath(directory), name, True)):
+                    new_dirs[path] = accept
+            elif mask & (Inotify.DELETE | Inotify.MOVED_FROM):
+                changed.discard(path)
+                removed.add(path)
+            elif self.gitignore and name == '.gitignore':
+                # files may be ignored (or not ignored) now
+                rescan = True
+            elif accept(path) and not (ignores and is_gitignored(ignores, os.path.abspath(directory), name, False)):
+                removed.discard(path)
+                changed.add(path)
+        if rescan:
+            watched = set(self.dirs)
+            self.dirs = {}
+            fnames = []
+            for path in self.paths:
+                fnames.extend(self.scan(path, self.filters[path]))
+            for directory in watched - set(self.dirs):
+                self.notifier.remove_watch(directory)
+            changed = set(fnames)
+            removed = set(self.violations) - changed
+        else:
+            for path, accept in new_dirs.items():
+                changed.update(self.scan(path, accept))
+        if changed or removed:
+            self.validate(changed, removed)
+
+    def run(self):
+        self.start()
+        while True:
+            self.handle(self.wait())
+
+
+def watch_directories(paths, exclude_patterns, include_patterns):
+    '''validate the directories and watch them for changes until interrupted, returns the exit code'''
+
+    try:
+        notifier = Inotify()
+    except (AttributeError, EnvironmentError):
+        debug('inotify is not available, polling for changes')
+        notifier = PollingWatcher()
+    if CONFIG.get('full_report') is None:
+        # report every offending line to see which ones were introduced or resolved
+        CONFIG['full_report'] = True
+    watcher = DirectoryWatcher(paths, exclude_patterns, include_patterns, notifier)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        notifier.close()
+    return (1 if watcher.violations else 0)
+
+
+def iter_file_names(fd, separator=b'\n'):
+    '''yield the file names read from the binary file object as soon as they are complete
+
+    >>> list(iter_file_names(BytesIO(b'a.txt\\0new\\nline.txt\\0'), b'\\0')) == ['a.txt', 'new\\nline.txt']
+    True
+    '''
+
+    # do not wait for a full block from pipes (e.g. "find -print0 | codevalidator --files-from - -0")
+    read = (fd.read1 if hasattr(fd, 'read1') else fd.read)
+    pending = b''
+    while True:
+        chunk = read(STREAM_CHUNK_SIZE)
+        names = (pending + chunk).split(separator)
+        # the last name is incomplete until the end of the file
+        pending = (names.pop() if chunk else b'')
+        for name in names:
+            if separator == b'\n':
+                name = name.rstrip(b'\r')
+            if name:
+                yield (os.fsdecode(name) if running_on_py3 else name)
+        if not chunk:
+            break
+
+
+def read_file_list(path, separator=b'\n'):
+    '''yield the file names listed in the file ("-" for stdin), see --files-from'''
+
+    if path == '-':
+        for name in iter_file_names(getattr(sys.stdin, 'buffer', sys.stdin), separator):
+            yield name
+    else:
+        with open(path, 'rb') as fd:
+            for name in iter_file_names(fd, separator):
+                yield name
+
+
+def filter_file(fname, fix):
+    '''validate the buffer of the file (see BUFFERS) and write the messages or the fixed file to stdout
+
+    Returns the exit code.'''
+
+    validate_file(fname)
+    if not fix:
+        return (1 if VALIDATION_ERRORS else 0)
+    if VALIDATION_ERRORS:
+        return (0 if fix_file(fname, [rule for (_fn, rule) in VALIDATION_ERRORS]) else 1)
+    # just copy the buffer to stdout
+    with open_file_for_write(fname) as stdout:
+        stdout.write(BUFFERS[fname])
+    return 0
+
+
+def filter_frames(fix):
+    '''filter any number of files read as frames from stdin (see --framed), returns the highest exit code
+
+    Every file is sent as frame with the file name (request channel) followed by a frame with its contents (stdin
+    channel). The output of every file is sent as stdout frames followed by an exit frame (see serve).'''
+
+    stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+    stdout = sys.stdout
+    output = getattr(stdout, 'buffer', stdout)
+    code = 0
+    while True:
+        try:
+            channel, name = recv_frame(stdin)
+        except EOFError:
+            break
+        content_channel, contents = recv_frame(stdin)
+        if channel != CHANNEL_REQUEST or content_channel != CHANNEL_STDIN:
+            raise ExecutionError('expected frames with file name and contents')
+        fname = name.decode('utf-8')
+        BUFFERS[fname] = contents
+        sys.stdout = FrameWriter(output, CHANNEL_STDOUT)
+        try:
+            result = filter_file(fname, fix)
+        finally:
+            sys.stdout = stdout
+            del BUFFERS[fname]
+            VALIDATION_ERRORS[:] = []
+            VALIDATION_DETAILS[:] = []
+            SKIPPED_FILES[:] = []
+        send_frame(output, CHANNEL_EXIT, str(result).encode())
+        output.flush()
+        code = max(code, result)
+    return code
+
+
+def load_config(path):
+    '''return the parsed JSON configuration file, cached by modification time
+
+    The cache keeps the parsed objects (and thereby the rule registry, see get_rule) valid across daemon requests.'''
+
+    mtime = os.path.getmtime(path)
+    cached = CONFIG_FILES.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as fd:
+            cached = CONFIG_FILES[path] = (mtime, json.loads(fd.read().decode()))
+    return cached[1]
+
+
+def default_socket_path():
+    '''return the socket path of the daemon: in the per-user runtime directory or a private directory in /tmp'''
+
+    if os.environ.get('CODEVALIDATOR_SOCKET'):
+        return os.environ['CODEVALIDATOR_SOCKET']
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], 'codevalidator.sock')
+    return '/tmp/codevalidator-{0}/daemon.sock'.format(os.getuid())
+
+
+def check_socket_path(path):
+    '''raise an ExecutionError unless the socket (if it exists) and its directory belong to the current user
+
+    Otherwise another user could receive the requests of the client or make the daemon remove their socket.
+    Raises an EnvironmentError if the directory does not exist.'''
+
+    import stat
+    directory = os.path.dirname(os.path.abspath(path))
+    st = os.lstat(directory)
+    if st.st_uid != os.getuid() or not stat.S_ISDIR(st.st_mode) or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise ExecutionError('{0} is not a directory owned and only writable by the current user'.format(directory))
+    try:
+        st = os.lstat(path)
+    except EnvironmentError as e:
+        if e.errno == errno.ENOENT:
+            return
+        raise
+    if st.st_uid != os.getuid() or not stat.S_ISSOCK(st.st_mode):
+        raise ExecutionError('{0} is not a socket owned by the current user'.format(path))
+
+
+def send_frame(sock, channel, data):
+    '''send a frame of the daemon protocol (see serve) to the socket or binary file object'''
+
+    import struct
+    frame = struct.pack('!BI', channel, len(data)) + data
+    if hasattr(sock, 'sendall'):
+        sock.sendall(frame)
+    else:
+        sock.write(frame)
+
+
+def recv_exactly(sock, size):
+    read = getattr(sock, 'recv', None) or sock.read
+    chunks = []
+    while size:
+        chunk = read(min(size, STREAM_CHUNK_SIZE))
+        if not chunk:
+            raise EOFError('connection closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock):
+    '''receive a frame of the daemon protocol (see serve) from the socket or binary file, returns (channel, data)'''
+
+    import struct
+    channel, size = struct.unpack('!BI', recv_exactly(sock, 5))
+    return channel, recv_exactly(sock, size)
+
+
+class FrameWriter(object):
+    '''file-like object sending everything written to the client as frames of the channel (stdout or stderr)'''
+
+    def __init__(self, sock, channel):
+        self.sock = sock
+        self.channel = channel
+        # binary interface like sys.stdout.buffer
+        self.buffer = self
+
+    def write(self, data):
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        if data:
+            send_frame(self.sock, self.channel, data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        # the filter mode "closes" stdout after writing the fixed file
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FrameReader(io.RawIOBase):
+    '''readable raw stream receiving the data of the channel (stdin) from the client as frames when it is read
+
+    An empty frame marks the end of the stream.'''
+
+    def __init__(self, sock, channel):
+        io.RawIOBase.__init__(self)
+        self.sock = sock
+        self.channel = channel
+        self.pending = b''
+        self.eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.pending and not self.eof:
+            channel, data = recv_frame(self.sock)
+            if channel != self.channel:
+                raise ExecutionError('expected frame of channel {0}, got {1}'.format(self.channel, channel))
+            self.pending = data
+            self.eof = not data
+        size = min(len(b), len(self.pending))
+        b[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def send_stream(sock, channel, fd):
+    '''send the binary file object as frames of the channel as it is read, followed by an empty frame'''
+
+    read = (fd.read1 if hasattr(fd, 'read1') else fd.read)
+    while True:
+        chunk = read(STREAM_CHUNK_SIZE)
+        send_frame(sock, channel, chunk)
+        if not chunk:
+            break
+
+
+def warm_up():
+    '''prepare the state inherited by all daemon requests: bind the configured rules and import their dependencies'''
+
+    build_rules()
+    for name, rule in list(RULES.items()):
+        if name is not None and rule:
+            try:
+                rule.load()
+            except Exception as e:
+                notify(rule.name, 'cannot be loaded:', e)
+    for name in DAEMON_PRELOAD_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+
+def handle_request(conn):
+    '''run main() for a client request (in the forked worker process), returns the exit code'''
+
+    channel, request = recv_frame(conn)
+    request = json.loads(request.decode('utf-8'))
+    os.chdir(request['cwd'])
+    if 'env' in request:
+        # external tools and the configuration (~/.codevalidatorrc) use the environment of the client
+        os.environ.clear()
+        os.environ.update(request['env'])
+    # stdin is received while it is read, e.g. the file names of --files-from are validated as they arrive
+    stdin = io.BufferedReader(FrameReader(conn, CHANNEL_STDIN), STREAM_CHUNK_SIZE)
+    if running_on_py3:
+        sys.stdin = io.TextIOWrapper(stdin, encoding='utf-8')
+    else:
+        sys.stdin = stdin
+    sys.stdout = FrameWriter(conn, CHANNEL_STDOUT)
+    sys.stderr = FrameWriter(conn, CHANNEL_STDERR)
+    try:
+        main(request['argv'])
+        code = 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            code = e.code or 0
+        else:
+            sys.stderr.write('{0}\n'.format(e.code))
+            code = 1
+    except (Exception, ConfigurationError, ExecutionError):
+        import traceback
+        traceback.print_exc()
+        code = 1
+    # the worker exits without running the atexit handlers
+    finish_profile()
+    send_frame(conn, CHANNEL_EXIT, str(code).encode())
+    return code
+
+
+def serve(path):
+    '''run the validation daemon on the Unix socket
+
+    The daemon loads the configuration, rules and their dependencies once. Every request is handled by a forked
+    worker process which inherits this state, so requests cannot affect each other (or the daemon).
+
+    Frames consist of the channel (1 byte), the length of the data (4 bytes, network byte order) and the data.
+    A request is a JSON frame with the command line arguments, working directory and environment of the client,
+    followed by frames with the standard input (sent while the worker reads it) and an empty frame at its end.
+    The worker replies with stdout and stderr frames and finally the exit code.'''
+
+    import signal
+    import socket
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+    check_socket_path(path)
+    if connect_daemon(path):
+        raise ExecutionError('another daemon is already listening on {0}'.format(path))
+    if os.path.exists(path):
+        # stale socket of a daemon which did not shut down
+        os.unlink(path)
+    warm_up()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o077)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen(64)
+    # finished workers are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    # remove the socket when being terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    notify('Listening on {0}'.format(path))
+    try:
+        while True:
+            try:
+                conn, address = server.accept()
+            except EnvironmentError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if os.fork() == 0:
+                server.close()
+                # rules waiting for their subprocesses need the default handlers
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                code = 1
+                try:
+                    code = handle_request(conn)
+                finally:
+                    conn.close()
+                    os._exit(code)
+            conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.unlink(path)
+
+
+def connect_daemon(path):
+    '''return a socket connected to the daemon or None if no daemon is listening
+
+    Raises an ExecutionError if the socket does not belong to the current user (see check_socket_path).'''
+
+    import socket
+    try:
+        check_socket_path(path)
+    except EnvironmentError:
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except EnvironmentError:
+        sock.close()
+        return None
+    return sock
+
+
+def run_client(argv, path, stdin=None):
+    '''forward the command line (and stdin in filter mode or with --files-from -) to the daemon and replay its output
+
+    Returns the exit code or None if no daemon is listening on the socket (or it cannot be trusted).'''
+
+    try:
+        sock = connect_daemon(path)
+    except ExecutionError as e:
+        sys.stderr.write('codevalidator daemon not used: {0}\n'.format(e))
+        return None
+    if sock is None:
+        return None
+    try:
+        if stdin is None:
+            reads_stdin = '--filter' in argv or '--files-from=-' in argv or \
+                any(arg == '--files-from' and value == '-' for arg, value in zip(argv, argv[1:]))
+            stdin = (getattr(sys.stdin, 'buffer', sys.stdin) if reads_stdin else b'')
+        elif stdin:
+            stdin = BytesIO(stdin)
+        request = {'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)}
+        send_frame(sock, CHANNEL_REQUEST, json.dumps(request).encode('utf-8'))
+        if stdin:
+            # stdin is sent while it is read (and the output is received), e.g. a long list of file names
+            # is validated while it is still generated
+            import threading
+
+            def forward_stdin():
+                try:
+                    send_stream(sock, CHANNEL_STDIN, stdin)
+                except EnvironmentError:
+                    # the worker finished without reading everything
+                    pass
+
+            sender = threading.Thread(target=forward_stdin)
+            sender.daemon = True
+            sender.start()
+        else:
+            send_frame(sock, CHANNEL_STDIN, b'')
+        streams = {CHANNEL_STDOUT: getattr(sys.stdout, 'buffer', sys.stdout),
+                   CHANNEL_STDERR: getattr(sys.stderr, 'buffer', sys.stderr)}
+        while True:
+            channel, data = recv_frame(sock)
+            if channel == CHANNEL_EXIT:
+                return int(data)
+            streams[channel].write(data)
+            streams[channel].flush()
+    except EOFError:
+        sys.stderr.write('codevalidator daemon closed the connection\n')
+        return 1
+    finally:
+        sock.close()
+
+
+def client_main():
+    '''thin client: validate with the daemon (see --serve) or in process if no daemon is running'''
+
+    argv = sys.argv[1:]
+    code = run_client(argv, default_socket_path())
+    if code is None:
+        main(argv)
+    else:
+        sys.exit(code)
+
+
+def split_lines(text):
+    '''split the text after every line break, the last line is the (possibly empty) rest
+
+    >>> split_lines('a\\nb\\n')
+    ['a\\n', 'b\\n', '']
+    '''
+
+    parts = text.split('\n')
+    return [part + '\n' for part in parts[:-1]] + parts[-1:]
+
+
+def utf16_index(line, character):
+    '''return the index in the line of the LSP position character (UTF-16 code units), clamped to the line end'''
+
+    content = line.rstrip('\r\n')
+    index = units = 0
+    while index < len(content) and units < character:
+        units += (2 if ord(content[index]) > 0xffff else 1)
+        index += 1
+    return index
+
+
+def utf16_length(text):
+    return len(text.encode('utf-16-le')) // 2
+
+
+def uri_to_path(uri):
+    '''return the file name of a document URI (or the path of other URIs to find the matching rules)'''
+
+    try:
+        from urllib.parse import unquote, urlparse
+    except ImportError:
+        # Python 2
+        from urllib import unquote
+        from urlparse import urlparse
+    return unquote(urlparse(uri).path)
+
+
+class Document(object):
+    '''a document opened in the editor which is validated from memory by the language server (see --lsp)
+
+    Diagnostics of line-based rules are kept per rule, edits shift them and only the changed lines are validated again.
+    Diagnostics are (0-based line or None, 1-based byte column or None, message, rule name) tuples.'''
+
+    def __init__(self, uri, text):
+        self.uri = uri
+        self.fname = uri_to_path(uri)
+        self.lines = split_lines(text)
+        # whether the diagnostics of line-based rules are known for all lines except the dirty ones
+        self.validated = False
+        # first and last line changed since the last validation (or None)
+        self.dirty = None
+        # rule name => diagnostics of line-based rules
+        self.line_diagnostics = {}
+        # diagnostics of all other rules
+        self.diagnostics = []
+        # time when the document should be validated (after the last change and the debounce delay)
+        self.due = None
+
+    @property
+    def text(self):
+        return ''.join(self.lines)
+
+    def apply_change(self, change):
+        '''apply a change of a "textDocument/didChange" notification (incremental or full text)
+
+        >>> doc = Document('file:///a.txt', 'a\\nb\\nc\\n')
+        >>> doc.apply_change({'range': {'start': {'line': 1, 'character': 0}, 'end': {'line': 1, 'character': 1}},
+        ...                   'text': 'x\\ny'})
+        >>> doc.text == 'a\\nx\\ny\\nc\\n', doc.dirty
+        (True, (1, 2))
+        '''
+
+        if 'range' not in change:
+            self.lines = split_lines(change['text'])
+            self.validated = False
+            self.dirty = None
+            return
+        start, end = change['range']['start'], change['range']['end']
+        first = min(start['line'], len(self.lines) - 1)
+        last = min(end['line'], len(self.lines) - 1)
+        prefix = self.lines[first][:utf16_index(self.lines[first], start['character'])]
+        suffix = self.lines[last][utf16_index(self.lines[last], end['character']):]
+        lines = split_lines(prefix + change['text'] + suffix)
+        if last < len(self.lines) - 1:
+            # the suffix ends with the line break of the last replaced line
+            lines.pop()
+        self.lines[first:last + 1] = lines
+        delta = len(lines) - (last - first + 1)
+
+        def shift(line):
+            return (line + delta if line is not None and line > last else line)
+
+        for name, diagnostics in self.line_diagnostics.items():
+            self.line_diagnostics[name] = [(shift(line), column, message, rule)
+                                           for line, column, message, rule in diagnostics
+                                           if line is None or not first <= line <= last]
+        changed = first, first + len(lines) - 1
+        if self.dirty is not None:
+            changed = (min(shift(self.dirty[0]), changed[0]), max(shift(self.dirty[1]), changed[1]))
+        self.dirty = changed
+
+    def validate(self):
+        '''validate the document contents with the rules configured for its file name'''
+
+        BUFFERS[self.fname] = self.text.encode('utf-8')
+        # details of rules which did not fail do not belong to this document
+        VALIDATION_DETAILS[:] = []
+        errors = len(VALIDATION_ERRORS)
+        try:
+            with collect_reports() as collector:
+                rules = []
+                if not is_excluded(self.fname):
+                    validate_file_dir_rules(self.fname)
+                    rules = file_pattern_rules(self.fname)
+                line_rules = [name for name in rules if name in LINE_RULES]
+                incremental = self.validated and all(name in self.line_diagnostics for name in line_rules)
+                if incremental:
+                    # the diagnostics outside of the changed lines are still valid (see apply_change),
+                    # the dirty range of several edits may also include unchanged lines validated again below
+                    validate_file_with_rules(self.fname, [name for name in rules if name not in LINE_RULES])
+                    first, last = self.dirty or (0, -1)
+                    line_diagnostics = dict((name, [d for d in self.line_diagnostics[name]
+                                                    if d[0] is not None and not first <= d[0] <= last])
+                                            for name in line_rules)
+                else:
+                    validate_file_with_rules(self.fname, rules)
+                    line_diagnostics = dict((name, []) for name in line_rules)
+                offset = 0
+                if incremental and self.dirty is not None:
+                    offset, last = self.dirty
+                    fd = BytesIO(''.join(self.lines[offset:last + 1]).encode('utf-8'))
+                    for name in line_rules:
+                        rule = get_rule(name)
+                        if rule:
+                            fd.seek(0)
+                            apply_rule(self.fname, rule, fd)
+                    clear_file_cache()
+            self.diagnostics = []
+            for fname, name, message, details in collector.reports:
+                diagnostics = line_diagnostics.get(name, self.diagnostics)
+                base = (offset if name in line_diagnostics else 0)
+                if not details:
+                    diagnostics.append((None, None, message, name))
+                for detail, line, column in details:
+                    line = detail_position(line)
+                    line = (line - 1 + base if line else None)
+                    column = (detail_position(column) if line is not None else None)
+                    diagnostics.append((line, column, detail, name))
+            for diagnostics in line_diagnostics.values():
+                diagnostics.sort(key=lambda d: (d[0] is not None, d[0] or 0, d[1] or 0))
+            self.line_diagnostics = line_diagnostics
+        finally:
+            del BUFFERS[self.fname]
+            del VALIDATION_ERRORS[errors:]
+        self.validated = True
+        self.dirty = None
+        self.due = None
+
+    def position(self, line, column):
+        '''return the LSP position (UTF-16 code units) of the 1-based byte column in the (0-based) line'''
+
+        text = self.lines[line] if line < len(self.lines) else ''
+        if column is None:
+            return {'line': line, 'character': 0}
+        prefix = text.encode('utf-8')[:column - 1].decode('utf-8', 'ignore')
+        return {'line': line, 'character': utf16_length(prefix)}
+
+    def lsp_diagnostics(self):
+        result = []
+        for diagnostics in [self.diagnostics] + [self.line_diagnostics[name] for name in sorted(self.line_diagnostics)]:
+            for line, column, message, rule in diagnostics:
+                if line is None:
+                    start = end = {'line': 0, 'character': 0}
+                elif column is None:
+                    # the whole line
+                    start = {'line': line, 'character': 0}
+                    end = {'line': line, 'character': utf16_length(self.lines[line].rstrip('\r\n'))
+                           if line < len(self.lines) else 0}
+                else:
+                    start = self.position(line, column)
+                    end = {'line': line, 'character': start['character'] + 1}
+                result.append({'range': {'start': start, 'end': end}, 'severity': 1, 'source': 'codevalidator',
+                               'code': rule, 'message': message})
+        return result
+
+
+class LanguageServer(object):
+    '''Language Server Protocol front end (see --lsp) validating open documents from memory
+
+    Messages are JSON-RPC requests and notifications with a Content-Length header read from the input file descriptor,
+    diagnostics are published after each change once the editor pauses for the "lsp_debounce" delay.'''
+
+    def __init__(self, input_fd, output):
+        self.input_fd = input_fd
+        self.output = output
+        self.pending = b''
+        self.documents = {}
+        self.shutdown = False
+
+    def send(self, message):
+        message['jsonrpc'] = '2.0'
+        body = json.dumps(message).encode('utf-8')
+        self.output.write('Content-Length: {0}\r\n\r\n'.format(len(body)).encode('ascii') + body)
+        self.output.flush()
+
+    def feed(self, data):
+        '''add the received data and return all complete messages'''
+
+        self.pending += data
+        messages = []
+        while True:
+            header_end = self.pending.find(b'\r\n\r\n')
+            if header_end < 0:
+                break
+            length = None
+            for header in self.pending[:header_end].decode('ascii').split('\r\n'):
+                name, _, value = header.partition(':')
+                if name.strip().lower() == 'content-length':
+                    length = int(value)
+            if length is None:
+                raise ExecutionError('LSP message without Content-Length header')
+            start = header_end + 4
+            if len(self.pending) < start + length:
+                break
+            messages.append(json.loads(self.pending[start:start + length].decode('utf-8')))
+            self.pending = self.pending[start + length:]
+        return messages
+
+    def handle(self, message):
+        '''dispatch the message to the "lsp_<method>" handler, returns the exit code after the "exit" notification'''
+
+        method = message.get('method')
+        if method == 'exit':
+            return 0 if self.shutdown else 1
+        handler = getattr(self, 'lsp_' + (method or '').replace('/', '_').replace('$', ''), None)
+        if 'id' not in message:
+            # notifications (and responses) without handler are ignored
+            if handler:
+                handler(message.get('params') or {})
+            return None
+        if handler is None:
+            self.send({'id': message['id'], 'error': {'code': -32601, 'message': 'unknown method {0}'.format(method)}})
+            return None
+        try:
+            result = handler(message.get('params') or {})
+        except Exception as e:
+            self.send({'id': message['id'], 'error': {'code': -32603, 'message': str(e)}})
+        else:
+            self.send({'id': message['id'], 'result': result})
+        return None
+
+    def lsp_initialize(self, params):
+        # incremental text synchronization (2)
+        return {'capabilities': {'textDocumentSync': {'openClose': True, 'change': 2, 'save': {'includeText': False}}},
+                'serverInfo': {'name': 'codevalidator'}}
+
+    def lsp_shutdown(self, params):
+        self.shutdown = True
+        return None
+
+    def lsp_textDocument_didOpen(self, params):
+        item = params['textDocument']
+        document = self.documents[item['uri']] = Document(item['uri'], item['text'])
+        self.publish(document)
+
+    def lsp_textDocument_didChange(self, params):
+        document = self.documents.get(params['textDocument']['uri'])
+        if document is None:
+            return
+        for change in params['contentChanges']:
+            document.apply_change(change)
+        document.due = time.time() + CONFIG.get('lsp_debounce', 0)
+
+    def lsp_textDocument_didSave(self, params):
+        document = self.documents.get(params['textDocument']['uri'])
+        if document is not None and document.due is not None:
+            self.publish(document)
+
+    def lsp_textDocument_didClose(self, params):
+        uri = params['textDocument']['uri']
+        if self.documents.pop(uri, None) is not None:
+            self.send({'method': 'textDocument/publishDiagnostics', 'params': {'uri': uri, 'diagnostics': []}})
+
+    def publish(self, document):
+        document.validate()
+        self.send({'method': 'textDocument/publishDiagnostics',
+                   'params': {'uri': document.uri, 'diagnostics': document.lsp_diagnostics()}})
+
+    def publish_due(self, now):
+        '''validate all documents whose debounce delay is over, returns the time until the next one is due'''
+
+        timeout = None
+        for document in list(self.documents.values()):
+            if document.due is None:
+                continue
+            if document.due <= now:
+                self.publish(document)
+            else:
+                timeout = min(timeout, document.due - now) if timeout is not None else document.due - now
+        return timeout
+
+    def run(self):
+        '''serve until the "exit" notification (or the end of the input), returns the exit code'''
+
+        import select
+        timeout = None
+        while True:
+            readable, _, _ = select.select([self.input_fd], [], [], timeout)
+            if readable:
+                data = os.read(self.input_fd, STREAM_CHUNK_SIZE)
+                if not data:
+                    return 1
+                for message in self.feed(data):
+                    code = self.handle(message)
+                    if code is not None:
+                        return code
+            timeout = self.publish_due(time.time())
+
+
+def run_language_server():
+    '''run the language server on stdin/stdout, returns its exit code'''
+
+    # rules must not write to stdout as it carries the protocol
+    output = getattr(sys.stdout, 'buffer', sys.stdout)
+    sys.stdout = sys.stderr
+    CONFIG['quiet'] = True
+    # diagnostics for every offending line
+    CONFIG['full_report'] = True
+    warm_up()
+    return LanguageServer(sys.stdin.fileno(), output).run()
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Validate source code files and optionally reformat them.')
     parser.add_argument('-r', '--recursive', action='store_true', help='process given directories recursively')
     parser.add_argument('-c', '--config',
@@ -931,24 +3875,93 @@ def main():
     parser.add_argument('--filter', action='store_true',
                         help='special mode to read from STDIN and write to STDOUT, uses provided file name to find matching rules'
                         )
-    parser.add_argument('-e', '--exclude',  nargs='+', help='file patterns to exclude (only works with -r)')
-    parser.add_argument('-i', '--include',  nargs='+', help='file patterns to include (only works with -r)')
-    parser.add_argument('files', metavar='FILES', nargs='+', help='list of source files to validate')
-    args = parser.parse_args()
+    parser.add_argument('--framed', action='store_true',
+                        help='for --filter: read any number of files as frames (file name, contents) from STDIN '
+                        'and write the results as frames to STDOUT')
+    parser.add_argument('-e', '--exclude',  nargs='+', help='file patterns to exclude (only works with -r and --watch)')
+    parser.add_argument('-i', '--include',  nargs='+', help='file patterns to include (only works with -r and --watch)')
+    parser.add_argument('--gitignore', action='store_true',
+                        help='skip files and directories ignored by .gitignore (only works with -r)')
+    parser.add_argument('--format', choices=sorted(REPORTERS), default='text',
+                        help='output format of the validation errors (default: text), JSON Lines, SARIF or Checkstyle')
+    parser.add_argument('--startup-profile', action='store_true',
+                        help='print the time spent in the startup phases to stderr (to check editor integrations)')
+    parser.add_argument('--profile', action='store_true',
+                        help='print the time spent in rules, fixers, external tools and per file extension to stderr')
+    parser.add_argument('--profile-top', metavar='N', type=int, default=10,
+                        help='for --profile: number of entries to print per category (default: 10)')
+    parser.add_argument('--profile-json', metavar='FILE',
+                        help='for --profile: also write all statistics to FILE as JSON (e.g. to track trends)')
+    parser.add_argument('--serve', action='store_true',
+                        help='run as daemon on a Unix socket for the codevalidator-client command')
+    parser.add_argument('--socket', default=default_socket_path(),
+                        help='Unix socket of the daemon (default: $CODEVALIDATOR_SOCKET or /tmp/codevalidator-UID.sock)'
+                        )
+    parser.add_argument('--watch', action='store_true',
+                        help='validate the given directories, then watch them and print new and resolved violations')
+    parser.add_argument('--lsp', action='store_true',
+                        help='run as Language Server Protocol server on STDIN/STDOUT to validate documents in editors')
+    parser.add_argument('--files-from', metavar='FILE',
+                        help='validate the files listed in FILE (one per line, "-" for STDIN) in addition to FILES')
+    parser.add_argument('-0', '--null', action='store_true',
+                        help='for --files-from: file names are separated by NUL characters (like "git diff -z")')
+    parser.add_argument('files', metavar='FILES', nargs='*', help='list of source files to validate')
+    args = parser.parse_args(argv)
+    if not args.files and not (args.serve or args.lsp or args.framed or args.files_from):
+        parser.error('no files given')
+    if args.framed and not args.filter:
+        parser.error('--framed only works with --filter')
+    if args.files_from and args.filter:
+        parser.error('--files-from does not work with --filter')
+    if args.format != 'text' and (args.filter or args.watch or args.lsp):
+        parser.error('--format does not work with --filter, --watch and --lsp')
+    files = args.files
+    if args.files_from:
+        # file names are validated as soon as they are read
+        import itertools
+        files = itertools.chain(files, read_file_list(args.files_from, (b'\0' if args.null else b'\n')))
+    if args.startup_profile:
+        import atexit
+        startup_phase('arguments')
+        atexit.register(report_startup_profile)
+    if args.profile or args.profile_json:
+        import atexit
+        enable_profile(args.profile_top, args.profile_json)
+        atexit.register(finish_profile)
 
     for path in DEFAULT_CONFIG_PATHS:
         config_file = os.path.expanduser(path)
         if os.path.isfile(config_file) and not args.config:
             args.config = config_file
     if args.config:
-        config = open(args.config, 'rb').read().decode()
-        CONFIG.update(json.loads(config))
+        CONFIG.update(load_config(args.config))
     if args.verbose:
         CONFIG['verbose'] = args.verbose
         if args.verbose > 1:
+            import logging
             logging.basicConfig(level=logging.DEBUG, format='%(levelname)s %(message)s')
     if args.no_backup:
         CONFIG['create_backup'] = False
+    if args.gitignore:
+        CONFIG['gitignore'] = True
+    startup_phase('configuration')
+    if args.serve:
+        try:
+            serve(args.socket)
+        except ExecutionError as e:
+            notify('ERROR: {0}'.format(e))
+            sys.exit(1)
+        return
+    if args.lsp:
+        sys.exit(run_language_server())
+    if args.watch:
+        files = list(files)
+        if not all(os.path.isdir(f) for f in files):
+            parser.error('--watch only works with directories')
+        build_rules()
+        sys.exit(watch_directories(files, args.exclude, args.include))
+    build_rules()
+    startup_phase('rules')
 
     if args.filter:
         if len(args.files) > 1:
@@ -959,33 +3972,31 @@ def main():
         CONFIG['quiet'] = args.fix
         CONFIG['create_backup'] = False
 
+        if args.framed:
+            sys.exit(filter_frames(args.fix))
         f = args.files[0]
-        validate_file(f)
+        BUFFERS[f] = getattr(sys.stdin, 'buffer', sys.stdin).read()
+        code = filter_file(f, args.fix)
         if args.fix:
-            if VALIDATION_ERRORS:
-                if fix_file(f, [rule for (_fn, rule) in VALIDATION_ERRORS]):
-                    sys.exit(0)
-                else:
-                    sys.exit(1)
-            else:
-                # just copy STDIN to STDOUT
-                with open_file_for_read(f) as stdin:
-                    with open_file_for_write(f) as stdout:
-                        stdout.write(stdin.read())
+            sys.exit(code)
     else:
-
-        for f in args.files:
+        reporter = set_reporter(args.format)
+        for f in files:
             if args.recursive and os.path.isdir(f):
                 validate_directory(f, args.exclude, args.include)
             elif args.apply:
                 fix_file(f, args.apply)
             else:
                 validate_file(f)
+        reporter.close()
+        report_skipped_files()
         if VALIDATION_ERRORS:
             if args.fix:
                 fix_files()
             sys.exit(1)
 
 
+startup_phase('module')
+
 if __name__ == '__main__':
     main()
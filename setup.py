@@ -63,7 +63,8 @@ if __name__ == '__main__':
             url='https://github.com/hjacobs/codevalidator',
             py_modules=['codevalidator'],
             packages=['pythontidy'],
-            entry_points={'console_scripts': ['codevalidator = codevalidator:main']},
+            entry_points={'console_scripts': ['codevalidator = codevalidator:main',
+                                             'codevalidator-client = codevalidator:client_main']},
             extras_require={'YAML': ['PyYAML'], 'XML': ['lxml'], 'Python': ['pep8', 'autopep8', 'pyflakes']},
             tests_require=['pytest-cov', 'pytest>=2.7.2'],
             cmdclass=cmdclass,
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+import codevalidator
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'tools'))
+
+import benchmark  # noqa
+
+pytest.importorskip('lxml')
+pytest.importorskip('yaml')
+
+COUNTS = dict((file_type, 10) for file_type in benchmark.FILE_TYPES)
+
+
+def read_tree(path):
+    contents = {}
+    for root, dirs, files in os.walk(str(path)):
+        for fname in files:
+            with open(os.path.join(root, fname), 'rb') as fd:
+                contents[os.path.relpath(os.path.join(root, fname), str(path))] = fd.read()
+    return contents
+
+
+def test_generated_tree_is_reproducible(tmpdir):
+    first = benchmark.generate_tree(str(tmpdir.join('a')), COUNTS, size=2048, long_lines=0.5, seed=3)
+    second = benchmark.generate_tree(str(tmpdir.join('b')), COUNTS, size=2048, long_lines=0.5, seed=3)
+    assert first == second
+    assert first[0] == 60
+    assert read_tree(tmpdir.join('a')) == read_tree(tmpdir.join('b'))
+
+
+@pytest.mark.parametrize('violations', [0.0, 1.0])
+def test_violations_are_detected(tmpdir, monkeypatch, violations):
+    monkeypatch.setitem(codevalidator.CONFIG, 'rules', benchmark.BENCHMARK_RULES)
+    monkeypatch.setitem(codevalidator.CONFIG, 'quiet', True)
+    monkeypatch.setattr(codevalidator, 'VALIDATION_ERRORS', [])
+    files, size, violating = benchmark.generate_tree(str(tmpdir), COUNTS, size=2048, violations=violations,
+                                                     xml_depth=50)
+    codevalidator.validate_directory(str(tmpdir), None, None)
+    assert len(set(fname for fname, rule in codevalidator.VALIDATION_ERRORS)) == violating
@@ -0,0 +1,135 @@
+import os
+import select
+import subprocess
+import sys
+import time
+
+import pytest
+
+import codevalidator
+
+
+@pytest.fixture
+def daemon(tmpdir):
+    path = str(tmpdir.join('cv.sock'))
+    proc = subprocess.Popen([sys.executable, codevalidator.__file__, '--serve', '--socket', path],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    for _ in range(100):
+        if os.path.exists(path):
+            break
+        time.sleep(0.05)
+    yield path
+    proc.terminate()
+    proc.wait()
+    assert not os.path.exists(path)
+
+
+def test_client_forwards_to_daemon(daemon, tmpdir, capsysbinary):
+    bad = tmpdir.join('bad.txt')
+    bad.write_binary(b'a\tb\n')
+    good = tmpdir.join('good.txt')
+    good.write_binary(b'ok\n')
+
+    assert codevalidator.run_client(['-v', str(bad), str(good)], daemon) == 1
+    out, err = capsysbinary.readouterr()
+    assert out.decode().splitlines() == ['{0}: contains tabs'.format(bad), '  line 1, col 2: tab found']
+
+    # relative paths are resolved in the working directory of the client
+    with tmpdir.as_cwd():
+        assert codevalidator.run_client(['good.txt'], daemon) == 0
+    assert codevalidator.run_client(['--no-such-option'], daemon) == 2
+    assert b'unrecognized arguments' in capsysbinary.readouterr().err
+
+    # requests do not affect each other
+    assert codevalidator.run_client(['-v', str(bad)], daemon) == 1
+    assert codevalidator.run_client([str(good)], daemon) == 0
+
+
+def test_client_sends_stdin(daemon, capsysbinary):
+    assert codevalidator.run_client(['--fix', '--filter', 'a.txt'], daemon, b'a \nb\t\n' * 10000) == 0
+    assert capsysbinary.readouterr().out == b'a\nb\n' * 10000
+
+
+def test_file_names_are_streamed_to_daemon(daemon, tmpdir):
+    bad = tmpdir.join('bad.txt')
+    bad.write_binary(b'a\tb\n')
+    env = dict(os.environ, CODEVALIDATOR_SOCKET=daemon)
+    proc = subprocess.Popen([sys.executable, '-c', 'import codevalidator; codevalidator.client_main()',
+                             '--files-from', '-'], cwd=os.path.dirname(codevalidator.__file__), env=env,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    proc.stdin.write(str(bad).encode() + b'\n')
+    proc.stdin.flush()
+    # the file is validated before the list of file names ends
+    try:
+        assert select.select([proc.stdout], [], [], 10)[0]
+    except AssertionError:
+        proc.kill()
+        raise
+    assert proc.stdout.readline() == '{0}: contains tabs\n'.format(bad).encode()
+    proc.stdin.close()
+    assert proc.wait() == 1
+
+
+def test_client_environment_is_used(daemon, tmpdir, monkeypatch):
+    home = tmpdir.mkdir('home')
+    home.join('.codevalidatorrc').write('{"rules": {"*.foo": ["notabs"]}}')
+    fname = tmpdir.join('a.foo')
+    fname.write_binary(b'a\tb\n')
+    assert codevalidator.run_client([str(fname)], daemon) == 0
+    # the configuration file is found in the home directory of the client
+    monkeypatch.setenv('HOME', str(home))
+    assert codevalidator.run_client([str(fname)], daemon) == 1
+
+
+def test_client_without_daemon(tmpdir):
+    assert codevalidator.run_client(['x.txt'], str(tmpdir.join('missing.sock'))) is None
+
+
+def test_default_socket_path(monkeypatch):
+    monkeypatch.delenv('CODEVALIDATOR_SOCKET', raising=False)
+    monkeypatch.setenv('XDG_RUNTIME_DIR', '/run/user/1000')
+    assert codevalidator.default_socket_path() == '/run/user/1000/codevalidator.sock'
+    monkeypatch.delenv('XDG_RUNTIME_DIR')
+    assert codevalidator.default_socket_path() == '/tmp/codevalidator-{0}/daemon.sock'.format(os.getuid())
+
+
+def test_directory_of_other_user_is_not_used(daemon, tmpdir, monkeypatch, capsys):
+    monkeypatch.setattr(os, 'getuid', lambda: os.stat(daemon).st_uid + 1)
+    assert codevalidator.run_client([str(tmpdir.join('good.txt'))], daemon) is None
+    assert 'is not a directory owned' in capsys.readouterr().err
+    with pytest.raises(codevalidator.ExecutionError):
+        codevalidator.serve(daemon)
+    assert os.path.exists(daemon)
+
+
+@pytest.mark.skipif(os.getuid() != 0, reason='changing the owner of the socket needs root')
+def test_socket_of_other_user_is_not_used(daemon, tmpdir, capsys):
+    os.chown(daemon, 1, -1)
+    assert codevalidator.run_client([str(tmpdir.join('good.txt'))], daemon) is None
+    assert 'is not a socket owned' in capsys.readouterr().err
+    with pytest.raises(codevalidator.ExecutionError):
+        codevalidator.serve(daemon)
+    assert os.path.exists(daemon)
+
+
+def test_socket_directory_writable_by_others(tmpdir, capsys):
+    directory = tmpdir.join('shared')
+    directory.ensure(dir=True)
+    directory.chmod(0o777)
+    assert codevalidator.run_client(['x.txt'], str(directory.join('cv.sock'))) is None
+    assert 'only writable by the current user' in capsys.readouterr().err
+
+
+def test_serve_creates_private_directory(tmpdir):
+    path = tmpdir.join('run', 'cv.sock')
+    proc = subprocess.Popen([sys.executable, codevalidator.__file__, '--serve', '--socket', str(path)],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    try:
+        for _ in range(100):
+            if path.exists():
+                break
+            time.sleep(0.05)
+        assert path.dirpath().stat().mode & 0o777 == 0o700
+    finally:
+        proc.terminate()
+        proc.wait()
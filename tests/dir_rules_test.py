@@ -0,0 +1,22 @@
+import os
+
+import codevalidator
+
+
+def test_dir_rules_are_resolved_once_per_directory(tmpdir, monkeypatch):
+    monkeypatch.setitem(codevalidator.CONFIG, 'dir_rules', {'db_diffs': ['sql_diff_dir'], 'database': ['database_dir']})
+    root = str(tmpdir)
+    splits = []
+    split = os.path.split
+    monkeypatch.setattr(os.path, 'split', lambda path: splits.append(path) or split(path))
+
+    diffs = os.path.join(root, 'database', 'db_diffs')
+    for name in ('a.sql', 'b.sql', 'c.sql'):
+        assert codevalidator.get_dir_rules(os.path.join(diffs, name)) == ['sql_diff_dir', 'database_dir']
+    assert codevalidator.get_dir_rules(os.path.join(root, 'database', 'x.sql')) == ['database_dir']
+    assert codevalidator.get_dir_rules(os.path.join(root, 'x.sql')) == []
+    # one split per file plus one per directory of the path including "/" (resolved with the first file)
+    assert len(splits) == 5 + len(codevalidator.get_dirs(diffs)) + 1
+
+    monkeypatch.setitem(codevalidator.CONFIG, 'dir_rules', {'database': ['database_dir']})
+    assert codevalidator.get_dir_rules(os.path.join(diffs, 'a.sql')) == ['database_dir']
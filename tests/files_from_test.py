@@ -0,0 +1,39 @@
+import subprocess
+import sys
+
+import codevalidator
+
+
+def test_files_from(tmpdir):
+    names = []
+    for i in range(3):
+        fname = tmpdir.join('file-{0}.txt'.format(i))
+        fname.write_binary(b'a\tb\n' if i == 1 else b'ok\n')
+        names.append(str(fname))
+    listing = tmpdir.join('files.txt')
+    listing.write_binary('\n'.join(names[1:]).encode('utf-8'))
+
+    proc = subprocess.Popen([sys.executable, codevalidator.__file__, '--files-from', '-', '-0', names[0]],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    out, _ = proc.communicate('\0'.join(names[1:]).encode('utf-8') + b'\0')
+    assert proc.returncode == 1
+    assert out.decode('utf-8').splitlines() == ['{0}: contains tabs'.format(names[1])]
+
+    proc = subprocess.Popen([sys.executable, codevalidator.__file__, '--files-from', str(listing)],
+                            stdout=subprocess.PIPE)
+    out, _ = proc.communicate()
+    assert proc.returncode == 1
+    assert out.decode('utf-8').splitlines() == ['{0}: contains tabs'.format(names[1])]
+
+
+def test_file_names_are_read_as_they_arrive():
+    chunks = [b'a.txt\nb', b'.txt\r\n', b'c.txt', b'']
+
+    class Pipe(object):
+        def read1(self, size):
+            return chunks.pop(0)
+
+    names = codevalidator.iter_file_names(Pipe())
+    assert next(names) == 'a.txt'
+    assert chunks == [b'.txt\r\n', b'c.txt', b'']
+    assert list(names) == ['b.txt', 'c.txt']
@@ -0,0 +1,79 @@
+import subprocess
+import sys
+from io import BytesIO
+
+import codevalidator
+
+
+def run(args, stdin):
+    proc = subprocess.Popen([sys.executable, codevalidator.__file__] + args, stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE)
+    out, _ = proc.communicate(stdin)
+    return proc.returncode, out
+
+
+def test_filter_fix():
+    assert run(['--fix', '--filter', 'a.txt'], u'héllo \t\r\nx\n'.encode('utf-8')) == (
+        0, u'héllo\nx\n'.encode('utf-8'))
+    assert run(['--fix', '--filter', 'a.txt'], b'ok\n') == (0, b'ok\n')
+    assert run(['--filter', 'a.txt'], b'a\tb\n') == (0, b'a.txt: contains tabs\n')
+
+
+def frames(*frames):
+    out = BytesIO()
+    for channel, data in frames:
+        codevalidator.send_frame(out, channel, data)
+    return out.getvalue()
+
+
+def read_frames(data):
+    fd = BytesIO(data)
+    result = []
+    while fd.tell() < len(data):
+        result.append(codevalidator.recv_frame(fd))
+    return result
+
+
+def test_framed_filter():
+    stdin = frames((codevalidator.CHANNEL_REQUEST, b'a.txt'), (codevalidator.CHANNEL_STDIN, b'a \n'),
+                   (codevalidator.CHANNEL_REQUEST, b'b.txt'), (codevalidator.CHANNEL_STDIN, b'b\n'),
+                   (codevalidator.CHANNEL_REQUEST, b'c.xml'), (codevalidator.CHANNEL_STDIN, b'<c'))
+    code, out = run(['--fix', '--filter', '--framed'], stdin)
+    assert code == 1
+    results = []
+    output = b''
+    for channel, data in read_frames(out):
+        if channel == codevalidator.CHANNEL_EXIT:
+            results.append((output, int(data)))
+            output = b''
+        else:
+            assert channel == codevalidator.CHANNEL_STDOUT
+            output += data
+    assert results == [(b'a\n', 0), (b'b\n', 0), (b'', 1)]
+
+    code, out = run(['--filter', '--framed'], stdin)
+    assert code == 1
+    assert read_frames(out)[:2] == [(codevalidator.CHANNEL_STDOUT, b'a.txt: contains lines with trailing whitespace'),
+                                    (codevalidator.CHANNEL_STDOUT, b'\n')]
+
+
+def test_failing_streaming_fixer_writes_nothing(monkeypatch, capsysbinary):
+    monkeypatch.setitem(codevalidator.CONFIG, 'filter_mode', True)
+    monkeypatch.setitem(codevalidator.CONFIG, 'create_backup', False)
+    monkeypatch.setitem(codevalidator.CONFIG, 'quiet', True)
+    monkeypatch.setitem(codevalidator.BUFFERS, 'a.txt', b'a\tb \n')
+    fix = codevalidator.Rule.fix
+
+    def fail_partway(rule, src, dst):
+        dst.write(b'partial')
+        raise ValueError('broken fixer')
+
+    monkeypatch.setattr(codevalidator.Rule, 'fix', fail_partway)
+    # notrailingws is a streaming fixer and writes to stdout when it is the last fixer
+    assert codevalidator.fix_file('a.txt', ['notrailingws']) is False
+    assert codevalidator.fix_file('a.txt', ['notabs', 'notrailingws']) is False
+    assert capsysbinary.readouterr().out == b''
+
+    monkeypatch.setattr(codevalidator.Rule, 'fix', fix)
+    assert codevalidator.fix_file('a.txt', ['notabs', 'notrailingws']) is True
+    assert capsysbinary.readouterr().out == b'a    b\n'
@@ -0,0 +1,41 @@
+import os
+
+import codevalidator
+
+
+def write(path, contents=''):
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    with open(path, 'w') as fd:
+        fd.write(contents)
+
+
+def walk(monkeypatch, path, gitignore):
+    validated = []
+    monkeypatch.setattr(codevalidator, 'validate_file', validated.append)
+    codevalidator.validate_directory(path, None, None, gitignore=gitignore)
+    return sorted(os.path.relpath(fname, path) for fname in validated)
+
+
+def test_gitignore(tmpdir, monkeypatch):
+    root = str(tmpdir)
+    os.makedirs(os.path.join(root, '.git', 'info'))
+    write(os.path.join(root, '.git', 'info', 'exclude'), 'local.txt\n')
+    write(os.path.join(root, '.gitignore'), '# comment\n/build/\n*.log\n!keep.log\n')
+    write(os.path.join(root, 'a.txt'))
+    write(os.path.join(root, 'local.txt'))
+    write(os.path.join(root, 'error.log'))
+    write(os.path.join(root, 'keep.log'))
+    write(os.path.join(root, 'build', 'out.txt'))
+    write(os.path.join(root, 'src', 'build', 'b.txt'))
+    write(os.path.join(root, 'src', '.gitignore'), 'generated/\n')
+    write(os.path.join(root, 'src', 'generated', 'c.txt'))
+    write(os.path.join(root, 'src', 'trace.log'))
+
+    assert walk(monkeypatch, root, True) == ['.gitignore', 'a.txt', 'keep.log', 'src/.gitignore',
+                                             'src/build/b.txt']
+    assert len(walk(monkeypatch, root, False)) == 10
+
+    # walking a subdirectory still honors ignore files of parent directories
+    assert walk(monkeypatch, os.path.join(root, 'src'), True) == ['.gitignore', 'build/b.txt']
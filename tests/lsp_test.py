@@ -0,0 +1,118 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+import codevalidator
+
+
+def change(line, start, end, text):
+    return {'range': {'start': {'line': line, 'character': start}, 'end': {'line': line, 'character': end}},
+            'text': text}
+
+
+def test_only_changed_lines_are_validated_again(monkeypatch):
+    monkeypatch.setitem(codevalidator.CONFIG, 'full_report', True)
+    validated = []
+    validate = codevalidator.Rule.validate
+
+    def record(rule, fd):
+        if rule.name == 'notabs':
+            validated.append(fd.read())
+            fd.seek(0)
+        return validate(rule, fd)
+
+    monkeypatch.setattr(codevalidator.Rule, 'validate', record)
+    doc = codevalidator.Document('file:///src/a.txt', u'a\tb\nok\nok\n\tc\n')
+    doc.validate()
+    assert [(d['range']['start'], d['code']) for d in doc.lsp_diagnostics()] == [
+        ({'line': 0, 'character': 1}, 'notabs'), ({'line': 3, 'character': 0}, 'notabs')]
+
+    del validated[:]
+    doc.apply_change(change(0, 0, 0, u'new\n'))
+    doc.apply_change(change(2, 0, 2, u'€€\tx'))
+    doc.validate()
+    assert validated == [u'new\na\tb\n€€\tx\n'.encode('utf-8')]
+    assert [(d['range']['start'], d['code']) for d in doc.lsp_diagnostics()] == [
+        ({'line': 1, 'character': 1}, 'notabs'), ({'line': 2, 'character': 2}, 'notabs'),
+        ({'line': 4, 'character': 0}, 'notabs')]
+    assert codevalidator.BUFFERS == {}
+
+
+def test_several_edits_match_full_validation(tmpdir, monkeypatch):
+    monkeypatch.setitem(codevalidator.CONFIG, 'full_report', True)
+    monkeypatch.setattr(codevalidator, 'VALIDATION_ERRORS', [])
+    fname = tmpdir.join('a.txt')
+    doc = codevalidator.Document('file://' + str(fname), u'a\nb \nc\nd\n')
+    doc.validate()
+    # the dirty range of both edits includes the unchanged line "b "
+    doc.apply_change(change(3, 0, 0, u'x\n'))
+    doc.apply_change(change(0, 0, 0, u'y\n'))
+    doc.validate()
+
+    fname.write_binary(doc.text.encode('utf-8'))
+    with codevalidator.collect_reports() as collector:
+        codevalidator.validate_file(str(fname))
+    expected = [(line - 1, rule) for _, rule, _, details in collector.reports for _, line, _ in details]
+    assert [(line, rule) for line, _, _, rule in doc.line_diagnostics['notrailingws']] == expected == [
+        (2, 'notrailingws')]
+
+
+def test_document_is_validated_from_memory(tmpdir):
+    fname = tmpdir.join('data.json')
+    fname.write_binary(b'[]\n')
+    doc = codevalidator.Document('file://' + str(fname), u'[1,\n')
+    doc.validate()
+    assert [d['code'] for d in doc.lsp_diagnostics()] == ['json']
+
+
+def test_unsaved_python_document(tmpdir, monkeypatch):
+    pytest.importorskip('pep8')
+    pytest.importorskip('pyflakes')
+    monkeypatch.setitem(codevalidator.CONFIG, 'rules', {'*.py': ['pep8', 'pyflakes']})
+    # the file does not exist on disk, the rules must validate the document from memory
+    doc = codevalidator.Document('file://' + str(tmpdir.join('new.py')), u'import os\n')
+    doc.validate()
+    assert [(d['range']['start']['line'], d['code']) for d in doc.lsp_diagnostics()] == [(0, 'pyflakes')]
+    doc.apply_change(change(0, 0, 9, u'x=1'))
+    doc.validate()
+    assert [d['code'] for d in doc.lsp_diagnostics()] == ['pep8']
+    doc.apply_change(change(0, 0, 3, u'x = 1'))
+    doc.validate()
+    assert doc.lsp_diagnostics() == []
+    assert not tmpdir.join('new.py').exists()
+
+
+def message(content):
+    body = json.dumps(dict(content, jsonrpc='2.0')).encode('utf-8')
+    return 'Content-Length: {0}\r\n\r\n'.format(len(body)).encode('ascii') + body
+
+
+def test_language_server(tmpdir):
+    uri = 'file://' + str(tmpdir.join('a.txt'))
+    requests = [
+        {'id': 1, 'method': 'initialize', 'params': {}},
+        {'method': 'initialized', 'params': {}},
+        {'method': 'textDocument/didOpen', 'params': {'textDocument': {'uri': uri, 'text': 'a \nb\n'}}},
+        {'method': 'textDocument/didChange', 'params': {'textDocument': {'uri': uri},
+                                                        'contentChanges': [change(0, 1, 2, '')]}},
+        {'method': 'textDocument/didSave', 'params': {'textDocument': {'uri': uri}}},
+        {'id': 2, 'method': 'textDocument/hover', 'params': {}},
+        {'id': 3, 'method': 'shutdown'},
+        {'method': 'exit'},
+    ]
+    proc = subprocess.Popen([sys.executable, codevalidator.__file__, '--lsp'],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    out, _ = proc.communicate(b''.join(message(request) for request in requests))
+    assert proc.returncode == 0
+
+    server = codevalidator.LanguageServer(None, None)
+    responses = server.feed(out)
+    assert responses[0]['result']['capabilities']['textDocumentSync']['change'] == 2
+    assert responses[1]['params']['diagnostics'] == [{
+        'range': {'start': {'line': 0, 'character': 1}, 'end': {'line': 0, 'character': 2}},
+        'severity': 1, 'source': 'codevalidator', 'code': 'notrailingws', 'message': 'trailing whitespace found'}]
+    assert responses[2]['params']['diagnostics'] == []
+    assert responses[3]['error']['code'] == -32601
+    assert responses[4] == {'jsonrpc': '2.0', 'id': 3, 'result': None}
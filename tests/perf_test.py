@@ -0,0 +1,254 @@
+import json
+import os
+import random
+import re
+import sys
+import time
+from io import BytesIO
+
+import pytest
+
+import codevalidator
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'tools'))
+
+import benchmark  # noqa
+
+# The micro-benchmarks of the rules only run with CODEVALIDATOR_PERF set:
+#   CODEVALIDATOR_PERF=1       fail if a rule is slower than its baseline by more than CODEVALIDATOR_PERF_TOLERANCE
+#   CODEVALIDATOR_PERF=update  measure the rules and store the results as new baseline
+# Baselines are relative to a reference workload to make them (roughly) comparable across machines.
+MODE = os.environ.get('CODEVALIDATOR_PERF')
+TOLERANCE = float(os.environ.get('CODEVALIDATOR_PERF_TOLERANCE', '0.5'))
+# differences below a millisecond are noise (timer resolution, caches, scheduling) and do not fail the test,
+# i.e. the calls of small and medium inputs must be much slower to be reported
+MIN_DIFFERENCE = 1e-3
+# number of measurements repeated before a rule slower than its baseline fails
+RETRIES = 2
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'perf_baseline.json')
+
+timer = getattr(time, 'perf_counter', time.time)
+
+SIZES = {'small': 1024, 'medium': 64 * 1024, 'large': 4 * 1024 * 1024}
+
+POM = '''<?xml version="1.0" encoding="UTF-8"?>
+<project xmlns="http://maven.apache.org/POM/4.0.0">
+    <artifactId>my-project</artifactId>
+    <name>My Project</name>
+    <description>Benchmark project with many dependencies</description>
+    <organization>
+        <name>Example</name>
+    </organization>
+    <dependencies>'''.splitlines()
+
+
+def sql_lines(rng, size):
+    # no comments after quoted strings, i.e. the tail of the file decides (see benchmark.sql_lines)
+    return benchmark.fill(['SET ROLE TO app;', ''], size, lambda i: [
+        "INSERT INTO items (id, name) VALUES ({0}, 'item {1}');".format(i, rng.randint(1, 1000))])
+
+
+def sql_diff_lines(rng, size):
+    return sql_lines(rng, size) + ["SELECT _v.register_patch('ABC-1.db');"]
+
+
+def pom_lines(rng, size):
+    return benchmark.fill(list(POM), size, lambda i: [
+        '        <dependency>', '            <artifactId>dependency-{0}</artifactId>'.format(i),
+        '            <version>1.{0}</version>'.format(rng.randint(1, 100)), '        </dependency>']) + [
+        '    </dependencies>', '</project>']
+
+
+def java_lines(rng, size):
+    return benchmark.fill(['public class Example {'], size, lambda i: [
+        '', '    public int method{0}(int value) {{'.format(i),
+        '        return value * {0};'.format(rng.randint(1, 100)), '    }']) + ['}']
+
+
+def php_lines(rng, size):
+    return benchmark.fill(['<?php', ''], size, lambda i: [
+        'function method{0}($value)'.format(i), '{', '    return $value * {0};'.format(rng.randint(1, 100)), '}', ''])
+
+
+# input type => (file name, function returning the lines of the given size)
+INPUTS = {
+    'py': ('example.py', lambda rng, size: benchmark.python_lines(rng, size, 0)),
+    'js': ('example.js', lambda rng, size: benchmark.javascript_lines(rng, size, 0)),
+    'xml': ('example.xml', lambda rng, size: benchmark.xml_lines(rng, size, 0, 20)),
+    'json': ('example.json', lambda rng, size: benchmark.json_lines(rng, size, 0)),
+    'yaml': ('example.yaml', lambda rng, size: benchmark.yaml_lines(rng, size, 0)),
+    'sql': ('example.sql', sql_lines),
+    'sql_diff': ('db_diffs/ABC-1/ABC-1.db.sql_diff', sql_diff_lines),
+    'pom': ('pom.xml', pom_lines),
+    'java': ('Example.java', java_lines),
+    'php': ('example.php', php_lines),
+    'coffee': ('example.coffee', lambda rng, size: benchmark.fill([], size, lambda i: [
+        'square{0} = (x) -> x * {1}'.format(i, rng.randint(1, 100))])),
+    'pp': ('example.pp', lambda rng, size: benchmark.fill([], size, lambda i: [
+        "file {{ '/tmp/file{0}':".format(i), '  ensure => present,', '}'])),
+    'rb': ('example.rb', lambda rng, size: benchmark.fill([], size, lambda i: [
+        'def method{0}(value)'.format(i), '  value * {0}'.format(rng.randint(1, 100)), 'end', ''])),
+    'erb': ('example.erb', lambda rng, size: benchmark.fill([], size, lambda i: [
+        '<p><%= @value{0} %></p>'.format(i)])),
+}
+
+# rule => input type, every builtin rule needs a micro-benchmark
+RULE_INPUTS = {
+    'ascii': 'py', 'utf8': 'py', 'nobom': 'py', 'notabs': 'py', 'nocr': 'py', 'indent4': 'py', 'invalidpath': 'py',
+    'pythontidy': 'py', 'pep8': 'py', 'pyflakes': 'py',
+    # deeply indented lines are the worst case of the trailing whitespace check
+    'notrailingws': 'xml',
+    'xml': 'xml', 'xmlfmt': 'xml', 'pomdesc': 'pom', 'json': 'json', 'yaml': 'yaml', 'jshint': 'js',
+    'sql_semi_colon': 'sql', 'database_dir': 'sql', 'sql_diff_dir': 'sql_diff', 'sql_diff_sql': 'sql_diff',
+    'jalopy': 'java', 'phpcs': 'php', 'coffeelint': 'coffee', 'puppet': 'pp', 'ruby': 'rb', 'rubocop': 'rb',
+    'erb': 'erb',
+}
+
+# rules running external tools (only benchmarked if the tool is installed)
+RULE_COMMANDS = {
+    'jshint': 'jshint', 'jalopy': 'java', 'phpcs': 'phpcs', 'coffeelint': 'coffeelint',
+    'puppet': 'puppet', 'ruby': 'ruby', 'rubocop': 'rubocop', 'erb': 'erb',
+}
+
+# rules validating the file name (directory rules)
+DIR_RULES = set(['database_dir', 'sql_diff_dir', 'sql_diff_sql'])
+
+FUNCTIONS = sorted(name for name in dir(codevalidator) if re.match('_(validate|fix)_', name))
+
+
+def which(command):
+    return any(os.access(os.path.join(path, command), os.X_OK) for path in os.environ.get('PATH', '').split(os.pathsep))
+
+
+def reference_time():
+    '''return the time of a fixed workload (Python code, regular expressions, bytes) to normalize the results'''
+
+    data = b''.join(b'line %d with some words\t\n' % i if sys.version_info >= (3, 5) else
+                    ('line %d with some words\t\n' % i).encode('ascii') for i in range(20000))
+    regex = re.compile(b'[ \t]+\n')
+    best = None
+    for _ in range(5):
+        start = timer()
+        sum(len(line.split()) for line in data.splitlines())
+        len(regex.findall(data))
+        data.replace(b'\t', b'    ')
+        duration = timer() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def best_time(call, budget=2.0):
+    '''return the best time of a call (like pytest-benchmark), short calls are repeated to be measurable'''
+
+    start = timer()
+    call()
+    first = timer() - start
+    if first > budget:
+        return first
+    number = max(1, int(0.02 / first)) if first else 1000
+    rounds = (5 if first * number * 5 < budget else 2)
+    best = first
+    for _ in range(rounds):
+        start = timer()
+        for _ in range(number):
+            call()
+        best = min(best, (timer() - start) / number)
+    return best
+
+
+def test_every_rule_has_a_benchmark():
+    assert FUNCTIONS
+    assert [name for name in FUNCTIONS if name.split('_', 2)[2] not in RULE_INPUTS] == []
+
+
+@pytest.fixture(scope='module')
+def baseline(request):
+    try:
+        with open(BASELINE_PATH) as fd:
+            data = json.load(fd)
+    except IOError:
+        data = {'reference': None, 'results': {}}
+    measured = {'reference': reference_time(), 'results': {}}
+
+    def update():
+        if MODE == 'update' and measured['results']:
+            data['reference'] = measured['reference']
+            data['python'] = '.'.join(map(str, sys.version_info[:3]))
+            # keep the results of rules which could not be measured here (e.g. missing tools)
+            data['results'].update(measured['results'])
+            with open(BASELINE_PATH, 'w') as fd:
+                json.dump(data, fd, indent=2, sort_keys=True)
+                fd.write('\n')
+
+    request.addfinalizer(update)
+    return data, measured
+
+
+@pytest.fixture(scope='module')
+def inputs(tmpdir_factory):
+    directory = tmpdir_factory.mktemp('perf')
+    paths = {}
+
+    def path(input_type, size):
+        if (input_type, size) not in paths:
+            fname, generate = INPUTS[input_type]
+            target = directory.join(size).join(fname)
+            target.dirpath().ensure(dir=True)
+            target.write_binary(('\n'.join(generate(random.Random(1), SIZES[size])) + '\n').encode('utf-8'))
+            paths[input_type, size] = str(target)
+        return paths[input_type, size]
+
+    return path
+
+
+@pytest.mark.skipif(not MODE, reason='set CODEVALIDATOR_PERF=1 (or "update") to run the micro-benchmarks')
+@pytest.mark.parametrize('size', sorted(SIZES))
+@pytest.mark.parametrize('function', FUNCTIONS)
+def test_rule_performance(function, size, baseline, inputs, monkeypatch):
+    kind, rule_name = function.split('_', 2)[1:]
+    if rule_name in RULE_COMMANDS and not which(RULE_COMMANDS[rule_name]):
+        pytest.skip('{0} is not installed'.format(RULE_COMMANDS[rule_name]))
+    monkeypatch.setattr(codevalidator, 'VALIDATION_DETAILS', [])
+    rule = codevalidator.get_rule(rule_name)
+    fname = inputs(RULE_INPUTS[rule_name], size)
+
+    with open(fname, 'rb') as fd:
+        if kind == 'fix':
+            def call():
+                fd.seek(0)
+                rule.fix(fd, BytesIO())
+        elif rule_name in DIR_RULES:
+            def call():
+                rule.validate(fname)
+        else:
+            def call():
+                fd.seek(0)
+                # parsed documents are cached per file
+                codevalidator.clear_file_cache()
+                rule.validate(fd)
+                del codevalidator.VALIDATION_DETAILS[:]
+
+        try:
+            call()
+        except Exception as e:
+            pytest.skip('{0} cannot run here: {1}'.format(function, e))
+        seconds = best_time(call)
+
+        data, measured = baseline
+        key = '{0}[{1}]'.format(function, size)
+        expected = data['results'].get(key)
+        if MODE != 'update' and expected is not None:
+            limit = max(expected * (1 + TOLERANCE), expected + MIN_DIFFERENCE / measured['reference'])
+            # a slow measurement is repeated before failing, noise (like other processes) rarely lasts
+            for _ in range(RETRIES):
+                if seconds / measured['reference'] <= limit:
+                    break
+                seconds = min(seconds, best_time(call))
+
+    relative = seconds / measured['reference']
+    measured['results'][key] = float('{0:.4g}'.format(relative))
+    if MODE != 'update':
+        if expected is None:
+            pytest.skip('no baseline for {0}, run with CODEVALIDATOR_PERF=update'.format(key))
+        assert relative <= limit, '{0} took {1:.6f} s ({2:.1f} MB/s), {3:.0%} slower than the baseline'.format(
+            key, seconds, os.path.getsize(fname) / seconds / 1024 / 1024, relative / expected - 1)
@@ -0,0 +1,67 @@
+import codevalidator
+
+
+def run_rules(monkeypatch, fname):
+    validated = []
+    monkeypatch.setattr(codevalidator, 'validate_file_with_rules', lambda f, rules: validated.extend(rules))
+    monkeypatch.setattr(codevalidator, 'SKIPPED_FILES', [])
+    codevalidator.validate_file(fname)
+    return validated
+
+
+def test_binary_file_is_skipped(tmpdir, monkeypatch):
+    monkeypatch.setitem(codevalidator.CONFIG, 'binary_files', 'skip')
+    fname = tmpdir.join('dump.txt')
+    fname.write_binary(b'abc\0def')
+    assert run_rules(monkeypatch, str(fname)) == []
+    assert codevalidator.SKIPPED_FILES == [(str(fname), 'binary', codevalidator.DEFAULT_RULES)]
+
+
+def test_skipped_binary_file_gets_path_rules(tmpdir, monkeypatch):
+    monkeypatch.setattr(codevalidator, 'VALIDATION_ERRORS', [])
+    monkeypatch.setattr(codevalidator, 'SKIPPED_FILES', [])
+    monkeypatch.setitem(codevalidator.CONFIG, 'quiet', True)
+    monkeypatch.setitem(codevalidator.CONFIG, 'binary_files', 'skip')
+    fname = tmpdir.join('my image.png')
+    fname.write_binary(b'\x89PNG\0')
+    assert not codevalidator.validate_file(str(fname))
+    assert codevalidator.VALIDATION_ERRORS == [(str(fname), 'invalidpath')]
+    assert codevalidator.SKIPPED_FILES == []
+
+
+def test_utf16_source_fails_by_default(tmpdir, monkeypatch):
+    monkeypatch.setattr(codevalidator, 'VALIDATION_ERRORS', [])
+    monkeypatch.setattr(codevalidator, 'SKIPPED_FILES', [])
+    monkeypatch.setitem(codevalidator.CONFIG, 'quiet', True)
+    fname = tmpdir.join('Example.java')
+    # the UTF-16 encoded ASCII characters contain NUL bytes
+    fname.write_binary(u'public class Example {\n}\n'.encode('utf-16'))
+    codevalidator.validate_file(str(fname))
+    assert 'utf8' in [rule for _, rule in codevalidator.VALIDATION_ERRORS]
+    assert codevalidator.SKIPPED_FILES == [(str(fname), 'binary', ['jalopy'])]
+
+
+def test_oversized_file_gets_byte_rules_only(tmpdir, monkeypatch):
+    monkeypatch.setitem(codevalidator.CONFIG, 'max_file_size', 10)
+    monkeypatch.setitem(codevalidator.CONFIG, 'oversized_files', 'bytes')
+    fname = tmpdir.join('big.json')
+    fname.write_binary(b'[' + b'1, ' * 10 + b'1]')
+    assert run_rules(monkeypatch, str(fname)) == codevalidator.DEFAULT_RULES
+    assert codevalidator.SKIPPED_FILES == [(str(fname), 'oversized', ['json'])]
+
+    fname = tmpdir.join('small.json')
+    fname.write_binary(b'[]')
+    assert run_rules(monkeypatch, str(fname)) == codevalidator.DEFAULT_RULES + ['json']
+    assert codevalidator.SKIPPED_FILES == []
+
+
+def test_oversized_file_gets_streaming_rules(tmpdir, monkeypatch):
+    monkeypatch.setitem(codevalidator.CONFIG, 'max_file_size', 10)
+    fname = tmpdir.join('big.xml')
+    fname.write_binary(b'<a>' + b' ' * 10 + b'</a>')
+    assert run_rules(monkeypatch, str(fname)) == codevalidator.DEFAULT_RULES
+    assert codevalidator.SKIPPED_FILES == [(str(fname), 'oversized', ['xml', 'xmlfmt'])]
+
+    fname = tmpdir.join('big.json')
+    fname.write_binary(b'[' + b'1, ' * 10 + b'1]')
+    assert run_rules(monkeypatch, str(fname)) == codevalidator.DEFAULT_RULES + ['json']
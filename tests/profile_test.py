@@ -0,0 +1,56 @@
+import json
+import subprocess
+import sys
+
+import codevalidator
+
+
+def test_profiler(tmpdir, monkeypatch):
+    popen = subprocess.Popen
+    monkeypatch.setattr(subprocess, 'Popen', popen)
+    monkeypatch.setattr(codevalidator, 'PROFILER', None)
+    monkeypatch.setattr(codevalidator, 'VALIDATION_ERRORS', [])
+    monkeypatch.setitem(codevalidator.CONFIG, 'create_backup', False)
+    monkeypatch.setitem(codevalidator.CONFIG, 'quiet', True)
+    profiler = codevalidator.enable_profile()
+    fname = tmpdir.join('a.txt')
+    fname.write_binary(b'a\tb \n')
+    codevalidator.validate_file(str(fname))
+    codevalidator.validate_file(str(fname))
+    codevalidator.fix_file(str(fname), ['notabs', 'notrailingws'])
+    subprocess.call([sys.executable, '-c', 'pass'])
+
+    stats = profiler.summary()
+    assert stats['rule']['notabs']['calls'] == 2
+    assert stats['rule']['notabs']['bytes'] == 10
+    assert stats['fixer']['notrailingws']['calls'] == 1
+    assert stats['extension'] == {'.txt': stats['extension']['.txt']}
+    assert stats['extension']['.txt']['calls'] == 2
+    tool = stats['tool'][codevalidator.tool_name([sys.executable])]
+    assert tool['calls'] == 1
+    assert tool['cpu'] > 0
+    assert fname.read_binary() == b'a    b\n'
+
+    # the original Popen is restored when profiling ends
+    assert codevalidator.disable_profile() is profiler
+    assert codevalidator.PROFILER is None
+    assert subprocess.Popen is popen
+
+
+def test_profile_option(tmpdir):
+    fname = tmpdir.join('a.txt')
+    fname.write_binary(b'a\tb\n')
+    path = tmpdir.join('profile.json')
+    proc = subprocess.Popen([sys.executable, codevalidator.__file__, '--profile', '--profile-top', '1',
+                             '--profile-json', str(path), str(fname)], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    assert proc.returncode == 1
+    assert out == u'{0}: contains tabs\n'.format(fname).encode('utf-8')
+    lines = err.decode('utf-8').splitlines()
+    assert lines[0].startswith('profile: total')
+    # header and top entry of rules and extensions
+    assert len(lines) == 5
+    assert lines[1].split('|')[0].strip() == 'profile: rule'
+    stats = json.loads(path.read())
+    assert stats['extension']['.txt']['calls'] == 1
+    assert set(stats['rule']) >= set(['notabs', 'nocr', 'utf8'])
@@ -0,0 +1,84 @@
+import json
+import subprocess
+import sys
+from io import BytesIO
+from xml.dom import minidom
+
+import pytest
+
+import codevalidator
+
+ERRORS = [
+    ('src/a b.txt', 'notabs', 'contains tabs', [('tab found', 1, 2), ('tab found', 3, '1')]),
+    ('src/a b.txt', 'notrailingws', 'contains lines with trailing whitespace', []),
+    ('c.xml', 'xml', 'is not valid XML', [(u'"<" & €', None, None)]),
+]
+
+
+def report(name):
+    out = BytesIO()
+    reporter = codevalidator.REPORTERS[name](out)
+    for fname, rule, message, details in ERRORS:
+        reporter.error(fname, rule, message, details)
+        reporter.file_done(fname)
+    reporter.close()
+    return out.getvalue().decode('utf-8')
+
+
+def test_jsonl():
+    assert [json.loads(line) for line in report('jsonl').splitlines()] == [
+        {'file': 'src/a b.txt', 'rule': 'notabs', 'message': 'contains tabs', 'line': 1, 'column': 2,
+         'detail': 'tab found'},
+        {'file': 'src/a b.txt', 'rule': 'notabs', 'message': 'contains tabs', 'line': 3, 'column': 1,
+         'detail': 'tab found'},
+        {'file': 'src/a b.txt', 'rule': 'notrailingws', 'message': 'contains lines with trailing whitespace',
+         'line': None, 'column': None, 'detail': None},
+        {'file': 'c.xml', 'rule': 'xml', 'message': 'is not valid XML', 'line': None, 'column': None,
+         'detail': u'"<" & €'},
+    ]
+
+
+def test_sarif():
+    run = json.loads(report('sarif'))['runs'][0]
+    assert [rule['id'] for rule in run['tool']['driver']['rules']] == ['notabs', 'notrailingws', 'xml']
+    assert [(r['ruleId'], r['locations'][0]['physicalLocation'], r['message']['text']) for r in run['results']] == [
+        ('notabs', {'artifactLocation': {'uri': 'src/a%20b.txt'}, 'region': {'startLine': 1, 'startColumn': 2}},
+         'contains tabs: tab found'),
+        ('notabs', {'artifactLocation': {'uri': 'src/a%20b.txt'}, 'region': {'startLine': 3, 'startColumn': 1}},
+         'contains tabs: tab found'),
+        ('notrailingws', {'artifactLocation': {'uri': 'src/a%20b.txt'}}, 'contains lines with trailing whitespace'),
+        ('xml', {'artifactLocation': {'uri': 'c.xml'}}, u'is not valid XML: "<" & €'),
+    ]
+
+
+def test_checkstyle():
+    files = minidom.parseString(report('checkstyle').encode('utf-8')).getElementsByTagName('file')
+    assert [f.getAttribute('name') for f in files] == ['src/a b.txt', 'c.xml']
+    errors = [dict(e.attributes.items()) for e in files[0].getElementsByTagName('error')]
+    assert errors[0] == {'line': '1', 'column': '2', 'severity': 'error', 'message': 'contains tabs: tab found',
+                         'source': 'codevalidator.notabs'}
+    assert 'line' not in errors[2]
+    assert files[1].getElementsByTagName('error')[0].getAttribute('message') == u'is not valid XML: "<" & €'
+
+
+def test_collect_reports(tmpdir, monkeypatch):
+    monkeypatch.setitem(codevalidator.CONFIG, 'full_report', True)
+    monkeypatch.setattr(codevalidator, 'VALIDATION_ERRORS', [])
+    fname = tmpdir.join('a.txt')
+    fname.write_binary(b'a\tb\n')
+    with codevalidator.collect_reports() as reporter:
+        codevalidator.validate_file(str(fname))
+    assert reporter.reports == [(str(fname), 'notabs', 'contains tabs', [('tab found', 1, 2)])]
+    assert not isinstance(codevalidator.REPORTER, codevalidator.ListReporter)
+
+
+@pytest.mark.parametrize('name', ['jsonl', 'sarif', 'checkstyle'])
+def test_format_option(tmpdir, name):
+    fname = tmpdir.join('a.txt')
+    fname.write_binary(b'a\tb\n')
+    proc = subprocess.Popen([sys.executable, codevalidator.__file__, '--format', name, str(fname)],
+                            stdout=subprocess.PIPE)
+    out, _ = proc.communicate()
+    assert proc.returncode == 1
+    # only the report is written to stdout
+    assert out.startswith(b'{' if name != 'checkstyle' else b'<?xml')
@@ -0,0 +1,66 @@
+import sys
+
+import pytest
+
+import codevalidator
+
+
+def test_unknown_rule_is_reported_once(tmpdir, monkeypatch, capsys):
+    monkeypatch.setattr(codevalidator, 'RULES', {})
+    monkeypatch.setattr(codevalidator, 'VALIDATION_ERRORS', [])
+    monkeypatch.setitem(codevalidator.CONFIG, 'rules', {'*.txt': ['notabs', 'bogus']})
+    codevalidator.build_rules()
+    for name in ('a.txt', 'b.txt'):
+        fname = tmpdir.join(name)
+        fname.write_binary(b'\ta\n')
+        codevalidator.validate_file(str(fname))
+    assert capsys.readouterr().out.count('bogus does not exist') == 1
+    assert [rule for fname, rule in codevalidator.VALIDATION_ERRORS] == ['notabs', 'notabs']
+
+
+def test_rule_options_are_bound(monkeypatch):
+    monkeypatch.setitem(codevalidator.CONFIG, 'options', {'pep8': {'max_line_length': 99}})
+    rule = codevalidator.get_rule('pep8')
+    assert rule.options == {'max_line_length': 99}
+    assert rule.fixer is codevalidator._fix_pep8
+
+
+PLUGIN = '''
+import codevalidator
+
+
+@codevalidator.message('contains TODO')
+def _validate_notodo(fd):
+    return b'TODO' not in fd.read()
+
+
+def _fix_notodo(src, dst):
+    dst.write(src.read().replace('TODO', 'DONE'))
+'''
+
+
+def test_plugin_rules_are_loaded_lazily(tmpdir, monkeypatch, capsys):
+    pytest.importorskip('importlib.metadata')
+    tmpdir.join('myrules.py').write(PLUGIN)
+    dist_info = tmpdir.mkdir('myrules-1.0.dist-info')
+    dist_info.join('METADATA').write('Metadata-Version: 2.1\nName: myrules\nVersion: 1.0\n')
+    dist_info.join('entry_points.txt').write('[codevalidator.rules]\nnotodo = myrules\n')
+    monkeypatch.syspath_prepend(str(tmpdir))
+    monkeypatch.setattr(codevalidator, 'RULES', {})
+    monkeypatch.setattr(codevalidator, 'PLUGIN_ENTRY_POINTS', None)
+    monkeypatch.setattr(codevalidator, 'VALIDATION_ERRORS', [])
+    monkeypatch.setitem(codevalidator.CONFIG, 'rules', {'*.txt': ['notabs', 'notodo']})
+
+    assert codevalidator.get_rule('notabs')
+    # builtin rules do not need to scan the installed packages
+    assert codevalidator.PLUGIN_ENTRY_POINTS is None
+
+    codevalidator.build_rules()
+    assert 'myrules' not in sys.modules
+    fname = tmpdir.join('a.txt')
+    fname.write_binary(b'TODO\n')
+    codevalidator.validate_file(str(fname))
+    assert 'myrules' in sys.modules
+    assert capsys.readouterr().out.strip() == '{0}: contains TODO'.format(fname)
+    assert codevalidator.get_rule('notodo').fixer is sys.modules['myrules']._fix_notodo
+    monkeypatch.delitem(sys.modules, 'myrules')
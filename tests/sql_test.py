@@ -0,0 +1,86 @@
+from io import BytesIO
+
+import pytest
+
+import codevalidator
+
+sqlparse = pytest.importorskip('sqlparse')
+
+SAMPLES = [
+    b'',
+    b'SELECT 1;\n',
+    b'SELECT 1\n',
+    b'SELECT 1; -- done\n',
+    b'SELECT 1 -- done;\n',
+    b'SELECT 1;\n/* multi\n   line */\n\n',
+    b'SELECT 1\n/* ; */\n',
+    b'SELECT 1 /* a */; /* b */ -- c\n',
+    b"SELECT '--';\n",
+    b"SELECT 'a\n-- b';\n",
+    b"SELECT 'a\n-- b'\n",
+    b'SELECT $$ a; -- b $$;\n',
+    b'SELECT $body$\n-- b;\n$body$\n',
+    b'/* SELECT 1;\n-- */\n',
+    b'/* a\nSELECT 1; /* b */\n',
+    b'-- /*\nSELECT 1 */\n',
+]
+
+
+@pytest.mark.parametrize('sql', SAMPLES)
+def test_tail_scanner_agrees_with_sqlparse(sql):
+    stripped = sqlparse.format(sql.decode('utf-8'), strip_comments=True).strip()
+    expected = (stripped[-1] == ';' if stripped else True)
+    last = codevalidator.last_sql_character(sql)
+    if last is not None:
+        assert (last in (b'', b';')) == expected
+    assert codevalidator._validate_sql_semi_colon(BytesIO(sql)) == expected
+
+
+def test_only_tail_of_large_file_is_scanned(tmpdir):
+    fname = tmpdir.join('big.sql')
+    fname.write_binary(b"INSERT INTO t VALUES ('--');\n" * 10000 + b'COMMIT\n-- no semicolon\n')
+    with open(str(fname), 'rb') as fd:
+        assert not codevalidator._validate_sql_semi_colon(fd)
+
+
+DIFF = b'''SET ROLE TO zalando;
+\\i database/lounge/10_data/01_table.sql
+SELECT _v.register_patch('ABC-1.db');
+'''
+
+
+@pytest.mark.parametrize('name,sql,expected', [
+    ('ABC-1.db.sql_diff', DIFF, True),
+    ('ABC-1.db.sql_diff', b"  select zz_utils.set_project_schema_owner_role('x');\n" + DIFF[20:], True),
+    ('ABC-1.db.sql_diff', DIFF[20:], 'set role to zalando; or SELECT zz_utils.set_project_schema_owner_role(); '
+                                     'must be present in db diff'),
+    ('ABC-1.db.sql_diff', DIFF + b'\\cd ..\n', '\\cd : is not allowed in db diffs anymore'),
+    ('ABC-1.db.sql_diff', DIFF.replace(b'database/', b''),
+     'include path (\\i ) should starts with `database/` directory'),
+    ('ABC-2.db.sql_diff', DIFF, 'register patch not found or patch name does not match with filename'),
+    # the patch name must match exactly
+    ('ABC-1.sql_diff', DIFF, 'register patch not found or patch name does not match with filename'),
+    ('ABC-1.db.sql_diff', DIFF.replace(b"'ABC-1.db'", b"'ABC-1.db_v2'"),
+     'register patch not found or patch name does not match with filename'),
+    ('ABC-1.db.sql_diff', DIFF.replace(b"'ABC-1.db'", b"'ABC-1'"),
+     'register patch not found or patch name does not match with filename'),
+    ('ABC-1.db.rollback.sql_diff', DIFF.replace(b'_v.register', b'_v.unregister'), True),
+    ('ABC-1.db.rollback.sql_diff', DIFF, 'unregister patch not found or patch name does not match with filename'),
+])
+def test_sql_diff_sql(tmpdir, name, sql, expected):
+    fname = tmpdir.join(name)
+    fname.write_binary(sql)
+    assert codevalidator._validate_sql_diff_sql(str(fname)) == expected
+
+
+def test_sql_diff_shares_contents_with_file_rules(tmpdir, monkeypatch):
+    fname = tmpdir.mkdir('db_diffs').mkdir('ABC-1').join('ABC-1.db.sql_diff')
+    fname.write_binary(DIFF)
+    reads = []
+    monkeypatch.setattr(codevalidator, 'map_file', lambda fd: reads.append(fd.name))
+    monkeypatch.setattr(codevalidator, 'VALIDATION_ERRORS', [])
+    monkeypatch.setitem(codevalidator.CONFIG, 'mmap_threshold', 1)
+    codevalidator.validate_file(str(fname))
+    assert reads == [str(fname)]
+    assert codevalidator.VALIDATION_ERRORS == []
+    assert codevalidator.FILE_CACHE == {}
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+import codevalidator
+
+# (shutil is not listed as argparse imports it anyway)
+LAZY_MODULES = ['csv', 'logging', 'subprocess', 'tempfile', 'xml.etree.ElementTree']
+
+CHECK = '''
+import sys
+sys.argv = ['codevalidator', {fname!r}]
+import codevalidator
+codevalidator.main()
+print(' '.join(name for name in {modules!r} if name in sys.modules))
+'''
+
+
+def test_plain_text_file_does_not_import_rule_dependencies(tmpdir):
+    fname = tmpdir.join('a.txt')
+    fname.write_binary(b'hello\n')
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(codevalidator.__file__)))
+    bare = subprocess.check_output([sys.executable, '-c', 'import sys; print(" ".join(sorted(sys.modules)))'],
+                                   env=env).decode().split()
+    modules = [name for name in LAZY_MODULES if name not in bare]
+    output = subprocess.check_output([sys.executable, '-c', CHECK.format(fname=str(fname), modules=modules)],
+                                     env=env, cwd=str(tmpdir))
+    assert output.decode().split() == []
+
+
+def test_startup_profile(monkeypatch, capsys):
+    monkeypatch.setattr(codevalidator, 'STARTUP_PHASES', [])
+    codevalidator.startup_phase('arguments')
+    codevalidator.report_startup_profile()
+    lines = capsys.readouterr().err.splitlines()
+    assert [line.split('|')[-1].strip() for line in lines[1:]] == ['arguments', 'validation']
@@ -0,0 +1,123 @@
+import random
+
+import pytest
+
+import codevalidator
+
+RULES = ['notabs', 'nocr', 'utf8', 'ascii', 'notrailingws']
+
+SAMPLES = [
+    b'',
+    b'foo\nbar\n',
+    b'foo\nbar',
+    b'foo \nbar\n',
+    b'foo\nbar\t',
+    b'foo\n\tbar\n',
+    b'foo\r\nbar\r\n',
+    b'foo\nbar \r\r\nbaz',
+    b'x' * 50 + b'   \n',
+    b'x' * 50 + b'\xc3\xa4' * 20 + b'\n',
+    b'\xc3\xa4' * 30 + b'\xc3',
+    b'abc\n' * 20 + b'\xff\n',
+]
+
+
+def run(path, rule):
+    func = getattr(codevalidator, '_validate_' + rule)
+    codevalidator.VALIDATION_DETAILS[:] = []
+    # the contents are cached by file name
+    codevalidator.clear_file_cache()
+    with open(path, 'rb') as fd:
+        res = func(fd)
+    details = codevalidator.VALIDATION_DETAILS[:]
+    codevalidator.VALIDATION_DETAILS[:] = []
+    return res, details
+
+
+@pytest.mark.parametrize('full', [False, True])
+@pytest.mark.parametrize('rule', RULES)
+def test_streaming_matches_buffered(tmpdir, monkeypatch, rule, full):
+    monkeypatch.setitem(codevalidator.CONFIG, 'full_report', full)
+    rand = random.Random(42)
+    samples = list(SAMPLES)
+    for i in range(50):
+        samples.append(bytes(bytearray(rand.choice(b'ab \t\r\n\xc3\xa4') for _ in range(rand.randint(0, 40)))))
+    path = str(tmpdir.join('sample.txt'))
+    for sample in samples:
+        with open(path, 'wb') as fd:
+            fd.write(sample)
+        monkeypatch.setitem(codevalidator.CONFIG, 'mmap_threshold', None)
+        monkeypatch.setitem(codevalidator.CONFIG, 'stream_threshold', None)
+        expected = run(path, rule)
+        for chunk_size in (1, 2, 3, 7):
+            monkeypatch.setattr(codevalidator, 'STREAM_CHUNK_SIZE', chunk_size)
+            monkeypatch.setitem(codevalidator.CONFIG, 'stream_threshold', 1)
+            assert run(path, rule) == expected, ('streamed', sample, chunk_size)
+            monkeypatch.setitem(codevalidator.CONFIG, 'mmap_threshold', 1)
+            assert run(path, rule) == expected, ('mapped', sample, chunk_size)
+            monkeypatch.setitem(codevalidator.CONFIG, 'mmap_threshold', None)
+
+
+def test_first_offending_line(tmpdir):
+    path = str(tmpdir.join('sample.txt'))
+    with open(path, 'wb') as fd:
+        fd.write(b'a\nb\nc \nd\te\n')
+    assert run(path, 'notrailingws') == (False, [('trailing whitespace found', 3, 2)])
+    assert run(path, 'notabs') == (False, [('tab found', 4, 2)])
+
+
+def test_full_report(tmpdir, monkeypatch):
+    path = str(tmpdir.join('sample.txt'))
+    with open(path, 'wb') as fd:
+        fd.write(b'a \nb\nc\t \t\n\td\t \n e ')
+    monkeypatch.setitem(codevalidator.CONFIG, 'full_report', True)
+    assert run(path, 'notrailingws') == (False, [('trailing whitespace found', 1, 2),
+                                                 ('trailing whitespace found', 3, 2),
+                                                 ('trailing whitespace found', 4, 3),
+                                                 ('trailing whitespace found', 5, 3)])
+    assert run(path, 'notabs') == (False, [('tab found', 3, 2), ('tab found', 4, 1)])
+    monkeypatch.setitem(codevalidator.CONFIG, 'full_report', None)
+    monkeypatch.setitem(codevalidator.CONFIG, 'verbose', 1)
+    assert len(run(path, 'notabs')[1]) == 2
+    monkeypatch.setitem(codevalidator.CONFIG, 'verbose', 0)
+    assert len(run(path, 'notabs')[1]) == 1
+
+
+@pytest.mark.parametrize('contents,valid', [
+    (b'[NaN, Infinity, -Infinity, {"a": NaN}]', True),
+    (b'[' * 100000 + b']' * 100000, False),
+    (b'[Nan]', False),
+], ids=['constants', 'nested', 'invalid'])
+def test_json_streaming_matches_buffered(tmpdir, monkeypatch, contents, valid):
+    path = str(tmpdir.join('sample.json'))
+    with open(path, 'wb') as fd:
+        fd.write(contents)
+    monkeypatch.setitem(codevalidator.CONFIG, 'mmap_threshold', None)
+    monkeypatch.setitem(codevalidator.CONFIG, 'stream_threshold', None)
+    assert run(path, 'json')[0] is valid
+    for chunk_size in (3, 1024):
+        monkeypatch.setattr(codevalidator, 'STREAM_CHUNK_SIZE', chunk_size)
+        monkeypatch.setitem(codevalidator.CONFIG, 'stream_threshold', 1)
+        assert run(path, 'json')[0] is valid, chunk_size
+
+
+@pytest.mark.parametrize('full', [False, True])
+@pytest.mark.parametrize('contents', [
+    b'a\n' + b' ' * 100 + b'x\n',
+    b'a\n' + b' \t' * 50 + b'\n',
+    b'a\n' + b' ' * 100,
+    b'a \n' + b' ' * 100 + b'\nb \n' + b' ' * 50 + b'x\n',
+], ids=['text', 'newline', 'end', 'mixed'])
+def test_long_whitespace_runs(tmpdir, monkeypatch, contents, full):
+    monkeypatch.setitem(codevalidator.CONFIG, 'full_report', full)
+    # whitespace-only runs longer than the chunk size and the carry are split at an artificial block end
+    path = str(tmpdir.join('sample.txt'))
+    with open(path, 'wb') as fd:
+        fd.write(contents)
+    monkeypatch.setitem(codevalidator.CONFIG, 'mmap_threshold', None)
+    monkeypatch.setitem(codevalidator.CONFIG, 'stream_threshold', None)
+    expected = run(path, 'notrailingws')
+    monkeypatch.setattr(codevalidator, 'MAX_WHITESPACE_CARRY', 8)
+    monkeypatch.setattr(codevalidator, 'STREAM_CHUNK_SIZE', 16)
+    monkeypatch.setitem(codevalidator.CONFIG, 'stream_threshold', 1)
+    assert run(path, 'notrailingws') == expected
@@ -0,0 +1,46 @@
+import pytest
+
+import codevalidator
+
+
+@pytest.fixture(params=['polling', 'inotify'])
+def notifier(request):
+    if request.param == 'polling':
+        notifier = codevalidator.PollingWatcher(interval=0.05)
+    else:
+        try:
+            notifier = codevalidator.Inotify()
+        except (AttributeError, EnvironmentError):
+            pytest.skip('inotify is not available')
+    yield notifier
+    notifier.close()
+
+
+def test_watch(tmpdir, monkeypatch, capsys, notifier):
+    monkeypatch.setitem(codevalidator.CONFIG, 'full_report', True)
+    monkeypatch.setitem(codevalidator.CONFIG, 'watch_delay', 0.1)
+    tmpdir.join('a.txt').write_binary(b'a\tb\n')
+    tmpdir.join('b.log').write_binary(b'a\tb\n')
+    root = str(tmpdir)
+    watcher = codevalidator.DirectoryWatcher([root], ['*.log'], None, notifier)
+    watcher.start()
+    assert capsys.readouterr().out.splitlines() == [
+        '+ {0}/a.txt: contains tabs (line 1, col 2: tab found)'.format(root),
+        '1 files: 1 new, 0 resolved, 1 violations in total']
+
+    tmpdir.join('a.txt').write_binary(b'ab\nc \n')
+    tmpdir.join('b.log').write_binary(b'ab\n')
+    tmpdir.mkdir('src').join('c.txt').write_binary(b'\t\n')
+    watcher.handle(watcher.wait())
+    assert capsys.readouterr().out.splitlines() == [
+        '- {0}/a.txt: contains tabs (line 1, col 2: tab found)'.format(root),
+        '+ {0}/a.txt: contains lines with trailing whitespace (line 2, col 2: trailing whitespace found)'.format(root),
+        '+ {0}/src/c.txt: contains lines with trailing whitespace (line 1, col 1: trailing whitespace found)'.format(
+            root),
+        '+ {0}/src/c.txt: contains tabs (line 1, col 1: tab found)'.format(root),
+        '2 files: 3 new, 1 resolved, 3 violations in total']
+
+    tmpdir.join('src').remove()
+    watcher.handle(watcher.wait())
+    assert capsys.readouterr().out.splitlines()[-1] == '1 files: 0 new, 2 resolved, 1 violations in total'
+    assert sorted(watcher.dirs) == [root]
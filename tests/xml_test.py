@@ -0,0 +1,80 @@
+import pytest
+
+import codevalidator
+
+etree = pytest.importorskip('lxml.etree')
+
+POM = b'''<?xml version='1.0' encoding='UTF-8'?>
+<project xmlns="http://maven.apache.org/POM/4.0.0">
+    <artifactId>my-project</artifactId>
+    <name>My Project</name>
+    <description>a longer project description</description>
+    <organization>
+        <name>ACME</name>
+    </organization>
+</project>
+'''
+
+
+def validate(tmpdir, monkeypatch, name, contents):
+    path = tmpdir.join(name)
+    path.write_binary(contents)
+    monkeypatch.setattr(codevalidator, 'VALIDATION_ERRORS', [])
+    codevalidator.VALIDATION_DETAILS[:] = []
+    codevalidator.validate_file(str(path))
+    return [rule for _, rule in codevalidator.VALIDATION_ERRORS]
+
+
+def test_pom_is_parsed_once(tmpdir, monkeypatch):
+    calls = []
+    parse = etree.parse
+    monkeypatch.setattr(etree, 'parse', lambda *args, **kwargs: calls.append(args) or parse(*args, **kwargs))
+    assert validate(tmpdir, monkeypatch, 'pom.xml', POM) == []
+    assert len(calls) == 1
+
+
+def test_xmlfmt(tmpdir, monkeypatch):
+    assert validate(tmpdir, monkeypatch, 'a.xml', POM) == []
+    assert validate(tmpdir, monkeypatch, 'b.xml', POM.replace(b'    <name>', b'  <name>')) == ['xmlfmt']
+    assert validate(tmpdir, monkeypatch, 'c.xml', POM.replace(b'</project>', b'')) == ['xml', 'xmlfmt']
+
+
+def test_format_xml_keeps_shared_tree():
+    tree = etree.ElementTree(etree.fromstring(b'<a><b>x</b><c/></a>'))
+    assert codevalidator.format_xml(tree).endswith(b'<a>\n    <b>x</b>\n    <c/>\n</a>\n')
+    assert etree.tostring(tree) == b'<a><b>x</b><c/></a>'
+
+
+@pytest.mark.parametrize('rules', [['xmlfmt'], ['xml', 'xmlfmt']])
+def test_streaming_xmlfmt(tmpdir, monkeypatch, capsys, rules):
+    # the streaming check either parses incrementally or walks the tree parsed by the "xml" rule
+    monkeypatch.setitem(codevalidator.CONFIG, 'xmlfmt_stream_threshold', 1)
+    monkeypatch.setitem(codevalidator.CONFIG, 'rules', {'*.xml': rules})
+    monkeypatch.setitem(codevalidator.CONFIG, 'verbose', 1)
+    assert validate(tmpdir, monkeypatch, 'a.xml', POM) == []
+    assert validate(tmpdir, monkeypatch, 'b.xml', POM.replace(b'\n    <name>', b'\n  <name>')) == ['xmlfmt']
+    assert '  line 4: not indented correctly (expected 4 spaces)' in capsys.readouterr()[0].splitlines()
+    assert validate(tmpdir, monkeypatch, 'c.xml', POM.replace(b'\n    </organization>', b'</organization>')) == [
+        'xmlfmt']
+    assert validate(tmpdir, monkeypatch, 'd.xml', POM.replace(b"<?xml version='1.0' encoding='UTF-8'?>\n", b'')) == [
+        'xmlfmt']
+    assert validate(tmpdir, monkeypatch, 'e.xml', POM + b'\n') == ['xmlfmt']
+    assert validate(tmpdir, monkeypatch, 'f.xml', POM.replace(b'</project>', b'')) == rules
+
+
+def test_xmlfmt_only(tmpdir, monkeypatch):
+    monkeypatch.setitem(codevalidator.CONFIG, 'rules', {'*.xml': ['xmlfmt']})
+    assert validate(tmpdir, monkeypatch, 'a.xml', POM) == []
+    assert validate(tmpdir, monkeypatch, 'b.xml', POM.replace(b'    <name>', b'  <name>')) == ['xmlfmt']
+
+
+@pytest.mark.parametrize('threshold,expected', [(None, ['xmlfmt']), (1, [])])
+def test_streaming_xmlfmt_only_checks_indentation(tmpdir, monkeypatch, threshold, expected):
+    monkeypatch.setitem(codevalidator.CONFIG, 'xmlfmt_stream_threshold', threshold)
+    monkeypatch.setitem(codevalidator.CONFIG, 'rules', {'*.xml': ['xmlfmt']})
+    assert validate(tmpdir, monkeypatch, 'a.xml', POM) == []
+    assert validate(tmpdir, monkeypatch, 'b.xml', POM.replace(b'    <name>', b'  <name>')) == ['xmlfmt']
+    # differences within tags are only detected by comparing with the pretty-printed copy
+    assert validate(tmpdir, monkeypatch, 'c.xml', POM.replace(b'</project>', b'    <x></x>\n</project>')) == expected
+    assert validate(tmpdir, monkeypatch, 'd.xml', POM.replace(b'"http://maven.apache.org/POM/4.0.0"',
+                                                              b"'http://maven.apache.org/POM/4.0.0'")) == expected
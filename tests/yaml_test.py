@@ -0,0 +1,26 @@
+from io import BytesIO
+
+import pytest
+
+import codevalidator
+
+pytest.importorskip('yaml')
+
+
+@pytest.mark.parametrize('source', [
+    b'a: 2001-13-45\n',
+    b'? [a]\n: b\n',
+    b"!!python/object:os.system ''\n",
+    b'!!int x\n',
+    b'<<: 5\n',
+    b'a: \xff\n',
+])
+def test_invalid_values(source):
+    assert codevalidator._validate_yaml(BytesIO(source)) is False
+
+
+def test_local_tags_only_for_the_rule():
+    import yaml
+    assert codevalidator._validate_yaml(BytesIO(b'a: !Secret {name: b}\n'))
+    with pytest.raises(yaml.constructor.ConstructorError):
+        yaml.load('a: !Secret b\n', Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
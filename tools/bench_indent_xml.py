@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark indent_xml on a generated document with 100k elements and on a deeply nested document
+
+Compares the old recursive implementation with the iterative one and lxml's native etree.indent.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+from lxml import etree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+import codevalidator  # noqa
+
+
+def indent_xml_recursive(elem, level=0):
+    '''the original recursive implementation for comparison'''
+
+    i = '\n' + level * codevalidator.INDENTATION
+    if len(elem):
+        if not elem.text or not elem.text.strip():
+            elem.text = i + codevalidator.INDENTATION
+        for e in elem:
+            indent_xml_recursive(e, level + 1)
+            if not e.tail or not e.tail.strip():
+                e.tail = i + codevalidator.INDENTATION
+        if not e.tail or not e.tail.strip():
+            e.tail = i
+    else:
+        if level and (not elem.tail or not elem.tail.strip()):
+            elem.tail = i
+
+
+def wide_document(count):
+    root = etree.Element('definitions')
+    for m in range(count // 5):
+        message = etree.SubElement(root, 'message', name='m%d' % m)
+        for i in range(4):
+            part = etree.SubElement(message, 'part', name='p%d' % i)
+            part.text = 'value'
+    return etree.tostring(root)
+
+
+def deep_document(depth):
+    return b'<e>' * depth + b'</e>' * depth
+
+
+def bench(name, func, source, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        root = etree.fromstring(source, etree.XMLParser(huge_tree=True))
+        start = time.time()
+        try:
+            func(root)
+        except RuntimeError as e:
+            print('{0:>12}: {1}'.format(name, e.__class__.__name__))
+            return None
+        duration = time.time() - start
+        best = duration if best is None else min(best, duration)
+        result = etree.tostring(root)
+    print('{0:>12}: {1:8.1f} ms'.format(name, best * 1000))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--elements', type=int, default=100000, help='number of elements (default: 100000)')
+    parser.add_argument('--depth', type=int, default=2000, help='nesting depth of the deep document (default: 2000)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = parser.parse_args()
+
+    for title, source in (('{0} elements'.format(args.elements), wide_document(args.elements)),
+                          ('depth {0}'.format(args.depth), deep_document(args.depth))):
+        print(title)
+        results = [bench('recursive', indent_xml_recursive, source, args.repeat),
+                   bench('iterative', lambda root: codevalidator._indent_xml(root, 0), source, args.repeat),
+                   bench('lxml native', codevalidator.indent_xml, source, args.repeat)]
+        results = [result for result in results if result is not None]
+        assert all(result == results[0] for result in results), 'implementations differ'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the yaml rule on a generated bundle of Kubernetes-like YAML documents
+
+Compares constructing Python objects (the former implementation) with composing nodes only,
+using the pure Python and (if available) the libyaml based loader.
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+from io import BytesIO
+
+import yaml
+
+DOCUMENT = '''---
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: service-{0}
+  labels: &labels
+    application: service-{0}
+    version: v{0}
+spec:
+  replicas: 3
+  selector:
+    matchLabels: *labels
+  template:
+    metadata:
+      labels: *labels
+    spec:
+      containers:
+        - name: service-{0}
+          image: registry.example.org/team/service-{0}:1.{0}
+          ports:
+            - containerPort: 8080
+          env:
+            - name: DB_URL
+              value: "postgresql://db-{0}.example.org:5432/service"
+            - name: SECRET
+              valueFrom: !Secret {{name: service-{0}, key: password}}
+          resources:
+            limits: {{cpu: 500m, memory: 512Mi}}
+'''
+
+
+def construct(fd, loader_class):
+    loader = loader_class(fd)
+    loader.add_multi_constructor('!', (lambda _, tag, _2: tag))
+    try:
+        while loader.check_data():
+            loader.get_data()
+    finally:
+        loader.dispose()
+
+
+def compose(fd, loader_class):
+    loader = loader_class(fd)
+    try:
+        while loader.check_node():
+            loader.get_node()
+    finally:
+        loader.dispose()
+
+
+def bench(name, func, loader_class, source, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func(BytesIO(source), loader_class)
+        duration = time.time() - start
+        best = duration if best is None else min(best, duration)
+    print('{0:>24}: {1:8.1f} ms ({2:.1f} MB/s)'.format(name, best * 1000, len(source) / best / 1024 / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--documents', type=int, default=2000, help='number of YAML documents (default: 2000)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = parser.parse_args()
+
+    source = ''.join(DOCUMENT.format(i) for i in range(args.documents)).encode('utf-8')
+    print('{0} documents, {1:.1f} MB'.format(args.documents, len(source) / 1024. / 1024))
+    bench('construct (SafeLoader)', construct, yaml.SafeLoader, source, args.repeat)
+    bench('compose (SafeLoader)', compose, yaml.SafeLoader, source, args.repeat)
+    if hasattr(yaml, 'CSafeLoader'):
+        bench('construct (CSafeLoader)', construct, yaml.CSafeLoader, source, args.repeat)
+        bench('compose (CSafeLoader)', compose, yaml.CSafeLoader, source, args.repeat)
+    else:
+        print('libyaml is not available')
+
+
+if __name__ == '__main__':
+    main()
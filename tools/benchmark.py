@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark codevalidator on a generated synthetic source tree
+
+Generates a reproducible tree of Python, JavaScript, XML, JSON, YAML and SQL files (some of them with violations,
+long lines and deeply nested XML) and measures the throughput of validate_directory, of every rule and of fixing
+the files. The results can be written as JSON and compared with the results of another version.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import codevalidator  # noqa
+
+# rules of the generated files, only rules running in-process (no external tools) to be comparable across machines
+BENCHMARK_RULES = {
+    '*.py': codevalidator.DEFAULT_RULES + ['indent4'],
+    '*.js': codevalidator.DEFAULT_RULES,
+    '*.xml': codevalidator.DEFAULT_RULES + ['xml', 'xmlfmt'],
+    '*.json': codevalidator.DEFAULT_RULES + ['json'],
+    '*.yaml': codevalidator.DEFAULT_RULES + ['yaml'],
+    '*.sql': codevalidator.DEFAULT_RULES + ['sql_semi_colon'],
+}
+
+# default number of generated files per type
+DEFAULT_COUNTS = {'py': 200, 'js': 100, 'xml': 100, 'json': 50, 'yaml': 50, 'sql': 50}
+
+# violations every file type can have, see inject_violation
+COMMON_VIOLATIONS = ['tabs', 'trailingws', 'cr']
+
+
+def fill(lines, size, block):
+    '''append the lines returned by block(i) for i = 0, 1, .. until the lines have the size in bytes'''
+
+    total = sum(len(line) + 1 for line in lines)
+    i = 0
+    while total < size:
+        for line in block(i):
+            lines.append(line)
+            total += len(line) + 1
+        i += 1
+    return lines
+
+
+def python_lines(rng, size, long_line):
+    lines = fill(['#!/usr/bin/env python', '', 'import os', '', ''], size, lambda i: [
+        'def function_{0}(value, factor={1}):'.format(i, rng.randint(1, 1000)),
+        '    """return the scaled value"""',
+        '    if value is None:',
+        '        return os.environ.get("VALUE_{0}")'.format(i),
+        '    return value * factor', '', ''])
+    if long_line:
+        lines.insert(3, 'LONG = "{0}"'.format('x' * long_line))
+    return lines
+
+
+def javascript_lines(rng, size, long_line):
+    lines = fill(['"use strict";', ''], size, lambda i: [
+        'function handler{0}(event) {{'.format(i),
+        '    var total = {0};'.format(rng.randint(1, 1000)),
+        '    for (var i = 0; i < event.items.length; i++) {',
+        '        total += event.items[i].value;',
+        '    }',
+        '    return total;',
+        '}', ''])
+    if long_line:
+        lines.insert(1, 'var LONG = "{0}";'.format('x' * long_line))
+    return lines
+
+
+def xml_module(rng, i, depth):
+    '''return the lines of a pretty-printed module element nested up to the depth'''
+
+    indent = codevalidator.INDENTATION
+    levels = rng.randint(1, depth)
+    lines = ['{0}<module name="m{1}-{2}">'.format(indent * (level + 1), i, level) for level in range(levels)]
+    lines.append('{0}<value>{1}</value>'.format(indent * (levels + 1), rng.randint(1, 1000)))
+    lines += ['{0}</module>'.format(indent * (level + 1)) for level in reversed(range(levels))]
+    return lines
+
+
+def xml_lines(rng, size, long_line, depth):
+    lines = fill(["<?xml version='1.0' encoding='UTF-8'?>", '<project>'], size,
+                 lambda i: xml_module(rng, i, depth))
+    if long_line:
+        lines.insert(2, '{0}<description>{1}</description>'.format(codevalidator.INDENTATION, 'x' * long_line))
+    lines.append('</project>')
+    return lines
+
+
+def json_lines(rng, size, long_line):
+    lines = fill(['['], size, lambda i: [
+        '    {{"id": {0}, "name": "item {0}", "price": {1}.5, "tags": ["a", "b"]}},'.format(i, rng.randint(1, 1000))])
+    if long_line:
+        lines.append('    {{"description": "{0}"}},'.format('x' * long_line))
+    lines[-1] = lines[-1].rstrip(',')
+    lines.append(']')
+    return lines
+
+
+def yaml_lines(rng, size, long_line):
+    lines = fill([], size, lambda i: [
+        '---', 'kind: Deployment', 'metadata:', '    name: service-{0}'.format(i), 'spec:',
+        '    replicas: {0}'.format(rng.randint(1, 10)), '    ports:', '        - 8080', '        - 8081'])
+    if long_line:
+        lines.insert(1, 'description: {0}'.format('x' * long_line))
+    return lines
+
+
+def sql_lines(rng, size, long_line):
+    # the comments after quoted strings make the semicolon check fall back to sqlparse
+    lines = fill(['SET ROLE TO app;', ''], size, lambda i: [
+        "INSERT INTO items (id, name) VALUES ({0}, 'item {1}'); -- generated".format(i, rng.randint(1, 1000))])
+    if long_line:
+        lines.insert(1, "SELECT '{0}';".format('x' * long_line))
+    return lines
+
+
+# file type => (extension, generator, violations specific to the type)
+FILE_TYPES = {
+    'py': ('.py', python_lines, ['indent']),
+    'js': ('.js', javascript_lines, []),
+    'xml': ('.xml', xml_lines, ['indent', 'unclosed']),
+    'json': ('.json', json_lines, ['quote']),
+    'yaml': ('.yaml', yaml_lines, ['flow']),
+    'sql': ('.sql', sql_lines, ['semicolon']),
+}
+
+
+def inject_violation(rng, lines, kind):
+    '''change a random (indented) line of the file to violate a rule'''
+
+    indented = [i for i, line in enumerate(lines) if line.startswith(' ')] or [len(lines) - 1]
+    i = rng.choice(indented)
+    if kind == 'tabs':
+        lines[i] = '\t' + lines[i].lstrip(' ')
+    elif kind == 'trailingws':
+        lines[i] += '  '
+    elif kind == 'cr':
+        lines[i] += '\r'
+    elif kind == 'indent':
+        lines[i] = lines[i][1:]
+    elif kind == 'unclosed':
+        lines[i] = lines[i].replace('>', '', 1)
+    elif kind == 'quote':
+        lines[i] = lines[i].replace('"', '', 1)
+    elif kind == 'flow':
+        lines[i] += ': ['
+    elif kind == 'semicolon':
+        while lines and not lines[-1].strip():
+            lines.pop()
+        lines[-1] = lines[-1].replace(';', '', 1)
+
+
+def generate_tree(path, counts, size=4096, violations=0.2, long_lines=0.05, xml_depth=20, seed=1):
+    '''write the synthetic source tree and return the number of files, bytes and files with violations'''
+
+    rng = random.Random(seed)
+    files = total = violating = 0
+    for file_type in sorted(counts):
+        extension, generator, specific = FILE_TYPES[file_type]
+        for i in range(counts[file_type]):
+            file_size = rng.randint(size // 2, size * 3 // 2)
+            long_line = (rng.randint(2000, 20000) if rng.random() < long_lines else 0)
+            if file_type == 'xml':
+                lines = generator(rng, file_size, long_line, xml_depth)
+            else:
+                lines = generator(rng, file_size, long_line)
+            if rng.random() < violations:
+                inject_violation(rng, lines, rng.choice(COMMON_VIOLATIONS + specific))
+                violating += 1
+            directory = os.path.join(path, file_type, 'package{0}'.format(i % 10))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            data = ('\n'.join(lines) + '\n').encode('utf-8')
+            with open(os.path.join(directory, 'file{0}{1}'.format(i, extension)), 'wb') as fd:
+                fd.write(data)
+            files += 1
+            total += len(data)
+    return files, total, violating
+
+
+def reset():
+    '''forget the results of the last run'''
+
+    del codevalidator.VALIDATION_ERRORS[:]
+    del codevalidator.VALIDATION_DETAILS[:]
+    del codevalidator.SKIPPED_FILES[:]
+    codevalidator.DIR_RULES_CACHE.clear()
+    codevalidator.clear_file_cache()
+
+
+def throughput(seconds, files, size):
+    return {'seconds': seconds, 'files_per_second': files / seconds, 'mb_per_second': size / seconds / 1024 / 1024}
+
+
+def bench_validate(path, files, size, repeat):
+    best = None
+    for _ in range(repeat):
+        reset()
+        start = time.time()
+        codevalidator.validate_directory(path, None, None)
+        duration = time.time() - start
+        best = duration if best is None else min(best, duration)
+    result = throughput(best, files, size)
+    result['errors'] = len(codevalidator.VALIDATION_ERRORS)
+    return result
+
+
+def bench_rules(path, repeat):
+    '''validate the tree with --profile statistics, returns the best throughput of every rule'''
+
+    best = {}
+    for _ in range(repeat):
+        profiler = codevalidator.enable_profile()
+        try:
+            reset()
+            codevalidator.validate_directory(path, None, None)
+        finally:
+            codevalidator.disable_profile()
+        for name, (calls, wall, cpu, size) in profiler.stats['rule'].items():
+            if name not in best or wall < best[name]['seconds']:
+                best[name] = dict(throughput(wall, calls, size), calls=calls, cpu_seconds=cpu)
+    return best
+
+
+def bench_fix(path, repeat):
+    '''fix a fresh copy of the tree, only fixing is measured'''
+
+    best = None
+    for i in range(repeat):
+        copy = os.path.join(os.path.dirname(path), 'fix{0}'.format(i))
+        shutil.copytree(path, copy)
+        reset()
+        codevalidator.validate_directory(copy, None, None)
+        fixed = set(fname for fname, rule in codevalidator.VALIDATION_ERRORS)
+        size = sum(os.path.getsize(fname) for fname in fixed)
+        start = time.time()
+        codevalidator.fix_files()
+        duration = time.time() - start
+        best = duration if best is None else min(best, duration)
+        shutil.rmtree(copy)
+    return throughput(best, len(fixed), size) if fixed else None
+
+
+def git_version():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+                                       stderr=subprocess.STDOUT).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    '''print the throughput relative to the baseline results'''
+
+    def line(name, new, old):
+        if new and old:
+            change = new['mb_per_second'] / old['mb_per_second'] - 1
+            print('{0:>24}: {1:8.1f} MB/s ({2:+.1%} compared with {3:.1f} MB/s)'.format(
+                name, new['mb_per_second'], change, old['mb_per_second']))
+
+    print('compared with {0}'.format(baseline.get('version') or 'baseline'))
+    line('validate', results['validate'], baseline.get('validate'))
+    line('fix', results['fix'], baseline.get('fix'))
+    for name in sorted(results['rules']):
+        line(name, results['rules'][name], baseline.get('rules', {}).get(name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    for file_type in sorted(FILE_TYPES):
+        parser.add_argument('--' + file_type, type=int, default=DEFAULT_COUNTS[file_type], metavar='N',
+                            help='number of {0} files (default: {1})'.format(file_type, DEFAULT_COUNTS[file_type]))
+    parser.add_argument('--size', type=int, default=4096, help='average file size in bytes (default: 4096)')
+    parser.add_argument('--violations', type=float, default=0.2,
+                        help='ratio of files with a violation (default: 0.2)')
+    parser.add_argument('--long-lines', type=float, default=0.05,
+                        help='ratio of files with a line of 2-20k characters (default: 0.05)')
+    parser.add_argument('--xml-depth', type=int, default=20, help='maximum nesting depth of XML files (default: 20)')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the generated tree (default: 1)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    parser.add_argument('-c', '--config', help='use the rules of this configuration file instead of builtin rules only')
+    parser.add_argument('-o', '--output', metavar='FILE', help='write the results as JSON to FILE')
+    parser.add_argument('--compare', metavar='FILE', help='compare the results with the JSON results in FILE')
+    parser.add_argument('--keep', metavar='DIR', help='generate the tree in DIR and keep it')
+    args = parser.parse_args()
+
+    counts = dict((file_type, getattr(args, file_type)) for file_type in FILE_TYPES)
+    parameters = dict(counts, size=args.size, violations=args.violations, long_lines=args.long_lines,
+                      xml_depth=args.xml_depth, seed=args.seed)
+    if args.config:
+        codevalidator.CONFIG.update(codevalidator.load_config(args.config))
+    else:
+        codevalidator.CONFIG['rules'] = BENCHMARK_RULES
+    codevalidator.CONFIG.update(quiet=True, create_backup=False)
+
+    temp = tempfile.mkdtemp(prefix='codevalidator-bench-')
+    try:
+        path = args.keep or os.path.join(temp, 'tree')
+        files, size, violating = generate_tree(path, counts, args.size, args.violations, args.long_lines,
+                                               args.xml_depth, args.seed)
+        print('{0} files ({1} with violations), {2:.1f} MB'.format(files, violating, size / 1024. / 1024))
+        results = {'version': git_version(), 'python': platform.python_version(), 'platform': platform.platform(),
+                   'parameters': parameters, 'files': files, 'bytes': size}
+        results['validate'] = bench_validate(path, files, size, args.repeat)
+        print('{0:>24}: {1[seconds]:8.3f} s ({1[files_per_second]:.0f} files/s, {1[mb_per_second]:.1f} MB/s, '
+              '{1[errors]} errors)'.format('validate', results['validate']))
+        results['rules'] = bench_rules(path, args.repeat)
+        for name, result in sorted(results['rules'].items(), key=lambda item: -item[1]['seconds']):
+            print('{0:>24}: {1[seconds]:8.3f} s ({1[calls]} files, {1[mb_per_second]:.1f} MB/s)'.format(name, result))
+        results['fix'] = bench_fix(path, args.repeat)
+        if results['fix']:
+            print('{0:>24}: {1[seconds]:8.3f} s ({1[files_per_second]:.0f} files/s, '
+                  '{1[mb_per_second]:.1f} MB/s)'.format('fix', results['fix']))
+    finally:
+        shutil.rmtree(temp)
+
+    if args.output:
+        with open(args.output, 'w') as fd:
+            json.dump(results, fd, indent=2, sort_keys=True)
+            fd.write('\n')
+    if args.compare:
+        with open(args.compare) as fd:
+            compare(results, json.load(fd))
+
+
+if __name__ == '__main__':
+    main()